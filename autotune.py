@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import argparse
+import platform
+from multiprocessing import Pool
+
+import torch
+
+from run import get_batches, init_worker, summarize_batch, get_tuning_path
+
+
+def get_powers_of_two(limit):
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    return values
+
+
+def read_sample(test_path, sample_size):
+    # Raw lines, cleaning is timed together with prediction as in run.py
+    for batch, _ in get_batches(test_path, sample_size):
+        return batch
+    return []
+
+
+def split(documents, batch_size):
+    return [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+
+
+def time_batches(summarize_batches, documents, batch_size):
+    batches = split(documents, batch_size)
+    start_time = time.perf_counter()
+    summarize_batches(batches)
+    return len(documents) / (time.perf_counter() - start_time)
+
+
+def measure_layout(documents, batch_sizes, num_processes, num_threads, worker_args):
+    """
+    Documents per second for every batch size with num_processes processes of num_threads threads.
+    """
+    pool = None
+    if num_processes == 1:
+        torch.set_num_threads(num_threads)
+        summarize_batches = lambda batches: [summarize_batch(batch) for batch in batches]
+    else:
+        pool = Pool(num_processes, initializer=init_worker, initargs=worker_args[:5] + (num_threads,))
+        summarize_batches = lambda batches: pool.map(summarize_batch, batches, chunksize=1)
+
+    trials = []
+    try:
+        # Warm-up: models are loaded and the first batches are slow in every process
+        summarize_batches(split(documents[:num_processes * min(batch_sizes)], min(batch_sizes)))
+        for batch_size in batch_sizes:
+            if len(documents) < batch_size * num_processes:
+                continue
+            trial = {
+                "batch_size": batch_size,
+                "num_threads": num_threads,
+                "num_processes": num_processes,
+                "documents_per_second": time_batches(summarize_batches, documents, batch_size)
+            }
+            print("batch size {batch_size:5d}, threads {num_threads:3d}, processes {num_processes:3d}: "
+                  "{documents_per_second:8.1f} documents/sec".format(**trial))
+            trials.append(trial)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return trials
+
+
+def autotune(model_path, test_path, config_path=None, output_path=None, sample_size=2048, batch_sizes=None,
+             thread_counts=None, process_counts=None, max_tokens=None, preselect_max_tokens=None,
+             preselect_method="tfidf"):
+    cpu_count = os.cpu_count() or 1
+    batch_sizes = batch_sizes or [16, 64, 256, 1024]
+    thread_counts = thread_counts or get_powers_of_two(cpu_count)
+    process_counts = process_counts or get_powers_of_two(cpu_count)
+    documents = read_sample(test_path, sample_size)
+    assert documents, "No documents in {}".format(test_path)
+
+    worker_args = (model_path, config_path, max_tokens, preselect_max_tokens, preselect_method)
+    # The model of this process is used for one-process layouts
+    init_worker(*worker_args)
+    trials = []
+    for num_processes in process_counts:
+        for num_threads in thread_counts:
+            if num_processes * num_threads > cpu_count:
+                continue
+            trials.extend(measure_layout(documents, batch_sizes, num_processes, num_threads, worker_args))
+    assert trials, "Sample is too small for the search space"
+
+    best = max(trials, key=lambda trial: trial["documents_per_second"])
+    profile = {
+        "batch_size": best["batch_size"],
+        "num_threads": best["num_threads"],
+        "num_processes": best["num_processes"],
+        "documents_per_second": best["documents_per_second"],
+        "cpu_count": cpu_count,
+        "platform": platform.platform(),
+        "torch_version": torch.__version__,
+        "sample_size": len(documents),
+        "trials": trials
+    }
+    output_path = output_path or get_tuning_path(model_path)
+    with open(output_path, "w", encoding="utf-8") as w:
+        json.dump(profile, w, indent=2)
+    print("Best: batch size {batch_size}, threads {num_threads}, processes {num_processes}: "
+          "{documents_per_second:.1f} documents/sec, saved to {output_path}".format(output_path=output_path, **best))
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search of the fastest run.py settings for the machine")
+    parser.add_argument('--model-path', required=True)
+    parser.add_argument('--test-path', required=True, help="input of run.py, the first documents are the sample")
+    parser.add_argument('--config-path', default=None)
+    parser.add_argument('--output-path', default=None, help="path to profile, tuning.json next to the model by default")
+    parser.add_argument('--sample-size', type=int, default=2048)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=None)
+    parser.add_argument('--thread-counts', type=int, nargs='+', default=None)
+    parser.add_argument('--process-counts', type=int, nargs='+', default=None)
+    parser.add_argument('--max-tokens', type=int, default=None)
+    parser.add_argument('--preselect-max-tokens', type=int, default=None)
+    parser.add_argument('--preselect-method', choices=("tfidf", "centrality"), default="tfidf")
+    args = parser.parse_args()
+    autotune(**vars(args))
@@ -0,0 +1,460 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict, List
+
+import numpy as np
+import torch
+from allennlp.common.params import Params
+from allennlp.common.util import START_SYMBOL, END_SYMBOL
+from allennlp.data.dataset import Batch
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.models.encoder_decoders.copynet_seq2seq import CopyNetSeq2Seq
+from allennlp.nn.beam_search import BeamSearch
+from allennlp.predictors.seq2seq import Seq2SeqPredictor
+
+from summarus import *
+from summarus.settings import TEST_CONFIG_DIR
+from summarus.streaming import StreamingSummarizer
+from summarus.batch_summarizer import BatchSummarizer
+from summarus.long_document import LongDocumentSummarizer
+from summarus.memory import get_saved_tensors_mb
+
+STEP_FUNCTIONS = ("take_step", "take_search_step")
+STARTUP_SCRIPT = "import time; start_time = time.perf_counter(); import run; run.load_model({!r}); " \
+                 "print(time.perf_counter() - start_time)"
+
+
+def get_latency_stats(latencies: List[float]) -> Dict[str, float]:
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p90": float(np.percentile(latencies, 90)),
+        "p99": float(np.percentile(latencies, 99)),
+        "count": len(latencies)
+    }
+
+
+def generate_texts(count, length, lexicon_size, rng):
+    # Zipf-like word frequencies, so that the texts have both frequent and out-of-vocabulary words
+    ranks = rng.zipf(1.1, size=(count, length)) % lexicon_size
+    return [" ".join("w{}".format(rank) for rank in row) for row in ranks]
+
+
+def make_vocabulary(namespaces, vocab_size):
+    vocabulary = Vocabulary()
+    for namespace in namespaces:
+        vocabulary.add_token_to_namespace(START_SYMBOL, namespace)
+        vocabulary.add_token_to_namespace(END_SYMBOL, namespace)
+        for i in range(vocab_size - vocabulary.get_vocab_size(namespace)):
+            vocabulary.add_token_to_namespace("w{}".format(i), namespace)
+    return vocabulary
+
+
+def make_tensors(reader, vocabulary, sources, targets=None):
+    targets = targets or [None] * len(sources)
+    instances = [reader.text_to_instance(source, target) for source, target in zip(sources, targets)]
+    batch = Batch(instances)
+    batch.index_instances(vocabulary)
+    return batch.as_tensor_dict()
+
+
+def set_beam_size(model, beam_size):
+    model._beam_search = BeamSearch(model._end_index, max_steps=model._max_decoding_steps, beam_size=beam_size)
+
+
+def measure(func, repeats, warmup=1):
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+def measure_steps(model, func, repeats):
+    step_name = [name for name in STEP_FUNCTIONS if hasattr(model, name)][0]
+    step_function = getattr(model, step_name)
+    latencies = []
+
+    def timed_step(last_predictions, state):
+        start_time = time.perf_counter()
+        result = step_function(last_predictions, state)
+        latencies.append(time.perf_counter() - start_time)
+        return result
+
+    setattr(model, step_name, timed_step)
+    try:
+        search_latencies = measure(func, repeats, warmup=0)
+    finally:
+        delattr(model, step_name)
+    return search_latencies, latencies
+
+
+def measure_copy_merge(model, tensors, beam_size, repeats):
+    # Inputs of CopyNet's merge of copy and generation scores for a single decoding step over all beams
+    source_to_target = tensors["source_to_target"].repeat(beam_size, 1)
+    source_token_ids = tensors["source_token_ids"].repeat(beam_size, 1)
+    group_size, source_length = source_to_target.size()
+    generation_log_probs = torch.log_softmax(torch.randn(group_size, model._target_vocab_size), dim=-1)
+    copy_log_probs = torch.log_softmax(torch.randn(group_size, source_length), dim=-1)
+
+    def merge(merge_function):
+        state = {"source_to_target": source_to_target, "source_token_ids": source_token_ids}
+        return lambda: merge_function(generation_log_probs.clone(), copy_log_probs, state)
+
+    with torch.no_grad():
+        latencies = measure(merge(model._gather_final_log_probs), repeats)
+        inherited_latencies = measure(merge(lambda *args: CopyNetSeq2Seq._gather_final_log_probs(model, *args)),
+                                      repeats)
+    return latencies, inherited_latencies
+
+
+def measure_final_dist(model, tensors, beam_size, repeats):
+    # Inputs of PGN's final distribution for a single decoding step over all beams
+    with torch.no_grad():
+        state = model._encode(tensors["source_tokens"])
+        extra_zeros, modified_source_tokens, _ = model._prepare(tensors["source_to_target"],
+                                                                tensors["source_token_ids"])
+        state["tokens"] = modified_source_tokens
+        state["extra_zeros"] = extra_zeros
+        state = model._init_decoder_state(state)
+        state = {key: torch.cat([value] * beam_size) for key, value in state.items()}
+        last_predictions = state["source_mask"].new_full((state["source_mask"].size(0),), model._start_index)
+        output_projections, state = model._prepare_output_projections(last_predictions, state)
+
+        latencies = measure(lambda: model._get_final_log_dist(state, output_projections), repeats)
+        probs_latencies = measure(lambda: torch.log(model._get_final_dist(state, output_projections) + model._eps),
+                                  repeats)
+    return latencies, probs_latencies
+
+
+def benchmark_attention(batch_sizes, source_lengths, repeats, seed, dim=512):
+    # A single decoding step of the attention alone, dense Bahdanau against the sparse variants
+    torch.manual_seed(seed)
+    attentions = {
+        "bahdanau": BahdanauAttention(dim, use_coverage=True),
+        "sparse_window": SparseBahdanauAttention(dim, use_coverage=True, mode="window"),
+        "sparse_topk": SparseBahdanauAttention(dim, use_coverage=True, mode="topk")
+    }
+    results = []
+    for source_length in source_lengths:
+        for batch_size in batch_sizes:
+            encoder_outputs = torch.randn(batch_size, source_length, dim)
+            decoder_hidden = torch.randn(batch_size, dim)
+            source_mask = torch.ones(batch_size, source_length, dtype=torch.long)
+            coverage = torch.rand(batch_size, source_length)
+            for name, attention in attentions.items():
+                attention.eval()
+                with torch.no_grad():
+                    latencies = measure(lambda: attention(decoder_hidden, encoder_outputs, source_mask, coverage),
+                                        repeats)
+                results.append(make_result("attention_len{}".format(source_length), name, batch_size,
+                                           latencies, batch_size * len(latencies)))
+    return results
+
+
+def measure_streaming(model, reader, source, beam_size, repeats):
+    summarizer = StreamingSummarizer(model, reader, beam_size=beam_size)
+    first_token_latencies = []
+    tokens_count = 0
+
+    def generate():
+        nonlocal tokens_count
+        start_time = time.perf_counter()
+        for i, _ in enumerate(summarizer.stream(source)):
+            if i == 0:
+                first_token_latencies.append(time.perf_counter() - start_time)
+            tokens_count += 1
+
+    latencies = measure(generate, repeats, warmup=0)
+    return first_token_latencies, latencies, tokens_count
+
+
+def make_result(config_name, benchmark_name, batch_size, latencies, tokens_count, beam_size=None):
+    name = "{}/{}/bs{}".format(config_name, benchmark_name, batch_size)
+    if beam_size is not None:
+        name += "/beam{}".format(beam_size)
+    total_time = sum(latencies)
+    return {
+        "name": name,
+        "config": config_name,
+        "benchmark": benchmark_name,
+        "batch_size": batch_size,
+        "beam_size": beam_size,
+        "latency_ms": get_latency_stats(latencies),
+        "tokens_per_second": tokens_count / total_time if total_time else 0.0
+    }
+
+
+def benchmark_config(config_path, vocab_size, batch_sizes, beam_sizes, source_length, target_length,
+                     max_decoding_steps, repeats, seed, checkpoint_steps=(), long_document_lengths=(),
+                     deadlines_ms=()):
+    config_name = os.path.splitext(os.path.basename(config_path))[0]
+    params = Params.from_file(config_path)
+    rng = np.random.RandomState(seed)
+    torch.manual_seed(seed)
+
+    reader_params = params.pop("reader")
+    reader_params["source_max_tokens"] = source_length
+    reader_params["target_max_tokens"] = target_length
+    reader = DatasetReader.from_params(reader_params)
+
+    model_params = params.pop("model")
+    model_params["max_decoding_steps"] = max_decoding_steps
+    namespaces = {"tokens", model_params.get("target_namespace", "tokens")}
+    vocabulary = make_vocabulary(namespaces, vocab_size)
+    model = Model.from_params(model_params, vocab=vocabulary)
+    if not hasattr(model, "decoding_budget"):
+        deadlines_ms = []
+    optimizer = torch.optim.Adam(model.parameters())
+
+    results = []
+    for batch_size in batch_sizes:
+        # The lexicon is bigger than the vocabulary, so the copy mechanisms have something to copy
+        sources = generate_texts(batch_size, source_length, int(vocab_size * 1.2), rng)
+        targets = generate_texts(batch_size, target_length, int(vocab_size * 1.2), rng)
+        train_tensors = make_tensors(reader, vocabulary, sources, targets)
+        test_tensors = make_tensors(reader, vocabulary, sources)
+        source_tokens_count = int((train_tensors["source_tokens"]["tokens"] != 0).sum())
+        target_tokens_count = int((train_tensors["target_tokens"]["tokens"] != 0).sum())
+
+        model.eval()
+        with torch.no_grad():
+            latencies = measure(lambda: model._encode(test_tensors["source_tokens"]), repeats)
+        results.append(make_result(config_name, "encoder", batch_size, latencies,
+                                   source_tokens_count * len(latencies)))
+
+        for beam_size in beam_sizes:
+            set_beam_size(model, beam_size)
+            outputs = []
+
+            def search():
+                outputs.append(model(**test_tensors))
+
+            with torch.no_grad():
+                measure(search, repeats=0)
+                search_latencies, step_latencies = measure_steps(model, search, repeats)
+            generated_tokens_count = sum(batch_size * output["predictions"].size(-1) for output in outputs[1:])
+            results.append(make_result(config_name, "beam_search", batch_size, search_latencies,
+                                       generated_tokens_count, beam_size))
+            results.append(make_result(config_name, "step", batch_size, step_latencies,
+                                       batch_size * len(step_latencies), beam_size))
+
+            if beam_size == 1 and getattr(model, "_greedy_search", None):
+                # The same search with AllenNLP BeamSearch instead of the greedy fast path
+                greedy_search = model._greedy_search
+                model._greedy_search = None
+                outputs.clear()
+                try:
+                    with torch.no_grad():
+                        latencies = measure(search, repeats)
+                finally:
+                    model._greedy_search = greedy_search
+                generated_tokens_count = sum(batch_size * output["predictions"].size(-1) for output in outputs[1:])
+                results.append(make_result(config_name, "beam_search_allennlp", batch_size, latencies,
+                                           generated_tokens_count, beam_size))
+
+            for deadline_ms in deadlines_ms:
+                # The same search with a time budget, the tail latency should stay near the budget
+                outputs.clear()
+
+                def search_with_budget():
+                    with model.decoding_budget(deadline_ms / 1000.):
+                        search()
+
+                with torch.no_grad():
+                    latencies = measure(search_with_budget, repeats)
+                generated_tokens_count = sum(batch_size * output["predictions"].size(-1) for output in outputs[1:])
+                result = make_result(config_name, "beam_search_deadline{:g}ms".format(deadline_ms), batch_size,
+                                     latencies, generated_tokens_count, beam_size)
+                result["degraded_ratio"] = float(np.mean([output["degraded"].float().mean().item()
+                                                          for output in outputs[1:]]))
+                results.append(result)
+
+            if isinstance(model, CopyNetSeq2Seq):
+                latencies, inherited_latencies = measure_copy_merge(model, test_tensors, beam_size, repeats)
+                results.append(make_result(config_name, "copy_merge", batch_size, latencies,
+                                           batch_size * len(latencies), beam_size))
+                results.append(make_result(config_name, "copy_merge_inherited", batch_size, inherited_latencies,
+                                           batch_size * len(inherited_latencies), beam_size))
+
+            if isinstance(model, PointerGeneratorNetwork):
+                latencies, probs_latencies = measure_final_dist(model, test_tensors, beam_size, repeats)
+                results.append(make_result(config_name, "final_dist", batch_size, latencies,
+                                           batch_size * len(latencies), beam_size))
+                results.append(make_result(config_name, "final_dist_probs", batch_size, probs_latencies,
+                                           batch_size * len(probs_latencies), beam_size))
+
+        if batch_size == 1 and hasattr(model, "take_step"):
+            for beam_size in beam_sizes:
+                first_token_latencies, latencies, tokens_count = measure_streaming(
+                    model, reader, sources[0], beam_size, repeats)
+                if first_token_latencies:
+                    results.append(make_result(config_name, "first_token", batch_size, first_token_latencies,
+                                               len(first_token_latencies), beam_size))
+                results.append(make_result(config_name, "stream", batch_size, latencies, tokens_count, beam_size))
+
+        # Full inference from raw texts with the last beam size: AllenNLP predictor against BatchSummarizer
+        model.eval()
+        predictor = Seq2SeqPredictor(model, reader)
+        inputs = [{"source": source} for source in sources]
+        latencies = measure(lambda: predictor.predict_batch_json(inputs), repeats)
+        results.append(make_result(config_name, "predictor", batch_size, latencies,
+                                   source_tokens_count * len(latencies), beam_sizes[-1]))
+        summarizer = BatchSummarizer(model, reader)
+        latencies = measure(lambda: summarizer.summarize(sources), repeats)
+        results.append(make_result(config_name, "batch_summarizer", batch_size, latencies,
+                                   source_tokens_count * len(latencies), beam_sizes[-1]))
+
+        def train_step():
+            optimizer.zero_grad()
+            output_dict = model(**train_tensors)
+            output_dict["loss"].backward()
+            optimizer.step()
+
+        model.train()
+        latencies = measure(train_step, repeats)
+        results.append(make_result(config_name, "train_step", batch_size, latencies,
+                                   target_tokens_count * len(latencies)))
+
+        if isinstance(model, PointerGeneratorNetwork):
+            # Memory and time of training with activation checkpointing, 0 turns it off
+            for steps in checkpoint_steps:
+                model._checkpoint_steps = steps or None
+                latencies = measure(train_step, repeats)
+                result = make_result(config_name, "train_step_checkpoint{}".format(steps), batch_size, latencies,
+                                     target_tokens_count * len(latencies))
+                result["saved_tensors_mb"] = get_saved_tensors_mb(lambda: model(**train_tensors), model)
+                results.append(result)
+            model._checkpoint_steps = None
+
+    # Map-reduce summarization of a single document longer than the source length
+    model.eval()
+    summarizer = LongDocumentSummarizer(BatchSummarizer(model, reader), chunk_tokens=source_length)
+    for length in long_document_lengths:
+        source = generate_texts(1, length, int(vocab_size * 1.2), rng)[0]
+        latencies = measure(lambda: summarizer.summarize([source]), repeats)
+        results.append(make_result(config_name, "long_document_len{}".format(length), 1, latencies,
+                                   length * len(latencies), model._beam_search.beam_size))
+    return results
+
+
+def measure_startup(model_path, repeats):
+    # Every run is a new interpreter, so that nothing is imported or cached beforehand
+    latencies = []
+    for _ in range(repeats):
+        output = subprocess.check_output([sys.executable, "-c", STARTUP_SCRIPT.format(model_path)],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        latencies.append(float(output.decode("utf-8").strip().split("\n")[-1]))
+    return {
+        "name": "startup/{}".format(os.path.basename(os.path.normpath(model_path))),
+        "benchmark": "startup",
+        "model_path": model_path,
+        "latency_ms": get_latency_stats(latencies),
+        "tokens_per_second": 0.0
+    }
+
+
+def compare_with_baseline(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as r:
+        baseline = {result["name"]: result for result in json.load(r)["results"]}
+    for result in results:
+        if result["name"] not in baseline:
+            continue
+        old_p50 = baseline[result["name"]]["latency_ms"]["p50"]
+        new_p50 = result["latency_ms"]["p50"]
+        print("{:<60} p50: {:10.2f}ms -> {:10.2f}ms ({:+.1f}%)".format(
+            result["name"], old_p50, new_p50, (new_p50 / old_p50 - 1.0) * 100.0))
+
+
+def run_benchmarks(config_paths, output_path, baseline_path, vocab_size, batch_sizes, beam_sizes,
+                   source_length, target_length, max_decoding_steps, repeats, seed, num_threads,
+                   startup_model_paths=None, checkpoint_steps=None, attention_source_lengths=None,
+                   long_document_lengths=None, deadlines_ms=None):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if config_paths is None:
+        config_paths = [os.path.join(TEST_CONFIG_DIR, file_name)
+                        for file_name in sorted(os.listdir(TEST_CONFIG_DIR)) if file_name.endswith(".json")]
+
+    results = []
+    for config_path in config_paths:
+        config_results = benchmark_config(config_path, vocab_size, batch_sizes, beam_sizes, source_length,
+                                          target_length, max_decoding_steps, repeats, seed, checkpoint_steps or [],
+                                          long_document_lengths or [], deadlines_ms or [])
+        for result in config_results:
+            line = "{:<60} p50: {:10.2f}ms p99: {:10.2f}ms tokens/sec: {:10.1f}".format(
+                result["name"], result["latency_ms"]["p50"], result["latency_ms"]["p99"],
+                result["tokens_per_second"])
+            if "saved_tensors_mb" in result:
+                line += " saved tensors: {:8.1f}MB".format(result["saved_tensors_mb"])
+            if "degraded_ratio" in result:
+                line += " degraded: {:5.1f}%".format(result["degraded_ratio"] * 100.)
+            print(line)
+        results.extend(config_results)
+
+    if attention_source_lengths:
+        attention_results = benchmark_attention(batch_sizes, attention_source_lengths, repeats, seed)
+        for result in attention_results:
+            print("{:<60} p50: {:10.2f}ms p99: {:10.2f}ms".format(
+                result["name"], result["latency_ms"]["p50"], result["latency_ms"]["p99"]))
+        results.extend(attention_results)
+
+    for model_path in startup_model_paths or []:
+        result = measure_startup(model_path, repeats)
+        print("{:<60} p50: {:10.2f}ms p99: {:10.2f}ms".format(
+            result["name"], result["latency_ms"]["p50"], result["latency_ms"]["p99"]))
+        results.append(result)
+
+    if output_path:
+        report = {
+            "torch_version": torch.__version__,
+            "num_threads": torch.get_num_threads(),
+            "vocab_size": vocab_size,
+            "source_length": source_length,
+            "target_length": target_length,
+            "max_decoding_steps": max_decoding_steps,
+            "results": results
+        }
+        with open(output_path, "w", encoding="utf-8") as w:
+            json.dump(report, w, ensure_ascii=False, indent=2)
+    if baseline_path:
+        compare_with_baseline(results, baseline_path)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model inference and training benchmarks")
+    parser.add_argument('--config-paths', nargs='*', default=None)
+    parser.add_argument('--output-path', default=None)
+    parser.add_argument('--baseline-path', default=None)
+    parser.add_argument('--vocab-size', type=int, default=50000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--beam-sizes', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--source-length', type=int, default=400)
+    parser.add_argument('--target-length', type=int, default=20)
+    parser.add_argument('--max-decoding-steps', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1048596)
+    parser.add_argument('--num-threads', type=int, default=None)
+    parser.add_argument('--startup-model-paths', nargs='*', default=None,
+                        help="model directories or artifacts to measure run.py startup with")
+    parser.add_argument('--checkpoint-steps', type=int, nargs='*', default=None,
+                        help="PGN activation checkpointing segment lengths to measure, 0 for no checkpointing")
+    parser.add_argument('--attention-source-lengths', type=int, nargs='*', default=None,
+                        help="source lengths to measure a step of dense and sparse Bahdanau attention with")
+    parser.add_argument('--long-document-lengths', type=int, nargs='*', default=None,
+                        help="document lengths in tokens to measure map-reduce summarization with")
+    parser.add_argument('--deadlines-ms', type=float, nargs='*', default=None,
+                        help="decoding time budgets to measure pgn and seq2seq beam search with")
+    args = parser.parse_args()
+    run_benchmarks(**vars(args))
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from summarus.readers import RIAReader, LentaReader, CNNDailyMailReader, ContractsReader
+from summarus.synthetic import CORPUS_FORMATS, generate_corpus
+
+
+def make_reader(corpus_format, corpus_path, tokenizer=None, save_copy_fields=False, save_pgn_fields=False):
+    fields = {"save_copy_fields": save_copy_fields, "save_pgn_fields": save_pgn_fields}
+    if corpus_format == "ria":
+        return RIAReader(tokenizer=tokenizer, **fields)
+    if corpus_format == "lenta":
+        return LentaReader(tokenizer=tokenizer, **fields)
+    if corpus_format == "cnn_dailymail":
+        stories_dir = os.path.join(os.path.dirname(corpus_path), "stories")
+        return CNNDailyMailReader(cnn_tokenized_dir=stories_dir, tokenizer=tokenizer, **fields)
+    # Contracts reader has no copy and pgn fields
+    return ContractsReader(contracts_dir=corpus_path, tokenizer=tokenizer)
+
+
+def measure_median(func, repeats):
+    durations = []
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start_time)
+    return float(np.median(durations)), result
+
+
+def measure_memory_per_instance(reader, records):
+    """
+    Size in KB of Python objects allocated by text_to_instance and kept alive by an instance.
+    """
+    tracemalloc.start()
+    try:
+        start_size = tracemalloc.get_traced_memory()[0]
+        instances = [reader.text_to_instance(source, target) for source, target in records]
+        size = tracemalloc.get_traced_memory()[0] - start_size
+    finally:
+        tracemalloc.stop()
+    return size / len(instances) / 1024.
+
+
+def benchmark_reader(corpus_format, corpus_path, documents_count, tokenizer_name, repeats, memory_sample_size,
+                     **reader_kwargs):
+    reader = make_reader(corpus_format, corpus_path, **reader_kwargs)
+    parse_seconds, records = measure_median(lambda: list(reader.parse_set(corpus_path)), repeats)
+    records = [(source, target) for source, target in records if source and target]
+    instance_seconds, instances = measure_median(
+        lambda: [reader.text_to_instance(source, target) for source, target in records], repeats)
+    source_tokens_count = sum(len(instance.fields["source_tokens"]) for instance in instances)
+    return {
+        "name": "{}_{}_docs{}".format(corpus_format, tokenizer_name, documents_count),
+        "format": corpus_format,
+        "tokenizer": tokenizer_name,
+        "documents_count": documents_count,
+        "records_count": len(records),
+        "documents_per_second": len(records) / parse_seconds,
+        "instances_per_second": len(instances) / instance_seconds,
+        "mean_source_tokens": source_tokens_count / max(1, len(instances)),
+        "memory_per_instance_kb": measure_memory_per_instance(reader, records[:memory_sample_size])
+    }
+
+
+def compare_with_baseline(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as r:
+        baseline = {result["name"]: result for result in json.load(r)["results"]}
+    for result in results:
+        if result["name"] not in baseline:
+            continue
+        old_result = baseline[result["name"]]
+        line = "{:<40}".format(result["name"])
+        for key in ("documents_per_second", "instances_per_second", "memory_per_instance_kb"):
+            line += " {}: {:10.1f} -> {:10.1f} ({:+.1f}%)".format(
+                key, old_result[key], result[key], (result[key] / old_result[key] - 1.0) * 100.0)
+        print(line)
+
+
+def run_benchmarks(formats, documents_counts, corpus_dir, output_path, baseline_path, median_length, length_sigma,
+                   title_length, lexicon_size, seed, repeats, memory_sample_size, subword_model_path=None,
+                   save_copy_fields=False, save_pgn_fields=False):
+    tokenizers = [("words", None)]
+    if subword_model_path:
+        # Imported here, sentencepiece is needed only for the subword results
+        from summarus.subword_tokenizer import SubwordTokenizer
+        tokenizers.append(("subword", SubwordTokenizer(subword_model_path)))
+
+    is_temporary_dir = corpus_dir is None
+    corpus_dir = corpus_dir or tempfile.mkdtemp()
+    results = []
+    try:
+        for corpus_format in formats or CORPUS_FORMATS:
+            for documents_count in documents_counts:
+                output_dir = os.path.join(corpus_dir, "{}_docs{}".format(corpus_format, documents_count))
+                corpus_path = generate_corpus(corpus_format, output_dir, documents_count, median_length,
+                                              length_sigma, title_length, lexicon_size, seed)
+                for tokenizer_name, tokenizer in tokenizers:
+                    result = benchmark_reader(corpus_format, corpus_path, documents_count, tokenizer_name,
+                                              repeats, memory_sample_size, tokenizer=tokenizer,
+                                              save_copy_fields=save_copy_fields, save_pgn_fields=save_pgn_fields)
+                    print("{:<40} docs/sec: {:10.1f} instances/sec: {:10.1f} memory: {:8.1f}KB/instance".format(
+                        result["name"], result["documents_per_second"], result["instances_per_second"],
+                        result["memory_per_instance_kb"]))
+                    results.append(result)
+    finally:
+        if is_temporary_dir:
+            shutil.rmtree(corpus_dir)
+
+    if output_path:
+        report = {
+            "median_length": median_length,
+            "length_sigma": length_sigma,
+            "title_length": title_length,
+            "lexicon_size": lexicon_size,
+            "seed": seed,
+            "save_copy_fields": save_copy_fields,
+            "save_pgn_fields": save_pgn_fields,
+            "results": results
+        }
+        with open(output_path, "w", encoding="utf-8") as w:
+            json.dump(report, w, ensure_ascii=False, indent=2)
+    if baseline_path:
+        compare_with_baseline(results, baseline_path)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dataset readers throughput benchmark on synthetic corpora")
+    parser.add_argument('--formats', nargs='*', default=None, choices=CORPUS_FORMATS)
+    parser.add_argument('--documents-counts', type=int, nargs='+', default=[1000])
+    parser.add_argument('--corpus-dir', default=None, help="directory to keep generated corpora in")
+    parser.add_argument('--output-path', default=None)
+    parser.add_argument('--baseline-path', default=None)
+    parser.add_argument('--median-length', type=int, default=400, help="median length of documents in words")
+    parser.add_argument('--length-sigma', type=float, default=0.5,
+                        help="sigma of log-normal document lengths, 0 for the same length")
+    parser.add_argument('--title-length', type=int, default=12)
+    parser.add_argument('--lexicon-size', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--memory-sample-size', type=int, default=100)
+    parser.add_argument('--subword-model-path', default=None,
+                        help="sentencepiece model to also measure the readers with SubwordTokenizer")
+    parser.add_argument('--save-copy-fields', action='store_true')
+    parser.add_argument('--save-pgn-fields', action='store_true')
+    args = parser.parse_args()
+    run_benchmarks(**vars(args))
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import shutil
+import argparse
+from itertools import islice
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+from summarus import import_plugins
+from summarus.batch_summarizer import BatchSummarizer
+from summarus.low_rank import factorize_linear, factorize_embedding
+from evaluate import evaluate
+
+OUTPUT_PROJECTION_PREFIX = "_output_projection_layer."
+TARGET_EMBEDDER_PREFIX = "_target_embedder."
+
+
+def get_size_mb(state_dict):
+    return sum(tensor.numel() * tensor.element_size() for tensor in state_dict.values()) / 2 ** 20
+
+
+def compress(model_path, output_path, output_projection_rank, target_embedding_rank=None, weights_path=None):
+    """
+    Saves a model directory with low rank output projection and target embeddings made with truncated SVD.
+    """
+    config = Params.from_file(os.path.join(model_path, "config.json")).as_dict(quiet=True)
+    model_config = config["model"]
+    assert model_config["type"] in ("pgn", "seq2seq"), "Only pgn and seq2seq models can be compressed"
+    assert not model_config.get("output_projection_rank") and not model_config.get("target_embedding_rank"), \
+        "Model is already compressed"
+    state_dict = torch.load(weights_path or os.path.join(model_path, "best.th"), map_location="cpu")
+    if output_projection_rank:
+        state_dict = factorize_linear(state_dict, OUTPUT_PROJECTION_PREFIX, output_projection_rank)
+        model_config["output_projection_rank"] = output_projection_rank
+    if target_embedding_rank:
+        state_dict = factorize_embedding(state_dict, TARGET_EMBEDDER_PREFIX, target_embedding_rank)
+        model_config["target_embedding_rank"] = target_embedding_rank
+
+    os.makedirs(output_path, exist_ok=True)
+    with open(os.path.join(output_path, "config.json"), "w", encoding="utf-8") as w:
+        json.dump(config, w, ensure_ascii=False, indent=2)
+    vocabulary_path = os.path.join(output_path, "vocabulary")
+    if os.path.exists(vocabulary_path):
+        shutil.rmtree(vocabulary_path)
+    shutil.copytree(os.path.join(model_path, "vocabulary"), vocabulary_path)
+    torch.save(state_dict, os.path.join(output_path, "best.th"))
+    return state_dict
+
+
+def measure_decoding(model_path, texts, batch_size):
+    """
+    Generated tokens per second of summarizing texts.
+    """
+    params = Params.from_file(os.path.join(model_path, "config.json"))
+    import_plugins(params)
+    reader = DatasetReader.from_params(params.duplicate().pop("reader"))
+    model = Model.load(params, model_path)
+    model.eval()
+    summarizer = BatchSummarizer(model, reader)
+    tokens_count = 0
+    start_time = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        tensors = summarizer.make_tensors(summarizer.tokenize(texts[start:start + batch_size]))
+        with torch.no_grad():
+            output_dict = model.decode(model(**tensors))
+        tokens_count += sum(len(tokens) for tokens in output_dict["predicted_tokens"])
+    return tokens_count / (time.perf_counter() - start_time)
+
+
+def make_report(model_path, output_path, ranks, target_embedding_ranks=None, weights_path=None, test_path=None,
+                max_count=1000, batch_size=32):
+    """
+    Compresses the model with every rank to <output_path>/rank<rank> and compares sizes, speed and ROUGE
+    with the original model.
+    """
+    weights_path = weights_path or os.path.join(model_path, "best.th")
+    target_embedding_ranks = target_embedding_ranks or [None] * len(ranks)
+    assert len(target_embedding_ranks) == len(ranks), "Target embedding ranks should match the ranks"
+    models = [{"name": "original", "model_path": model_path,
+               "size_mb": get_size_mb(torch.load(weights_path, map_location="cpu"))}]
+    for rank, target_embedding_rank in zip(ranks, target_embedding_ranks):
+        compressed_path = os.path.join(output_path, "rank{}".format(rank))
+        state_dict = compress(model_path, compressed_path, rank, target_embedding_rank, weights_path)
+        models.append({"name": os.path.basename(compressed_path), "model_path": compressed_path,
+                       "output_projection_rank": rank, "target_embedding_rank": target_embedding_rank,
+                       "size_mb": get_size_mb(state_dict)})
+
+    if test_path:
+        params = Params.from_file(os.path.join(model_path, "config.json"))
+        import_plugins(params)
+        reader = DatasetReader.from_params(params.pop("reader"))
+        texts = [source for source, _ in islice(reader.parse_set(test_path), max_count)]
+        for model in models:
+            model["tokens_per_second"] = measure_decoding(model["model_path"], texts, batch_size)
+            metrics = evaluate(model["model_path"], test_path, config_path=None, metric="rouge", is_multiple_ref=False,
+                               max_count=max_count, report_every=max_count + 1, batch_size=batch_size)
+            model["rouge"] = metrics["rouge"]
+
+    for model in models:
+        line = "{:<20} size: {:8.1f}MB".format(model["name"], model["size_mb"])
+        if "tokens_per_second" in model:
+            line += " tokens/sec: {:8.1f} ROUGE-1-F: {:.4f} ROUGE-L-F: {:.4f}".format(
+                model["tokens_per_second"], model["rouge"]["rouge-1"]["f"], model["rouge"]["rouge-l"]["f"])
+        print(line)
+    os.makedirs(output_path, exist_ok=True)
+    with open(os.path.join(output_path, "report.json"), "w", encoding="utf-8") as w:
+        json.dump({"models": models}, w, ensure_ascii=False, indent=2)
+    return models
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Low rank compression of the output projection of pgn and seq2seq")
+    parser.add_argument('--model-path', required=True, help="path to directory with model's files")
+    parser.add_argument('--output-path', required=True, help="directory for compressed models and report")
+    parser.add_argument('--ranks', type=int, nargs='+', required=True, help="ranks of the output projection")
+    parser.add_argument('--target-embedding-ranks', type=int, nargs='*', default=None,
+                        help="ranks of the target embeddings, one for every output projection rank")
+    parser.add_argument('--weights-path', default=None, help="path to weights, best.th in model directory by default")
+    parser.add_argument('--test-path', default=None, help="test dataset to measure speed and ROUGE on")
+    parser.add_argument('--max-count', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    make_report(**vars(args))
@@ -0,0 +1,109 @@
+import time
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+from allennlp.common.params import Params
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+
+from summarus import import_plugins
+from summarus.dedup import MinHasher, find_duplicates, write_skip_list
+from summarus.offset_index import load_offset_index, read_records
+
+worker_reader = None
+worker_hasher = None
+
+
+def init_worker(reader, hasher):
+    global worker_reader, worker_hasher
+    worker_reader = reader
+    worker_hasher = hasher
+
+
+def get_signatures(chunk):
+    """
+    Signatures of a chunk of (index, record) pairs. With a reader in the worker records are raw
+    and parsed here, so HTML cleaning runs in parallel too.
+    """
+    indices = []
+    texts = []
+    for index, record in chunk:
+        if worker_reader is not None:
+            record = worker_reader.parse_record(record)
+            if not record:
+                continue
+            record = record[0]
+        indices.append(index)
+        texts.append(record)
+    return indices, worker_hasher.signatures(texts)
+
+
+def get_records(reader, dataset_path):
+    """
+    Raw records for readers with an offset index, parsed texts otherwise.
+    Records are numbered in the iterate_records order, the same way the readers skip them.
+    """
+    if reader.offset_index_type:
+        offsets = load_offset_index(dataset_path, reader.offset_index_type)
+        return read_records(dataset_path, offsets, range(len(offsets) - 1))
+    return ((index, text) for index, (text, _) in reader.iterate_records(dataset_path))
+
+
+def get_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def dedup(dataset_path, config_path, output_path, num_workers, num_perm, bands, shingle_size, threshold,
+          chunk_size, seed):
+    params = Params.from_file(config_path)
+    import_plugins(params)
+    reader_params = params.pop("reader", default=Params({}))
+    reader_params.pop("skip_list_path", None)
+    reader = DatasetReader.from_params(reader_params)
+    hasher = MinHasher(num_perm, shingle_size, seed)
+
+    start_time = time.time()
+    records = get_records(reader, dataset_path)
+    worker_args = (reader if reader.offset_index_type else None, hasher)
+    indices = []
+    chunks = []
+    with Pool(num_workers, initializer=init_worker, initargs=worker_args) as pool:
+        for chunk_indices, chunk_signatures in pool.imap(get_signatures, get_chunks(records, chunk_size)):
+            indices.extend(chunk_indices)
+            chunks.append(chunk_signatures)
+    signatures = np.concatenate(chunks) if chunks else np.zeros((0, num_perm), dtype=np.uint32)
+    signatures_time = time.time() - start_time
+
+    duplicates = [indices[i] for i in find_duplicates(signatures, bands, threshold)]
+    write_skip_list(duplicates, output_path)
+    total_time = time.time() - start_time
+
+    records_count = signatures.shape[0]
+    print("Records: {}, duplicates: {} ({:.1f}%), left: {}".format(
+        records_count, len(duplicates), 100. * len(duplicates) / max(records_count, 1),
+        records_count - len(duplicates)))
+    print("Time: signatures {:.1f}s, clustering {:.1f}s, total {:.1f}s".format(
+        signatures_time, total_time - signatures_time, total_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate filtering of training datasets with MinHash LSH")
+    parser.add_argument('--dataset-path', required=True)
+    parser.add_argument('--config-path', required=True, help="config with the reader of the dataset")
+    parser.add_argument('--output-path', required=True, help="path to skip-list with indices of duplicates")
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--bands', type=int, default=16)
+    parser.add_argument('--shingle-size', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    dedup(**vars(args))
@@ -1,6 +1,8 @@
 import os
 import argparse
+import logging
 import re
+import time
 from typing import Dict
 
 from allennlp.common.params import Params
@@ -11,6 +13,8 @@ import torch
 from rouge import Rouge
 
 from summarus import *
+from summarus.memory import MemoryTelemetry
+from summarus.iterators.token_budget_iterator import predict_with_token_budget
 
 
 def detokenize(text):
@@ -40,24 +44,47 @@ def get_batches(reader: SummarizationReader, test_path: str, batch_size: int) ->
         yield batch
 
 
-def evaluate(model_path, test_path, config_path, metric, is_multiple_ref, max_count, report_every, batch_size):
+def get_metrics(hyps, refs, metric):
+    metrics = dict()
+    if metric in ("bleu", "all"):
+        from nltk.translate.bleu_score import corpus_bleu
+        metrics["bleu"] = corpus_bleu(refs, hyps)
+    if metric in ("rouge", "all"):
+        metrics["rouge"] = Rouge().get_scores(hyps, [r[0] for r in refs], avg=True)
+    return metrics
+
+
+def evaluate(model_path, test_path, config_path, metric, is_multiple_ref, max_count, report_every, batch_size,
+             max_tokens=None, memory_log_path=None, memory_log_every=1,
+             preselect_max_tokens=None, preselect_method="tfidf"):
     params_path = config_path or os.path.join(model_path, "config.json")
 
     params = Params.from_file(params_path)
     is_subwords = "tokenizer" in params["reader"] and params["reader"]["tokenizer"]["type"] == "subword"
     reader = DatasetReader.from_params(params.pop("reader"))
+    if preselect_max_tokens:
+        reader.set_preselection(preselect_max_tokens, preselect_method)
 
     device = 0 if torch.cuda.is_available() else -1
     model = Model.load(params, model_path, cuda_device=device)
     model.training = False
     print(model)
     print("Trainable params count: ", sum(p.numel() for p in model.parameters() if p.requires_grad))
+    if memory_log_path:
+        logging.basicConfig(level=logging.INFO)
+        MemoryTelemetry(memory_log_path, memory_log_every).attach(model)
 
     hyps = []
     refs = []
     predictor = Seq2SeqPredictor(model, reader)
+    prediction_time = 0.
     for batch in get_batches(reader, test_path, batch_size):
-        outputs = predictor.predict_batch_json(batch)
+        start_time = time.time()
+        if max_tokens:
+            outputs = predict_with_token_budget(predictor, batch, max_tokens, reader._source_max_tokens)
+        else:
+            outputs = predictor.predict_batch_json(batch)
+        prediction_time += time.time() - start_time
         targets = [b.get('target') for b in batch]
         for output, target in zip(outputs, targets):
             decoded_words = output["predicted_tokens"]
@@ -88,20 +115,25 @@ def evaluate(model_path, test_path, config_path, metric, is_multiple_ref, max_co
 
             if len(hyps) % report_every == 0:
                 print("Count: ", len(hyps))
+                print("Prediction time per example, ms: ", prediction_time * 1000. / len(hyps))
                 print("Ref: ", ref)
                 print("Hyp: ", hyp)
 
-                if metric in ("bleu", "all"):
-                    from nltk.translate.bleu_score import corpus_bleu
-                    print("BLEU: ", corpus_bleu(refs, hyps))
-
-                if metric in ("rouge", "all"):
-                    rouge = Rouge()
-                    scores = rouge.get_scores(hyps, [r[0] for r in refs], avg=True)
-                    print("ROUGE: ", scores)
+                metrics = get_metrics(hyps, refs, metric)
+                if "bleu" in metrics:
+                    print("BLEU: ", metrics["bleu"])
+                if "rouge" in metrics:
+                    print("ROUGE: ", metrics["rouge"])
 
             if max_count and len(hyps) >= max_count:
                 break
+        if max_count and len(hyps) >= max_count:
+            break
+
+    metrics = get_metrics(hyps, refs, metric)
+    metrics["count"] = len(hyps)
+    metrics["prediction_time_ms"] = prediction_time * 1000. / max(len(hyps), 1)
+    return metrics
 
 
 def main(**kwargs):
@@ -119,6 +151,12 @@ if __name__ == "__main__":
     parser.add_argument('--max-count', type=int, default=None)
     parser.add_argument('--report-every', type=int, default=100)
     parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-tokens', type=int, default=None, help="max padded source tokens in a batch")
+    parser.add_argument('--memory-log-path', default=None, help="path to JSONL file with per-batch memory usage")
+    parser.add_argument('--memory-log-every', type=int, default=1)
+    parser.add_argument('--preselect-max-tokens', type=int, default=None,
+                        help="keep only the most salient sentences that fit into this number of tokens")
+    parser.add_argument('--preselect-method', choices=("tfidf", "centrality"), default="tfidf")
     parser.set_defaults(is_multiple_ref=False)
 
     args = parser.parse_args()
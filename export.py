@@ -0,0 +1,19 @@
+import os
+import argparse
+
+from summarus.artifact import export_artifact
+
+
+def export(model_path, output_path, config_path=None, weights_path=None):
+    assert os.path.isdir(model_path), "Model directory does not exist"
+    export_artifact(model_path, output_path, config_path, weights_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export of a model directory to a single-file artifact")
+    parser.add_argument('--model-path', required=True, help="path to directory with model's files")
+    parser.add_argument('--output-path', required=True, help="path to the artifact file")
+    parser.add_argument('--config-path', default=None)
+    parser.add_argument('--weights-path', default=None, help="path to weights, best.th in model directory by default")
+    args = parser.parse_args()
+    export(**vars(args))
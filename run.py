@@ -1,5 +1,10 @@
 import os
+import json
+import shutil
 import argparse
+import logging
+from collections import deque
+from multiprocessing import Pool
 
 import torch
 from bs4 import BeautifulSoup
@@ -8,56 +13,310 @@ from allennlp.models.model import Model
 from allennlp.predictors.seq2seq import Seq2SeqPredictor
 from allennlp.data.dataset_readers.dataset_reader import DatasetReader
 
-from summarus import *
+from summarus import instrumentation, import_plugins
+from summarus.instrumentation import timer
+from summarus.memory import MemoryTelemetry
+from summarus.decoding import join_tokens
+from summarus.artifact import is_artifact, load_artifact
+from summarus.batch_summarizer import BatchSummarizer
+from summarus.long_document import LongDocumentSummarizer
+from summarus.iterators.token_budget_iterator import predict_with_token_budget
 
 
-def get_batches(test_path, batch_size):
-    with open(test_path, "r", encoding="utf-8") as f:
+PROGRESS_FILE_NAME = "progress.json"
+TUNING_FILE_NAME = "tuning.json"
+# Settings found by autotune.py and their defaults
+TUNED_SETTINGS = {"batch_size": 1024, "num_threads": None, "num_processes": 1}
+FALLBACK_SUMMARY = "заявил"
+MAX_SOURCE_CHARS = 15000
+
+logger = logging.getLogger(__name__)
+
+
+def clean_source(line, max_chars=MAX_SOURCE_CHARS):
+    source = line.strip().lower()
+    with timer("run.clean_html"):
+        source = BeautifulSoup(source, 'html.parser').text[:max_chars]
+    if len(source) <= 3:
+        source = "риа новости"
+    return source
+
+
+def get_batches(test_path, batch_size, start_offset=0):
+    """
+    Yields batches of raw input lines with the input byte offset right after the last one.
+    Lines are cleaned by summarize_batch, in the worker processes.
+    """
+    with open(test_path, "rb") as f:
+        f.seek(start_offset)
+        offset = start_offset
         batch = []
-        for source in f:
-            source = source.strip().lower()
-            source = BeautifulSoup(source, 'html.parser').text[:15000]
-            if len(source) <= 3:
-                source = "риа новости"
-            batch.append({"source": source})
+        for line in f:
+            offset += len(line)
+            batch.append(line.decode("utf-8", errors="replace"))
             if len(batch) == batch_size:
-                yield batch
+                yield batch, offset
                 batch = []
         if batch:
-            yield batch
+            yield batch, offset
 
 
-def run(model_path, test_path, config_path, output_path, batch_size):
-    params_path = config_path or os.path.join(model_path, "config.json")
+def load_model(model_path, config_path=None, cuda_device=-1):
+    if is_artifact(model_path):
+        return load_artifact(model_path, cuda_device=cuda_device)
 
+    params_path = config_path or os.path.join(model_path, "config.json")
     params = Params.from_file(params_path)
-    is_subwords = "tokenizer" in params["reader"] and params["reader"]["tokenizer"]["type"] == "subword"
-    reader = DatasetReader.from_params(params.pop("reader"))
+    import_plugins(params)
+    reader = DatasetReader.from_params(params.duplicate().pop("reader"))
+    model = Model.load(params, model_path, cuda_device=cuda_device)
+    return model, reader, params
+
+
+def predict_batch(predictor, batch, max_tokens=None, source_max_tokens=None):
+    def predict(documents):
+        if max_tokens:
+            return predict_with_token_budget(predictor, documents, max_tokens, source_max_tokens)
+        return predictor.predict_batch_json(documents)
+
+    return predict_isolated(predict, batch)
+
+
+def predict_isolated(predict, batch):
+    """
+    Predicts the whole batch at once. If that fails, documents are predicted one by one,
+    and the ones that fail alone get None instead of an output.
+    """
+    try:
+        return predict(batch)
+    except Exception:
+        logger.exception("Batch failed, predicting its documents one by one")
+    outputs = []
+    for document in batch:
+        try:
+            outputs.extend(predict([document]))
+        except Exception:
+            logger.exception("Document failed: %s", document["source"][:100])
+            instrumentation.increment("run.failed_documents")
+            outputs.append(None)
+    return outputs
+
+
+def get_summary(output, is_subwords):
+    decoded_words = output["predicted_tokens"] if output else None
+    if not decoded_words:
+        decoded_words = [FALLBACK_SUMMARY]
+    return fix_summary(join_tokens(decoded_words, is_subwords))
+
+
+def fix_summary(hyp):
+    if not hyp or len(hyp) <= 3:
+        return FALLBACK_SUMMARY
+    return hyp
+
+
+def write_atomically(path, text):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wt", encoding="utf-8") as w:
+        w.write(text)
+        w.flush()
+        os.fsync(w.fileno())
+    os.replace(temp_path, path)
+
+
+def get_part_path(work_dir, part_number):
+    return os.path.join(work_dir, "part-{:06d}.txt".format(part_number))
+
+
+def get_input_identity(test_path):
+    stat = os.stat(test_path)
+    return {"path": os.path.abspath(test_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def read_progress(work_dir, input_identity):
+    """
+    Progress of the job in work_dir, refuses to resume a job with another or changed input file,
+    its offsets and parts would not match the input.
+    """
+    progress_path = os.path.join(work_dir, PROGRESS_FILE_NAME)
+    if not os.path.exists(progress_path):
+        return {"input_offset": 0, "parts_count": 0, "documents_count": 0, "input": input_identity}
+    with open(progress_path, "r", encoding="utf-8") as r:
+        progress = json.load(r)
+    assert progress.get("input") == input_identity, \
+        "Work directory {} belongs to another input file: {}, use a new one".format(work_dir, progress.get("input"))
+    return progress
+
 
+def merge_parts(work_dir, parts_count, output_path):
+    temp_output_path = output_path + ".tmp"
+    with open(temp_output_path, "wb") as w:
+        for part_number in range(parts_count):
+            with open(get_part_path(work_dir, part_number), "rb") as r:
+                shutil.copyfileobj(r, w)
+    os.replace(temp_output_path, output_path)
+
+
+def remove_parts(work_dir, parts_count):
+    # Progress goes first, so an interrupted removal never leaves progress pointing at missing parts.
+    # An empty input has no progress file at all.
+    progress_path = os.path.join(work_dir, PROGRESS_FILE_NAME)
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    for part_number in range(parts_count):
+        os.remove(get_part_path(work_dir, part_number))
+
+
+# Model, predictor and settings of the current process, see init_worker
+_worker = dict()
+
+
+def init_worker(model_path, config_path=None, max_tokens=None, preselect_max_tokens=None, preselect_method="tfidf",
+                num_threads=None, memory_log_path=None, memory_log_every=1, chunk_tokens=None, chunk_overlap=50,
+                chunk_batch_size=32):
+    if num_threads:
+        torch.set_num_threads(num_threads)
     device = 0 if torch.cuda.is_available() else -1
-    model = Model.load(params, model_path, cuda_device=device)
+    model, reader, params = load_model(model_path, config_path, device)
     model.training = False
+    if preselect_max_tokens:
+        reader.set_preselection(preselect_max_tokens, preselect_method)
+    if memory_log_path:
+        MemoryTelemetry(memory_log_path, memory_log_every).attach(model)
+    is_subwords = "tokenizer" in params["reader"] and params["reader"]["tokenizer"]["type"] == "subword"
+    long_summarizer = None
+    if chunk_tokens:
+        long_summarizer = LongDocumentSummarizer(BatchSummarizer(model, reader, is_subwords),
+                                                 chunk_tokens, chunk_overlap, chunk_batch_size)
+    _worker.update(
+        # Long documents are not cut, they are summarized by chunks
+        max_chars=None if chunk_tokens else MAX_SOURCE_CHARS,
+        predictor=Seq2SeqPredictor(model, reader),
+        long_summarizer=long_summarizer,
+        is_subwords=is_subwords,
+        max_tokens=max_tokens,
+        source_max_tokens=reader._source_max_tokens
+    )
+
+
+def summarize_batch(lines):
+    batch = [{"source": clean_source(line, _worker["max_chars"])} for line in lines]
+    long_summarizer = _worker["long_summarizer"]
+    if long_summarizer:
+        with timer("run.predict"):
+            summaries = predict_isolated(
+                lambda documents: long_summarizer.summarize([document["source"] for document in documents]), batch)
+        instrumentation.increment("run.documents", len(batch))
+        return [fix_summary(summary) for summary in summaries]
+
+    with timer("run.predict"):
+        outputs = predict_batch(_worker["predictor"], batch, _worker["max_tokens"], _worker["source_max_tokens"])
+    assert len(outputs) == len(batch)
+    instrumentation.increment("run.documents", len(batch))
+    with timer("run.postprocess"):
+        return [get_summary(output, _worker["is_subwords"]) for output in outputs]
+
+
+def _summarize_batch_with_offset(batch_with_offset):
+    batch, end_offset = batch_with_offset
+    return summarize_batch(batch), end_offset
+
+
+def imap_bounded(pool, func, iterable, max_pending):
+    """
+    Ordered pool.imap that takes new items from iterable only while fewer than max_pending results are pending,
+    so the input is not read ahead of the workers.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def run(model_path, test_path, config_path, output_path, batch_size, max_tokens=None,
+        memory_log_path=None, memory_log_every=1, preselect_max_tokens=None, preselect_method="tfidf",
+        work_dir=None, num_threads=None, num_processes=1, chunk_tokens=None, chunk_overlap=50, chunk_batch_size=32):
+    worker_args = (model_path, config_path, max_tokens, preselect_max_tokens, preselect_method,
+                   num_threads, memory_log_path, memory_log_every, chunk_tokens, chunk_overlap, chunk_batch_size)
+    assert num_processes == 1 or not memory_log_path, "Memory telemetry is supported only in one process"
+    assert not chunk_tokens or not preselect_max_tokens, "Long documents are summarized whole, without preselection"
+
+    # With work_dir every batch is committed as a part file together with the input offset after it,
+    # a restarted run continues from the last committed batch and the parts are merged at the end
+    progress = {"input_offset": 0, "parts_count": 0, "documents_count": 0}
+    if work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+        progress = read_progress(work_dir, get_input_identity(test_path))
+        if progress["parts_count"]:
+            logger.info("Resuming after %d documents", progress["documents_count"])
+    output_file = open(output_path, "wt", encoding="utf-8") if not work_dir else None
+
+    batches = get_batches(test_path, batch_size, progress["input_offset"])
+    pool = None
+    if num_processes > 1:
+        # Every process has its own model, batches are summarized in parallel and written in order
+        pool = Pool(num_processes, initializer=init_worker, initargs=worker_args)
+        results = imap_bounded(pool, _summarize_batch_with_offset, batches, 2 * num_processes)
+    else:
+        init_worker(*worker_args)
+        results = map(_summarize_batch_with_offset, batches)
+
+    for summaries, end_offset in results:
+        text = "".join(summary + "\n" for summary in summaries)
+        if work_dir:
+            write_atomically(get_part_path(work_dir, progress["parts_count"]), text)
+            progress["input_offset"] = end_offset
+            progress["parts_count"] += 1
+            progress["documents_count"] += len(summaries)
+            write_atomically(os.path.join(work_dir, PROGRESS_FILE_NAME), json.dumps(progress))
+        else:
+            output_file.write(text)
+        instrumentation.maybe_log()
+
+    if pool:
+        pool.close()
+        pool.join()
+    if work_dir:
+        merge_parts(work_dir, progress["parts_count"], output_path)
+        remove_parts(work_dir, progress["parts_count"])
+    else:
+        output_file.close()
+
+
+def get_tuning_path(model_path):
+    if os.path.isdir(model_path):
+        return os.path.join(model_path, TUNING_FILE_NAME)
+    return model_path + "." + TUNING_FILE_NAME
+
+
+def apply_tuning(kwargs, tuning_path=None):
+    """
+    Fills settings missing in the command line from the autotune.py profile, then from the defaults.
+    """
+    tuning_path = tuning_path or get_tuning_path(kwargs["model_path"])
+    tuning = dict()
+    if os.path.exists(tuning_path):
+        with open(tuning_path, "r", encoding="utf-8") as r:
+            tuning = json.load(r)
+        logger.info("Tuning profile %s: %s", tuning_path,
+                    ", ".join("{}={}".format(key, tuning.get(key)) for key in TUNED_SETTINGS))
+    for key, default in TUNED_SETTINGS.items():
+        if kwargs.get(key) is None:
+            kwargs[key] = tuning.get(key, default)
+    return kwargs
+
 
-    predictor = Seq2SeqPredictor(model, reader)
-    with open(output_path, "wt", encoding="utf-8") as w:
-        for batch_number, batch in enumerate(get_batches(test_path, batch_size)):
-            outputs = predictor.predict_batch_json(batch)
-            assert len(outputs) == len(batch)
-            for output in outputs:
-                decoded_words = output["predicted_tokens"]
-                if not decoded_words:
-                    decoded_words = ["заявил"]
-                if not is_subwords:
-                    hyp = " ".join(decoded_words)
-                else:
-                    hyp = "".join(decoded_words).replace("▁", " ").replace("\n", "").strip()
-                if len(hyp) <= 3:
-                    hyp = "заявил"
-                w.write(hyp + "\n")
-
-
-def main(**kwargs):
-    assert os.path.isdir(kwargs['model_path'])
+def main(profile_path=None, profile_log_interval=None, tuning_path=None, **kwargs):
+    assert os.path.exists(kwargs['model_path'])
+    if profile_path or kwargs.get('memory_log_path') or kwargs.get('work_dir'):
+        logging.basicConfig(level=logging.INFO)
+    if profile_path:
+        instrumentation.enable(dump_path=profile_path, log_interval=profile_log_interval)
+    kwargs = apply_tuning(kwargs, tuning_path)
+    assert kwargs["num_processes"] == 1 or not profile_path, "Profiling is supported only in one process"
     run(**kwargs)
 
 
@@ -67,7 +326,25 @@ if __name__ == "__main__":
     parser.add_argument('--test-path', default="/input.txt")
     parser.add_argument('--config-path', default=None)
     parser.add_argument('--output-path', default="/output.txt")
-    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--batch-size', type=int, default=None, help="1024 if not tuned")
+    parser.add_argument('--max-tokens', type=int, default=None, help="max padded source tokens in a batch")
+    parser.add_argument('--profile-path', default=None, help="path to JSON file with per-stage timings")
+    parser.add_argument('--profile-log-interval', type=float, default=60.0)
+    parser.add_argument('--memory-log-path', default=None, help="path to JSONL file with per-batch memory usage")
+    parser.add_argument('--memory-log-every', type=int, default=1)
+    parser.add_argument('--preselect-max-tokens', type=int, default=None,
+                        help="keep only the most salient sentences that fit into this number of tokens")
+    parser.add_argument('--preselect-method', choices=("tfidf", "centrality"), default="tfidf")
+    parser.add_argument('--work-dir', default=None,
+                        help="directory with progress and output parts, a rerun with it resumes the job")
+    parser.add_argument('--num-threads', type=int, default=None, help="number of torch threads per process")
+    parser.add_argument('--num-processes', type=int, default=None, help="number of inference processes")
+    parser.add_argument('--chunk-tokens', type=int, default=None,
+                        help="summarize whole documents by chunks of this number of tokens, map-reduce style")
+    parser.add_argument('--chunk-overlap', type=int, default=50, help="number of tokens shared by adjacent chunks")
+    parser.add_argument('--chunk-batch-size', type=int, default=32, help="number of chunks to run simultaneously")
+    parser.add_argument('--tuning-path', default=None,
+                        help="path to autotune.py profile, tuning.json next to the model by default")
 
     args = parser.parse_args()
     main(**vars(args))
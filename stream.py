@@ -0,0 +1,44 @@
+import sys
+import argparse
+import logging
+
+import torch
+
+from summarus import instrumentation
+from summarus.streaming import StreamingSummarizer
+from run import load_model
+
+
+def stream(model_path, config_path, beam_size, max_steps, input_file=sys.stdin, output_file=sys.stdout):
+    device = 0 if torch.cuda.is_available() else -1
+    model, reader, params = load_model(model_path, config_path, device)
+    is_subwords = "tokenizer" in params["reader"] and params["reader"]["tokenizer"]["type"] == "subword"
+    summarizer = StreamingSummarizer(model, reader, beam_size=beam_size, max_steps=max_steps)
+    for source in input_file:
+        source = source.strip().lower()
+        if not source:
+            continue
+        for i, token in enumerate(summarizer.stream(source)):
+            if is_subwords:
+                token = token.replace("▁", " ") if i != 0 else token.replace("▁", "")
+            elif i != 0:
+                token = " " + token
+            output_file.write(token)
+            output_file.flush()
+        output_file.write("\n")
+        output_file.flush()
+        instrumentation.maybe_log()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token by token summarization of texts from standard input")
+    parser.add_argument('--model-path', required=True, help="path to directory with model's files or artifact")
+    parser.add_argument('--config-path', default=None)
+    parser.add_argument('--beam-size', type=int, default=None)
+    parser.add_argument('--max-steps', type=int, default=None)
+    parser.add_argument('--profile-path', default=None, help="path to JSON file with time to first token and latency")
+    args = parser.parse_args()
+    if args.profile_path:
+        logging.basicConfig(level=logging.INFO)
+        instrumentation.enable(dump_path=args.profile_path)
+    stream(args.model_path, args.config_path, args.beam_size, args.max_steps)
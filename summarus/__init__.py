@@ -1,5 +1,58 @@
-from summarus.copynet import CustomCopyNetSeq2Seq
-from summarus.seq2seq import Seq2Seq
-from summarus.pgn import PointerGeneratorNetwork
-from summarus.bahdanau_attention import BahdanauAttention
-from summarus.readers import *
+import importlib
+
+from summarus.lazy import make_lazy
+
+make_lazy(__name__, {
+    "CustomCopyNetSeq2Seq": "summarus.copynet",
+    "Seq2Seq": "summarus.seq2seq",
+    "PointerGeneratorNetwork": "summarus.pgn",
+    "BahdanauAttention": "summarus.bahdanau_attention",
+    "SparseBahdanauAttention": "summarus.sparse_bahdanau_attention",
+    "SubwordTokenizer": "summarus.subword_tokenizer",
+    "SummarizationReader": "summarus.readers.summarization_reader",
+    "CNNDailyMailReader": "summarus.readers.cnn_dailymail_reader",
+    "ContractsReader": "summarus.readers.contracts_reader",
+    "LentaReader": "summarus.readers.lenta_reader",
+    "RIAReader": "summarus.readers.ria_reader",
+    "TokenBudgetIterator": "summarus.iterators.token_budget_iterator",
+})
+
+# Registered names of models, readers, tokenizers, attentions and iterators and their modules
+PLUGINS = {
+    "custom_copynet_seq2seq": "summarus.copynet",
+    "seq2seq": "summarus.seq2seq",
+    "pgn": "summarus.pgn",
+    "bahdanau": "summarus.bahdanau_attention",
+    "sparse_bahdanau": "summarus.sparse_bahdanau_attention",
+    "subword": "summarus.subword_tokenizer",
+    "cnn_dailymail": "summarus.readers.cnn_dailymail_reader",
+    "contracts": "summarus.readers.contracts_reader",
+    "lenta": "summarus.readers.lenta_reader",
+    "ria": "summarus.readers.ria_reader",
+    "token_budget": "summarus.iterators.token_budget_iterator",
+}
+
+
+def _find_types(params, types):
+    if isinstance(params, dict):
+        if isinstance(params.get("type"), str):
+            types.add(params["type"])
+        for value in params.values():
+            _find_types(value, types)
+    elif isinstance(params, list):
+        for value in params:
+            _find_types(value, types)
+    return types
+
+
+def import_plugins(params=None) -> None:
+    """
+    Imports and registers the components used by the config, all of them when params are None.
+    """
+    if params is None:
+        modules = set(PLUGINS.values())
+    else:
+        params = params.as_dict(quiet=True) if hasattr(params, "as_dict") else params
+        modules = {PLUGINS[name] for name in _find_types(params, set()) if name in PLUGINS}
+    for module in sorted(modules):
+        importlib.import_module(module)
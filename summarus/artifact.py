@@ -0,0 +1,157 @@
+import os
+import json
+import atexit
+import struct
+import tempfile
+from typing import Dict, Tuple
+
+import numpy as np
+import torch
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model, remove_pretrained_embedding_params
+
+from summarus import import_plugins
+
+MAGIC = b"SUMMARUS"
+ALIGNMENT = 64
+NEWLINE_REPLACEMENT = "@@NEWLINE@@"
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _get_subword_model_path(config: Dict) -> str:
+    tokenizer = config.get("reader", {}).get("tokenizer", {})
+    return tokenizer.get("model_path") if tokenizer.get("type") == "subword" else None
+
+
+def export_artifact(model_path: str, output_path: str, config_path: str = None, weights_path: str = None) -> None:
+    """
+    Writes config, vocabulary, weights and subword model of the model directory into one file:
+    magic, header length, JSON header and 64-byte aligned raw blocks described by the header.
+    """
+    config_path = config_path or os.path.join(model_path, "config.json")
+    weights_path = weights_path or os.path.join(model_path, "best.th")
+    config = Params.from_file(config_path).as_dict(quiet=True)
+    vocabulary = Vocabulary.from_files(os.path.join(model_path, "vocabulary"))
+    state_dict = torch.load(weights_path, map_location="cpu")
+
+    blocks = []
+    offset = 0
+
+    def add_block(data: bytes) -> Dict:
+        nonlocal offset
+        offset = _align(offset)
+        block = {"offset": offset, "nbytes": len(data)}
+        blocks.append((offset, data))
+        offset += len(data)
+        return block
+
+    namespaces = dict()
+    for namespace, index_to_token in vocabulary._index_to_token.items():
+        tokens = [index_to_token[i].replace("\n", NEWLINE_REPLACEMENT) for i in range(len(index_to_token))]
+        namespaces[namespace] = add_block("\n".join(tokens).encode("utf-8"))
+
+    tensors = dict()
+    stored = dict()
+    for name, tensor in state_dict.items():
+        array = tensor.detach().cpu().contiguous().numpy()
+        # Tied weights are stored once
+        key = (tensor.data_ptr(), tuple(tensor.size()), str(tensor.dtype))
+        if key not in stored:
+            stored[key] = add_block(array.tobytes())
+        tensors[name] = dict(stored[key], dtype=array.dtype.str, shape=list(array.shape))
+
+    files = dict()
+    subword_model_path = _get_subword_model_path(config)
+    if subword_model_path:
+        with open(subword_model_path, "rb") as r:
+            files["subword_model"] = add_block(r.read())
+
+    header = {
+        "config": config,
+        "vocabulary": {
+            "namespaces": namespaces,
+            "non_padded_namespaces": sorted(vocabulary._non_padded_namespaces)
+        },
+        "tensors": tensors,
+        "files": files
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+    with open(output_path, "wb") as w:
+        w.write(MAGIC)
+        w.write(struct.pack("<Q", len(header_bytes)))
+        w.write(header_bytes)
+        for block_offset, data in blocks:
+            w.seek(data_start + block_offset)
+            w.write(data)
+
+
+def read_header(path: str) -> Tuple[Dict, int]:
+    with open(path, "rb") as r:
+        assert r.read(len(MAGIC)) == MAGIC, "Not a model artifact: {}".format(path)
+        header_length = struct.unpack("<Q", r.read(8))[0]
+        header = json.loads(r.read(header_length).decode("utf-8"))
+    return header, _align(len(MAGIC) + 8 + header_length)
+
+
+def is_artifact(path: str) -> bool:
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as r:
+        return r.read(len(MAGIC)) == MAGIC
+
+
+def _load_vocabulary(header: Dict, data: np.ndarray) -> Vocabulary:
+    vocabulary_header = header["vocabulary"]
+    vocabulary = Vocabulary(non_padded_namespaces=vocabulary_header["non_padded_namespaces"])
+    for namespace, block in vocabulary_header["namespaces"].items():
+        text = data[block["offset"]:block["offset"] + block["nbytes"]].tobytes().decode("utf-8")
+        tokens = [token.replace(NEWLINE_REPLACEMENT, "\n") for token in text.split("\n")] if text else []
+        vocabulary._token_to_index[namespace] = {token: index for index, token in enumerate(tokens)}
+        vocabulary._index_to_token[namespace] = dict(enumerate(tokens))
+    return vocabulary
+
+
+def _extract_file(data: np.ndarray, block: Dict, suffix: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "wb") as w:
+        w.write(data[block["offset"]:block["offset"] + block["nbytes"]].tobytes())
+    atexit.register(os.remove, path)
+    return path
+
+
+def load_artifact(path: str, cuda_device: int = -1, mmap: bool = True) -> Tuple[Model, DatasetReader, Params]:
+    """
+    Loads the model, the reader and the config from a file written by export_artifact.
+    With mmap the weights are not read until used and memory pages are shared between processes.
+    """
+    header, data_start = read_header(path)
+    # Copy-on-write mapping: tensors are writable, but the file is never modified
+    data = np.memmap(path, dtype=np.uint8, mode="c", offset=data_start)
+
+    config = header["config"]
+    if "subword_model" in header["files"]:
+        config["reader"]["tokenizer"]["model_path"] = _extract_file(data, header["files"]["subword_model"], ".model")
+    import_plugins(config)
+    params = Params(config)
+
+    vocabulary = _load_vocabulary(header, data)
+    reader = DatasetReader.from_params(params.duplicate().pop("reader"))
+    model_params = params.duplicate().pop("model")
+    remove_pretrained_embedding_params(model_params)
+    model = Model.from_params(vocab=vocabulary, params=model_params)
+
+    for name, variable in model.state_dict(keep_vars=True).items():
+        entry = header["tensors"][name]
+        array = data[entry["offset"]:entry["offset"] + entry["nbytes"]].view(np.dtype(entry["dtype"]))
+        tensor = torch.from_numpy(array.reshape(entry["shape"]))
+        variable.data = tensor if mmap else tensor.clone()
+    if cuda_device >= 0:
+        model.cuda(cuda_device)
+    model.eval()
+    return model, reader, params
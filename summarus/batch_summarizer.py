@@ -0,0 +1,108 @@
+from typing import Dict, List
+
+import numpy as np
+import torch
+from allennlp.common.util import START_SYMBOL, END_SYMBOL
+from allennlp.data.vocabulary import DEFAULT_OOV_TOKEN
+from allennlp.data.token_indexers import SingleIdTokenIndexer
+from allennlp.models.model import Model
+from allennlp.nn import util
+
+from summarus.decoding import join_tokens
+from summarus.instrumentation import timer
+from summarus.preselection import preselect
+from summarus.readers.summarization_reader import SummarizationReader
+
+
+def pad_sequences(sequences: List[List[int]], dtype=np.int64) -> np.ndarray:
+    """
+    Right-padded with zeros matrix of sequences, filled with a single fancy-indexing assignment.
+    """
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    matrix = np.zeros((len(sequences), lengths.max() if len(sequences) else 0), dtype=dtype)
+    rows = np.repeat(np.arange(len(sequences)), lengths)
+    columns = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matrix[rows, columns] = np.fromiter((i for sequence in sequences for i in sequence),
+                                        dtype=dtype, count=int(lengths.sum()))
+    return matrix
+
+
+class BatchSummarizer:
+    """
+    Summarizes batches of raw or tokenized texts without JSON inputs, Instances and fields:
+    builds the same padded tensors as the reader and AllenNLP Batch would, including copy and PGN fields,
+    runs the model under no_grad and returns joined summaries.
+    Only single id token indexers are supported.
+    """
+    def __init__(self, model: Model, reader: SummarizationReader, is_subwords: bool = False):
+        self._model = model
+        self._reader = reader
+        self._is_subwords = is_subwords
+        self._source_indexer = self._get_indexer(reader._source_token_indexers)
+        source_namespace = self._source_indexer.namespace
+        target_namespace = reader._target_namespace
+        self._source_token_to_index = model.vocab.get_token_to_index_vocabulary(source_namespace)
+        self._source_oov_index = model.vocab.get_token_index(DEFAULT_OOV_TOKEN, source_namespace)
+        self._target_token_to_index = model.vocab.get_token_to_index_vocabulary(target_namespace)
+        self._target_oov_index = model.vocab.get_token_index(DEFAULT_OOV_TOKEN, target_namespace)
+
+    @staticmethod
+    def _get_indexer(token_indexers: Dict) -> SingleIdTokenIndexer:
+        assert list(token_indexers.keys()) == ["tokens"], "Only the 'tokens' indexer is supported"
+        indexer = token_indexers["tokens"]
+        assert isinstance(indexer, SingleIdTokenIndexer), "Only single id token indexers are supported"
+        return indexer
+
+    def tokenize(self, texts: List[str], truncate: bool = True) -> List[List[str]]:
+        """
+        Tokens of texts as the reader gets them, without preselection and truncation if truncate is False.
+        """
+        reader = self._reader
+        if truncate and reader._preselect_max_tokens:
+            with timer("reader.preselect"):
+                texts = [preselect(text, reader._preselect_max_tokens, reader._preselect_method) for text in texts]
+        max_tokens = reader._source_max_tokens if truncate else None
+        with timer("reader.tokenize"):
+            return [[token.text for token in reader._tokenizer.tokenize(text)][:max_tokens] for text in texts]
+
+    @staticmethod
+    def _get_token_ids(tokens: List[str]) -> List[int]:
+        # The same numbering as SummarizationReader._tokens_to_ids
+        ids = dict()
+        return [ids.setdefault(token.lower(), len(ids)) for token in tokens]
+
+    def make_tensors(self, tokenized_texts: List[List[str]]) -> Dict:
+        """
+        Model inputs for texts tokenized without start and end symbols.
+        """
+        reader = self._reader
+        lowercase = self._source_indexer.lowercase_tokens
+        source_tokens = [[START_SYMBOL] + tokens + [END_SYMBOL] for tokens in tokenized_texts]
+        source_ids = [[self._source_token_to_index.get(token.lower() if lowercase else token, self._source_oov_index)
+                       for token in tokens] for tokens in source_tokens]
+        tensors = {"source_tokens": {"tokens": torch.from_numpy(pad_sequences(source_ids))}}
+        if not reader._save_copy_fields and not reader._save_pgn_fields:
+            return tensors
+
+        # CopyNet fields exclude start and end symbols, PGN fields include them
+        copied_tokens = tokenized_texts if reader._save_copy_fields else source_tokens
+        source_to_target = [[self._target_token_to_index.get(token, self._target_oov_index) for token in tokens]
+                            for tokens in copied_tokens]
+        source_token_ids = [self._get_token_ids(tokens) for tokens in copied_tokens]
+        tensors["source_to_target"] = torch.from_numpy(pad_sequences(source_to_target))
+        tensors["source_token_ids"] = torch.from_numpy(pad_sequences(source_token_ids, dtype=np.float32))
+        tensors["metadata"] = [{"source_tokens": tokens} for tokens in copied_tokens]
+        return tensors
+
+    def summarize_tokens(self, tokenized_texts: List[List[str]]) -> List[str]:
+        model = self._model
+        model.eval()
+        with timer("batch_summarizer.make_tensors"):
+            tensors = self.make_tensors(tokenized_texts)
+        tensors = util.move_to_device(tensors, model._get_prediction_device())
+        with torch.no_grad():
+            output_dict = model.decode(model(**tensors))
+        return [join_tokens(tokens, self._is_subwords) for tokens in output_dict["predicted_tokens"]]
+
+    def summarize(self, texts: List[str]) -> List[str]:
+        return self.summarize_tokens(self.tokenize(texts))
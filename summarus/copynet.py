@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 import torch
 
@@ -9,12 +9,15 @@ from allennlp.modules import Attention, TextFieldEmbedder, Seq2SeqEncoder
 from allennlp.models.encoder_decoders.copynet_seq2seq import CopyNetSeq2Seq
 from allennlp.training.metrics import Metric
 
+from summarus.decoding import get_token_array, get_source_tokens, predictions_to_tokens
+from summarus.validation import ValidationDecodingMixin
+
 
 logger = logging.getLogger(__name__)
 
 
 @Model.register("custom_copynet_seq2seq")
-class CustomCopyNetSeq2Seq(CopyNetSeq2Seq):
+class CustomCopyNetSeq2Seq(CopyNetSeq2Seq, ValidationDecodingMixin):
     def __init__(self,
                  vocab: Vocabulary,
                  source_embedder: TextFieldEmbedder,
@@ -46,6 +49,7 @@ class CustomCopyNetSeq2Seq(CopyNetSeq2Seq):
             token_based_metric
         )
         self._tie_embeddings = tie_embeddings
+        self._target_token_array = None
 
         if self._tie_embeddings:
             assert source_namespace == target_namespace
@@ -56,11 +60,109 @@ class CustomCopyNetSeq2Seq(CopyNetSeq2Seq):
         if tensor_based_metric is None:
             self._tensor_based_metric = None
 
+    def forward(self,
+                source_tokens: Dict[str, torch.LongTensor],
+                source_token_ids: torch.Tensor,
+                source_to_target: torch.Tensor,
+                metadata: List[Dict[str, Any]],
+                target_tokens: Dict[str, torch.LongTensor] = None,
+                target_token_ids: torch.Tensor = None) -> Dict[str, torch.Tensor]:
+        # CopyNetSeq2Seq.forward with the validation decoding switch
+        state = self._encode(source_tokens)
+        state["source_token_ids"] = source_token_ids
+        state["source_to_target"] = source_to_target
+
+        output_dict = {}
+        if target_tokens:
+            state = self._init_decoder_state(state)
+            output_dict = self._forward_loss(target_tokens, target_token_ids, state)
+        output_dict["metadata"] = metadata
+
+        if self._should_decode(target_tokens is not None):
+            state = self._init_decoder_state(state)
+            predictions = self._forward_beam_search(state)
+            output_dict.update(predictions)
+            if target_tokens:
+                if self._tensor_based_metric is not None:
+                    best_predictions = output_dict["predictions"][:, 0, :]
+                    gold_tokens = self._gather_extended_gold_tokens(target_tokens["tokens"],
+                                                                    source_token_ids, target_token_ids)
+                    self._tensor_based_metric(best_predictions, gold_tokens)
+                if self._token_based_metric is not None:
+                    predicted_tokens = self._get_predicted_tokens(output_dict["predictions"], metadata, n_best=1)
+                    self._token_based_metric(predicted_tokens, [x["target_tokens"] for x in metadata])
+        return output_dict
+
     def decode(self, output_dict: Dict[str, torch.Tensor]) -> Dict[str, Any]:
-        predicted_tokens = self._get_predicted_tokens(
+        if self._target_token_array is None:
+            self._target_token_array = get_token_array(self.vocab, self._target_namespace)
+        output_dict["predicted_tokens"] = predictions_to_tokens(
             output_dict["predictions"],
-            output_dict["metadata"],
-            n_best=1
+            self._end_index,
+            self._target_token_array,
+            get_source_tokens(output_dict["metadata"])
         )
-        output_dict["predicted_tokens"] = predicted_tokens
         return output_dict
+
+    @staticmethod
+    def _get_first_occurrence_mask(source_token_ids: torch.Tensor) -> torch.Tensor:
+        """
+        Marks the first occurrence of every source token.
+        Sorting by (token id, position) puts the first occurrence at the start of every group of equal ids.
+        """
+        group_size, trimmed_source_length = source_token_ids.size()
+        positions = torch.arange(trimmed_source_length, device=source_token_ids.device).unsqueeze(0)
+        keys = source_token_ids * trimmed_source_length + positions
+        _, sorted_positions = keys.sort(dim=1)
+        sorted_ids = source_token_ids.gather(1, sorted_positions)
+        is_group_start = torch.ones_like(sorted_ids)
+        is_group_start[:, 1:] = (sorted_ids[:, 1:] != sorted_ids[:, :-1]).long()
+        return torch.zeros_like(source_token_ids).scatter_(1, sorted_positions, is_group_start).float()
+
+    @staticmethod
+    def _scatter_logsumexp(log_probs: torch.Tensor, index: torch.Tensor, values: torch.Tensor) -> torch.Tensor:
+        """
+        log(exp(log_probs) + scatter_add(exp(values))) for every row.
+        """
+        max_values = values.max(dim=1, keepdim=True)[0]
+        added = log_probs.new_zeros(log_probs.size()).scatter_add_(1, index, (values - max_values).exp())
+        added_log_probs = added.log() + max_values
+        max_log_probs = torch.max(log_probs, added_log_probs)
+        return max_log_probs + ((log_probs - max_log_probs).exp() + (added_log_probs - max_log_probs).exp()).log()
+
+    def _gather_final_log_probs(self,
+                                generation_log_probs: torch.Tensor,
+                                copy_log_probs: torch.Tensor,
+                                state: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """
+        Vectorized version of CopyNetSeq2Seq._gather_final_log_probs: the same result without
+        a Python loop over source positions.
+        """
+        source_to_target = state["source_to_target"]
+        source_token_ids = state["source_token_ids"].long()
+        if "source_first_occurrence_mask" not in state:
+            # Computed once on the first step, beam search expands and reorders it as any other state tensor
+            state["source_first_occurrence_mask"] = self._get_first_occurrence_mask(source_token_ids)
+        first_occurrence_mask = state["source_first_occurrence_mask"]
+
+        # Add copy scores to generation scores for source tokens from the target vocabulary.
+        # shape: (group_size, trimmed_source_length)
+        copy_log_probs_to_add_mask = (source_to_target != self._oov_index).float()
+        copy_log_probs_to_add = copy_log_probs + (copy_log_probs_to_add_mask + 1e-45).log()
+        # shape: (group_size, target_vocab_size)
+        generation_log_probs = self._scatter_logsumexp(generation_log_probs, source_to_target, copy_log_probs_to_add)
+
+        # Sum copy scores of all occurrences of every source token.
+        # shape: (group_size, trimmed_source_length)
+        max_copy_log_probs = copy_log_probs.max(dim=1, keepdim=True)[0]
+        summed_copy_probs = copy_log_probs.new_zeros(copy_log_probs.size()).scatter_add_(
+            1, source_token_ids, (copy_log_probs - max_copy_log_probs).exp())
+        token_copy_log_probs = summed_copy_probs.gather(1, source_token_ids).log() + max_copy_log_probs
+
+        # Only the first occurrences of source tokens that are not in the target vocabulary keep their scores.
+        # shape: (group_size, trimmed_source_length)
+        left_over_copy_log_probs = token_copy_log_probs + (first_occurrence_mask + 1e-45).log()
+        left_over_copy_log_probs = left_over_copy_log_probs + (1.0 - copy_log_probs_to_add_mask + 1e-45).log()
+
+        # shape: (group_size, target_vocab_size + trimmed_source_length)
+        return torch.cat((generation_log_probs, left_over_copy_log_probs), dim=-1)
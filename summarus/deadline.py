@@ -0,0 +1,128 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Union
+
+import torch
+from allennlp.nn.beam_search import BeamSearch
+
+from summarus.greedy_search import GreedySearch
+
+# Smoothing of the measured step time
+STEP_TIME_DECAY = 0.9
+
+
+class DeadlineDecodingMixin:
+    """
+    Anytime decoding with a time budget for models with take_step, _beam_search and _greedy_search.
+    Inside decoding_budget every search adapts to the time left:
+    the beam is halved until the projected search time fits, the projection uses the step time per row
+    measured in previous searches with a budget; steps can also be capped in proportion to the source length.
+    When the deadline passes, the next step ends all hypotheses without running the decoder,
+    so the search returns the best hypotheses so far.
+    Outputs get a "degraded" flag for every example: whether its best hypothesis was cut by the deadline
+    or the step cap instead of ending by itself.
+    """
+    _deadline = None
+    _steps_per_source_token = None
+    _step_seconds_per_row = None
+    _last_step_time = None
+    _step_count = 0
+    _forced_step = None
+    _search_max_steps = None
+
+    @contextmanager
+    def decoding_budget(self, seconds: float, steps_per_source_token: float = None) -> Iterator[None]:
+        """
+        The budget counts from entering the context, so it covers everything done inside it.
+        """
+        self._deadline = time.perf_counter() + seconds
+        self._steps_per_source_token = steps_per_source_token
+        try:
+            yield
+        finally:
+            self._deadline = None
+            self._steps_per_source_token = None
+
+    def _get_search(self, source_mask: torch.Tensor) -> Union[BeamSearch, GreedySearch]:
+        beam_size = self._beam_search.beam_size
+        max_steps = self._max_decoding_steps
+        self._last_step_time = None
+        self._step_count = 0
+        self._forced_step = None
+        if self._deadline is not None:
+            if self._steps_per_source_token:
+                max_source_length = int(source_mask.sum(1).max())
+                max_steps = min(max_steps, max(1, int(math.ceil(max_source_length * self._steps_per_source_token))))
+            remaining_seconds = self._deadline - time.perf_counter()
+            rows = source_mask.size(0)
+            if remaining_seconds <= 0.:
+                # Nothing fits, the first step ends all hypotheses anyway
+                beam_size = 1
+            elif self._step_seconds_per_row is not None:
+                while beam_size > 1 and self._step_seconds_per_row * rows * beam_size * max_steps > remaining_seconds:
+                    beam_size //= 2
+        self._search_max_steps = max_steps
+        # BeamSearch of AllenNLP 0.8.2 fails without a second step, the best hypothesis of one step is the greedy one
+        if max_steps == 1:
+            beam_size = 1
+
+        if beam_size == 1 and self._greedy_search:
+            if max_steps == self._greedy_search.max_steps:
+                return self._greedy_search
+            return GreedySearch(self._end_index, max_steps=max_steps)
+        if beam_size == self._beam_search.beam_size and max_steps == self._max_decoding_steps:
+            return self._beam_search
+        return BeamSearch(self._end_index, max_steps=max_steps, beam_size=beam_size)
+
+    def _is_deadline_passed(self, group_size: int) -> bool:
+        """
+        Called at the start of every step, also measures the step time.
+        """
+        if self._deadline is None:
+            return False
+        now = time.perf_counter()
+        if self._last_step_time is not None:
+            seconds = (now - self._last_step_time) / group_size
+            if self._step_seconds_per_row is None:
+                self._step_seconds_per_row = seconds
+            else:
+                self._step_seconds_per_row = STEP_TIME_DECAY * self._step_seconds_per_row + \
+                                             (1. - STEP_TIME_DECAY) * seconds
+        self._last_step_time = now
+        self._step_count += 1
+        if now < self._deadline:
+            return False
+        if self._forced_step is None:
+            self._forced_step = self._step_count - 1
+        return True
+
+    def _get_end_log_probabilities(self, group_size: int, num_classes: int, like: torch.Tensor) -> torch.Tensor:
+        # Only the end symbol is possible, the scores of the hypotheses do not change
+        log_probabilities = like.new_full((group_size, num_classes), -1e32)
+        log_probabilities[:, self._end_index] = 0.
+        return log_probabilities
+
+    @staticmethod
+    def _decode_degraded(output_dict: Dict[str, Any]) -> None:
+        # Python bools, predictors can not sanitize numpy.bool_ values of uint8 and bool tensors
+        if "degraded" in output_dict:
+            output_dict["degraded"] = [bool(flag) for flag in output_dict["degraded"].tolist()]
+
+    def _get_degraded(self, predictions: torch.Tensor) -> torch.Tensor:
+        """
+        Degraded flags of the best hypotheses, predictions are of shape (batch_size, beam_size, num_steps).
+        """
+        top_predictions = predictions[:, 0, :]
+        num_steps = top_predictions.size(1)
+        # Position of the first end symbol, num_steps if there is none
+        steps = torch.arange(num_steps, device=predictions.device).unsqueeze(0)
+        not_end = (top_predictions != self._end_index).long()
+        first_end = (steps + num_steps * not_end).min(1)[0]
+        # All False
+        degraded = first_end < 0
+        if self._forced_step is not None:
+            degraded = degraded | (first_end >= self._forced_step)
+        if self._search_max_steps < self._max_decoding_steps:
+            degraded = degraded | (first_end >= num_steps)
+        return degraded
@@ -0,0 +1,95 @@
+from typing import List, Dict
+
+import numpy as np
+import torch
+from allennlp.data.vocabulary import Vocabulary, DEFAULT_OOV_TOKEN
+
+
+def get_token_array(vocab: Vocabulary, namespace: str) -> np.ndarray:
+    """
+    Index to token mapping of the namespace as an array, so that a whole batch is mapped with one lookup.
+    """
+    index_to_token = vocab.get_index_to_token_vocabulary(namespace)
+    tokens = np.empty(len(index_to_token), dtype=object)
+    for index, token in index_to_token.items():
+        tokens[index] = token
+    return tokens
+
+
+def get_best_predictions(predictions) -> np.ndarray:
+    if isinstance(predictions, torch.Tensor):
+        predictions = predictions.detach().cpu().numpy()
+    predictions = np.asarray(predictions)
+    # Beam search gives us the top k results for each source text, we just want the single best
+    if predictions.ndim > 2:
+        predictions = predictions[:, 0]
+    return predictions
+
+
+def get_lengths(predictions: np.ndarray, end_index: int) -> np.ndarray:
+    """
+    Number of predicted tokens before the first end symbol in every row.
+    """
+    is_end = predictions == end_index
+    return np.where(is_end.any(axis=1), is_end.argmax(axis=1), predictions.shape[1])
+
+
+def get_oov_positions(source_to_target, source_token_ids, unk_index: int) -> np.ndarray:
+    """
+    Source positions of out-of-vocabulary tokens in the order of their first occurrence,
+    -1 for missing ones. Shape: (batch_size, max_oov_count).
+    """
+    if isinstance(source_to_target, torch.Tensor):
+        source_to_target = source_to_target.detach().cpu().numpy()
+    if isinstance(source_token_ids, torch.Tensor):
+        source_token_ids = source_token_ids.detach().cpu().numpy()
+    source_token_ids = np.asarray(source_token_ids).astype(np.int64)
+    batch_size, source_length = source_token_ids.shape
+    ids_count = int(source_token_ids.max()) + 1 if source_token_ids.size else 1
+
+    rows, positions = np.nonzero(np.asarray(source_to_target) == unk_index)
+    ids = source_token_ids[rows, positions]
+    # Token ids are numbered in the order of first occurrence, so sorting ids sorts OOV tokens the same way
+    position_by_id = np.full((batch_size, ids_count), -1, dtype=np.int64)
+    position_by_id[rows, ids] = positions
+    is_present = position_by_id >= 0
+    order = np.argsort(~is_present, axis=1, kind="stable")
+    max_oov_count = int(is_present.sum(axis=1).max()) if batch_size else 0
+    return position_by_id[np.arange(batch_size)[:, np.newaxis], order][:, :max_oov_count]
+
+
+def predictions_to_tokens(predictions,
+                          end_index: int,
+                          token_array: np.ndarray,
+                          source_tokens: List[List[str]] = None,
+                          oov_positions: np.ndarray = None) -> List[List[str]]:
+    """
+    Maps predicted ids of the whole batch to tokens till the first end symbol.
+    Ids beyond the vocabulary are copied from the source: the n-th OOV token of the source
+    when oov_positions are given, the n-th source token otherwise.
+    """
+    predictions = get_best_predictions(predictions)
+    lengths = get_lengths(predictions, end_index)
+    vocab_size = len(token_array)
+    is_extended = predictions >= vocab_size
+    tokens = token_array[np.where(is_extended, 0, predictions)]
+
+    is_extended &= np.arange(predictions.shape[1])[np.newaxis, :] < lengths[:, np.newaxis]
+    for row, column in zip(*np.nonzero(is_extended)):
+        number = predictions[row, column] - vocab_size
+        position = number
+        if oov_positions is not None:
+            position = oov_positions[row, number] if number < oov_positions.shape[1] else -1
+        is_valid = source_tokens is not None and 0 <= position < len(source_tokens[row])
+        tokens[row, column] = source_tokens[row][position] if is_valid else DEFAULT_OOV_TOKEN
+    return [tokens[row, :length].tolist() for row, length in enumerate(lengths)]
+
+
+def get_source_tokens(metadata: List[Dict]) -> List[List[str]]:
+    return [m["source_tokens"] for m in metadata] if metadata else None
+
+
+def join_tokens(tokens: List[str], is_subwords: bool = False) -> str:
+    if not is_subwords:
+        return " ".join(tokens)
+    return "".join(tokens).replace("▁", " ").replace("\n", "").strip()
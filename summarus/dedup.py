@@ -0,0 +1,111 @@
+import zlib
+from typing import List, Iterable
+
+import numpy as np
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def get_shingles(text: str, size: int = 5) -> np.ndarray:
+    """
+    CRC32 hashes of all word n-grams of the text, the whole text for texts shorter than n words.
+    """
+    words = text.lower().split()
+    if len(words) < size:
+        return np.array([zlib.crc32(" ".join(words).encode("utf-8"))], dtype=np.uint64)
+    shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64)
+
+
+class MinHasher:
+    """
+    MinHash signatures with universal hash functions (a * x + b) mod p.
+    """
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 42):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = get_shingles(text, self.shingle_size)
+        hashes = ((shingles[:, np.newaxis] * self._a + self._b) % np.uint64(MERSENNE_PRIME)) & np.uint64(MAX_HASH)
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        signatures = np.zeros((len(texts), self.num_perm), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            signatures[i] = self.signature(text)
+        return signatures
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parents = np.arange(size)
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[x] != root:
+            self.parents[x], x = root, self.parents[x]
+        return root
+
+    def union(self, x: int, y: int) -> None:
+        x, y = self.find(x), self.find(y)
+        # The earliest document is the root of its cluster
+        if x < y:
+            self.parents[y] = x
+        elif y < x:
+            self.parents[x] = y
+
+
+def find_duplicates(signatures: np.ndarray, bands: int = 16, threshold: float = 0.8) -> List[int]:
+    """
+    LSH banding: documents with an identical band are candidates, candidates with the estimated
+    Jaccard similarity of at least threshold are merged into clusters.
+    Every document is compared with all earlier members of its buckets, documents with identical
+    signatures are merged right away and only the first of them is put into buckets.
+    Returns indices of all documents except the first one of every cluster.
+    """
+    documents_count, num_perm = signatures.shape
+    assert num_perm % bands == 0, "Signature length should be divisible by the number of bands"
+    rows = num_perm // bands
+    clusters = UnionFind(documents_count)
+    signatures = np.ascontiguousarray(signatures)
+    keys = signatures.view(np.dtype((np.void, signatures.dtype.itemsize * num_perm))).ravel()
+    first_indices = dict()
+    candidates = []
+    for i, key in enumerate(keys):
+        first = first_indices.setdefault(key.tobytes(), i)
+        if first == i:
+            candidates.append(i)
+        else:
+            clusters.union(first, i)
+    candidates = np.array(candidates, dtype=np.int64)
+
+    for band in range(bands):
+        band_signatures = np.ascontiguousarray(signatures[candidates, band * rows:(band + 1) * rows])
+        band_keys = band_signatures.view(np.dtype((np.void, band_signatures.dtype.itemsize * rows))).ravel()
+        buckets = dict()
+        for i, key in zip(candidates, band_keys):
+            members = buckets.setdefault(key.tobytes(), [])
+            if members:
+                similar = np.mean(signatures[members] == signatures[i], axis=1) >= threshold
+                for member in np.array(members)[similar]:
+                    clusters.union(int(member), int(i))
+            members.append(i)
+    return [i for i in range(documents_count) if clusters.find(i) != i]
+
+
+def read_skip_list(path: str) -> set:
+    with open(path, "r", encoding="utf-8") as r:
+        return {int(line) for line in r if line.strip()}
+
+
+def write_skip_list(indices: Iterable[int], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as w:
+        for index in indices:
+            w.write("{}\n".format(index))
@@ -0,0 +1,175 @@
+import os
+import time
+import random
+import logging
+import datetime
+from typing import List
+
+import numpy
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.iterators.data_iterator import DataIterator
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.training.optimizers import Optimizer
+from allennlp.training.util import sparse_clip_norm
+
+from summarus import import_plugins
+from summarus.memory import MemoryTelemetry
+from summarus.validation import set_validation_decoding
+
+logger = logging.getLogger(__name__)
+
+# Other workers wait in the barrier while the first one saves checkpoints and validates
+PROCESS_GROUP_TIMEOUT = datetime.timedelta(hours=6)
+
+
+def _set_seed(seed):
+    random.seed(seed)
+    numpy.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def _broadcast_parameters(parameters: List[torch.nn.Parameter]) -> None:
+    # The first worker's weights are used everywhere, even if the initialization differs between processes
+    for parameter in parameters:
+        dist.broadcast(parameter.data, 0)
+
+
+def _all_reduce_gradients(parameters: List[torch.nn.Parameter], world_size: int) -> None:
+    # One flat buffer means one all-reduce call per step instead of one per parameter
+    grads = []
+    for parameter in parameters:
+        if parameter.grad is None:
+            parameter.grad = torch.zeros_like(parameter)
+        grads.append(parameter.grad.data)
+    flat_grads = torch.cat([grad.view(-1) for grad in grads])
+    dist.all_reduce(flat_grads)
+    flat_grads /= world_size
+    offset = 0
+    for grad in grads:
+        numel = grad.numel()
+        grad.copy_(flat_grads[offset:offset + numel].view_as(grad))
+        offset += numel
+
+
+def _all_ranks_have_batch(batch) -> bool:
+    # Shards can differ in size, the epoch ends when any of the workers runs out of batches
+    has_batch = torch.tensor([0 if batch is None else 1])
+    dist.all_reduce(has_batch, op=dist.ReduceOp.MIN)
+    return bool(has_batch.item())
+
+
+def _validate(model: Model, iterator: DataIterator, dataset) -> float:
+    model.eval()
+    total_loss = 0.
+    batches_count = 0
+    with torch.no_grad():
+        for batch in iterator(dataset, num_epochs=1, shuffle=False):
+            total_loss += model(**batch)["loss"].item()
+            batches_count += 1
+    return total_loss / max(batches_count, 1)
+
+
+def _train_worker(rank, world_size, model_path, train_path, val_path, seed, vocabulary_path, config_path,
+                  num_threads, weights_path=None, memory_log_path=None, memory_log_every=100):
+    logging.basicConfig(level=logging.INFO)
+    dist.init_process_group("gloo", rank=rank, world_size=world_size, timeout=PROCESS_GROUP_TIMEOUT)
+    torch.set_num_threads(num_threads)
+    # The same seed on every worker gives the same initial weights everywhere
+    _set_seed(seed)
+
+    params = Params.from_file(config_path)
+    import_plugins(params)
+    vocabulary = Vocabulary.from_files(vocabulary_path)
+
+    reader_params = params.pop("reader", default=Params({}))
+    reader = DatasetReader.from_params(reader_params.duplicate())
+    reader.set_shard(rank, world_size)
+    train_dataset = reader.read(train_path)
+    val_dataset = None
+    if val_path and rank == 0:
+        val_dataset = DatasetReader.from_params(reader_params).read(val_path)
+
+    model = Model.from_params(params.pop("model"), vocab=vocabulary)
+    if weights_path:
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+    parameters = [p for p in model.parameters() if p.requires_grad]
+    _broadcast_parameters(parameters)
+    # Different dropout masks and sampling in every worker
+    _set_seed(seed + rank)
+    if memory_log_path and rank == 0:
+        MemoryTelemetry(memory_log_path, memory_log_every).attach(model)
+
+    iterator = DataIterator.from_params(params.pop("iterator"))
+    iterator.index_with(vocabulary)
+
+    trainer_params = params.pop("trainer")
+    num_epochs = trainer_params.pop_int("num_epochs", 20)
+    grad_norm = trainer_params.pop_float("grad_norm", None)
+    shuffle = trainer_params.pop_bool("shuffle", True)
+    set_validation_decoding(model, trainer_params)
+    optimizer = Optimizer.from_params([[n, p] for n, p in model.named_parameters() if p.requires_grad],
+                                      trainer_params.pop("optimizer"))
+    if rank == 0 and trainer_params.keys():
+        logger.warning("Trainer options ignored in distributed mode: %s", ", ".join(trainer_params.keys()))
+
+    best_val_loss = None
+    for epoch in range(num_epochs):
+        model.train()
+        start_time = time.time()
+        total_loss = 0.
+        samples_count = 0
+        batches_count = 0
+        batches = iterator(train_dataset, num_epochs=1, shuffle=shuffle)
+        while True:
+            batch = next(batches, None)
+            if not _all_ranks_have_batch(batch):
+                break
+            optimizer.zero_grad()
+            loss = model(**batch)["loss"]
+            loss.backward()
+            _all_reduce_gradients(parameters, world_size)
+            if grad_norm:
+                sparse_clip_norm(parameters, grad_norm)
+            optimizer.step()
+            total_loss += loss.item()
+            samples_count += batch["source_tokens"]["tokens"].size(0)
+            batches_count += 1
+
+        stats = torch.tensor([total_loss, float(batches_count), float(samples_count)])
+        dist.all_reduce(stats)
+        elapsed = time.time() - start_time
+        if rank == 0:
+            train_loss = stats[0].item() / max(stats[1].item(), 1.)
+            logger.info("Epoch %d: train loss %.4f, %.1f samples/sec with %d workers",
+                        epoch, train_loss, stats[2].item() / elapsed, world_size)
+            torch.save(model.state_dict(), os.path.join(model_path, "model_state_epoch_{}.th".format(epoch)))
+            val_loss = _validate(model, iterator, val_dataset) if val_dataset is not None else train_loss
+            logger.info("Epoch %d: validation loss %.4f", epoch, val_loss)
+            if best_val_loss is None or val_loss < best_val_loss:
+                best_val_loss = val_loss
+                torch.save(model.state_dict(), os.path.join(model_path, "best.th"))
+        dist.barrier()
+    dist.destroy_process_group()
+
+
+def train_distributed(num_workers: int, model_path: str, train_path: str, val_path: str, seed: int,
+                      vocabulary_path: str, config_path: str, num_threads: int = None,
+                      weights_path: str = None, memory_log_path: str = None, memory_log_every: int = 100) -> None:
+    """
+    Data-parallel training with local worker processes and the gloo backend.
+    Every worker reads its own shard of the train dataset, gradients are averaged with all-reduce,
+    checkpoints, validation and memory telemetry are done by the first worker.
+    """
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ.setdefault("MASTER_PORT", "29500")
+    num_threads = num_threads or max(1, (os.cpu_count() or 1) // num_workers)
+    mp.spawn(_train_worker,
+             args=(num_workers, model_path, train_path, val_path, seed, vocabulary_path, config_path,
+                   num_threads, weights_path, memory_log_path, memory_log_every),
+             nprocs=num_workers,
+             join=True)
@@ -0,0 +1,56 @@
+from typing import Callable, Dict, Tuple
+
+import torch
+
+StateType = Dict[str, torch.Tensor]
+StepFunctionType = Callable[[torch.Tensor, StateType], Tuple[torch.Tensor, StateType]]
+
+
+class GreedySearch:
+    """
+    Drop-in replacement for BeamSearch with beam_size 1: the same predictions and log probabilities
+    without top-k, backpointers and state reindexing. Rows are retired as soon as they emit the end symbol,
+    and all state tensors are sliced down to the active rows, so later steps run on smaller groups.
+    """
+    def __init__(self, end_index: int, max_steps: int = 50) -> None:
+        self._end_index = end_index
+        self.max_steps = max_steps
+        self.beam_size = 1
+
+    def search(self,
+               start_predictions: torch.Tensor,
+               start_state: StateType,
+               step: StepFunctionType) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns predictions of shape (batch_size, 1, num_steps), padded with the end symbol,
+        and log probabilities of shape (batch_size, 1).
+        """
+        batch_size = start_predictions.size(0)
+        predictions = start_predictions.new_full((batch_size, self.max_steps), fill_value=self._end_index)
+        log_probabilities = None
+        # Batch indices of active rows
+        active = torch.arange(batch_size, device=start_predictions.device)
+        last_predictions = start_predictions
+        state = start_state
+        num_steps = 0
+        for timestep in range(self.max_steps):
+            # shape: (active_size, num_classes)
+            class_log_probabilities, state = step(last_predictions, state)
+            if log_probabilities is None:
+                log_probabilities = class_log_probabilities.new_zeros((batch_size,))
+            # topk instead of argmax breaks ties the same way as BeamSearch
+            top_log_probabilities, last_predictions = class_log_probabilities.topk(1)
+            top_log_probabilities, last_predictions = top_log_probabilities.squeeze(-1), last_predictions.squeeze(-1)
+            predictions[active, timestep] = last_predictions
+            log_probabilities[active] += top_log_probabilities
+            num_steps = timestep + 1
+
+            is_active = last_predictions != self._end_index
+            if not is_active.any():
+                break
+            if not is_active.all():
+                keep = is_active.nonzero().squeeze(-1)
+                active = active.index_select(0, keep)
+                last_predictions = last_predictions.index_select(0, keep)
+                state = {key: value.index_select(0, keep) for key, value in state.items()}
+        return predictions[:, :num_steps].unsqueeze(1), log_probabilities.unsqueeze(1)
@@ -0,0 +1,209 @@
+import os
+import json
+import math
+import time
+import atexit
+import logging
+import functools
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Log-scale histogram with 4 buckets per power of two: constant memory for any number of observations.
+    """
+    BUCKETS_PER_OCTAVE = 4
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.buckets = dict()
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = math.floor(math.log2(value) * self.BUCKETS_PER_OCTAVE) if value > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def _bucket_upper_bound(self, bucket):
+        return 0. if bucket is None else 2. ** ((bucket + 1) / self.BUCKETS_PER_OCTAVE)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.
+        rank = q / 100. * self.count
+        seen = 0
+        buckets = sorted(self.buckets.items(), key=lambda x: float("-inf") if x[0] is None else x[0])
+        for bucket, count in buckets:
+            seen += count
+            if seen >= rank:
+                return min(self._bucket_upper_bound(bucket), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.,
+            "min": self.min if self.count else 0.,
+            "max": self.max if self.count else 0.,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": {str(self._bucket_upper_bound(bucket)): count for bucket, count in self.buckets.items()}
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = dict()
+        self.counters = dict()
+        self.log_interval = None
+        self.dump_path = None
+        self._last_log_time = time.time()
+
+    def enable(self, dump_path: str = None, log_interval: float = None) -> None:
+        if dump_path and not self.dump_path:
+            atexit.register(self.dump)
+        self.enabled = True
+        self.dump_path = dump_path or self.dump_path
+        self.log_interval = log_interval
+        self._last_log_time = time.time()
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.histograms = dict()
+        self.counters = dict()
+
+    def observe(self, name: str, value: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> Dict:
+        return {
+            "timers_ms": {name: h.to_dict() for name, h in self.histograms.items() if name.endswith("_ms")},
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items() if not name.endswith("_ms")},
+            "counters": dict(self.counters)
+        }
+
+    def format_line(self) -> str:
+        parts = []
+        for name, histogram in sorted(self.histograms.items()):
+            parts.append("{}: n={} mean={:.2f} p50={:.2f} p99={:.2f}".format(
+                name, histogram.count, histogram.total / histogram.count,
+                histogram.percentile(50), histogram.percentile(99)))
+        for name, value in sorted(self.counters.items()):
+            parts.append("{}: {}".format(name, value))
+        return "; ".join(parts)
+
+    def maybe_log(self) -> None:
+        if not self.enabled or self.log_interval is None:
+            return
+        if time.time() - self._last_log_time < self.log_interval:
+            return
+        self._last_log_time = time.time()
+        logger.info(self.format_line())
+
+    def dump(self, path: str = None) -> None:
+        path = path or self.dump_path
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as w:
+            json.dump(self.report(), w, ensure_ascii=False, indent=2)
+
+
+class _Timer:
+    __slots__ = ("_name", "_start_time")
+
+    def __init__(self, name):
+        self._name = name
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        _PROFILER.observe(self._name, (time.perf_counter() - self._start_time) * 1000.)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_PROFILER = Profiler()
+_NULL_TIMER = _NullTimer()
+
+
+def get_profiler() -> Profiler:
+    return _PROFILER
+
+
+def is_enabled() -> bool:
+    return _PROFILER.enabled
+
+
+def enable(dump_path: str = None, log_interval: float = None) -> None:
+    _PROFILER.enable(dump_path, log_interval)
+
+
+def timer(name: str):
+    """
+    Context manager measuring the wall time of the block in milliseconds, no-op when profiling is disabled.
+    """
+    if not _PROFILER.enabled:
+        return _NULL_TIMER
+    return _Timer(name + "_ms")
+
+
+def timed(name: str):
+    """
+    Decorator version of timer.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Timer(name + "_ms"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name: str, value: float) -> None:
+    if _PROFILER.enabled:
+        _PROFILER.observe(name, value)
+
+
+def increment(name: str, value: int = 1) -> None:
+    if _PROFILER.enabled:
+        _PROFILER.increment(name, value)
+
+
+def maybe_log() -> None:
+    _PROFILER.maybe_log()
+
+
+if os.environ.get("SUMMARUS_PROFILE"):
+    enable(dump_path=os.environ["SUMMARUS_PROFILE"], log_interval=float(os.environ.get("SUMMARUS_PROFILE_INTERVAL", 60)))
@@ -0,0 +1 @@
+from summarus.iterators.token_budget_iterator import TokenBudgetIterator
@@ -0,0 +1,147 @@
+import logging
+import random
+from typing import Iterable, List, Dict, Sequence
+
+from allennlp.common.util import add_noise_to_dict_values
+from allennlp.data.dataset import Batch
+from allennlp.data.instance import Instance
+from allennlp.data.iterators.data_iterator import DataIterator
+
+from summarus import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+def group_by_token_budget(source_lengths: Sequence[int],
+                          target_lengths: Sequence[int] = None,
+                          max_tokens: int = 4000,
+                          max_batch_size: int = None,
+                          order: Sequence[int] = None) -> List[List[int]]:
+    """
+    Splits examples into batches, so that every batch contains at most max_tokens of padded
+    source and target tokens. Examples are sorted by length before batching unless the order is given.
+    Returns lists of example indices.
+    """
+    target_lengths = target_lengths or [0] * len(source_lengths)
+    if order is None:
+        order = sorted(range(len(source_lengths)), key=lambda i: (source_lengths[i], target_lengths[i]))
+    batches = []
+    batch = []
+    max_source_length, max_target_length = 0, 0
+    for index in order:
+        new_max_source_length = max(max_source_length, source_lengths[index])
+        new_max_target_length = max(max_target_length, target_lengths[index])
+        padded_tokens = (len(batch) + 1) * (new_max_source_length + new_max_target_length)
+        is_full = max_batch_size is not None and len(batch) >= max_batch_size
+        if batch and (padded_tokens > max_tokens or is_full):
+            batches.append(batch)
+            batch = []
+            new_max_source_length, new_max_target_length = source_lengths[index], target_lengths[index]
+        batch.append(index)
+        max_source_length, max_target_length = new_max_source_length, new_max_target_length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def predict_with_token_budget(predictor, batch: List[Dict], max_tokens: int, max_source_tokens: int) -> List[Dict]:
+    """
+    Runs predictor on token-budget sub-batches of a batch of JSON inputs, keeps the order of the outputs.
+    Source lengths are estimated by whitespace splitting, so the budget is approximate for subword models.
+    """
+    source_lengths = [min(len(sample["source"].split()), max_source_tokens) + 2 for sample in batch]
+    outputs = [None] * len(batch)
+    for indices in group_by_token_budget(source_lengths, max_tokens=max_tokens):
+        batch_outputs = predictor.predict_batch_json([batch[i] for i in indices])
+        for i, output in zip(indices, batch_outputs):
+            outputs[i] = output
+    return outputs
+
+
+@DataIterator.register("token_budget")
+class TokenBudgetIterator(DataIterator):
+    """
+    Forms batches with at most max_tokens of padded source and target tokens.
+    Instances are bucketed by length inside a buffer of max_instances_in_memory instances,
+    so it works with lazy readers in constant memory.
+    batch_size is the maximum number of instances in a batch.
+    """
+    def __init__(self,
+                 max_tokens: int,
+                 padding_noise: float = 0.1,
+                 biggest_batch_first: bool = False,
+                 batch_size: int = 1024,
+                 instances_per_epoch: int = None,
+                 max_instances_in_memory: int = 10000,
+                 cache_instances: bool = False,
+                 track_epoch: bool = False,
+                 source_field: str = "source_tokens",
+                 target_field: str = "target_tokens") -> None:
+        super().__init__(cache_instances=cache_instances,
+                         track_epoch=track_epoch,
+                         batch_size=batch_size,
+                         instances_per_epoch=instances_per_epoch,
+                         max_instances_in_memory=max_instances_in_memory)
+        self._max_tokens = max_tokens
+        self._padding_noise = padding_noise
+        self._biggest_batch_first = biggest_batch_first
+        self._source_field = source_field
+        self._target_field = target_field
+        self._real_tokens_count = 0
+        self._padded_tokens_count = 0
+
+    def _get_lengths(self, instance: Instance) -> Dict[str, float]:
+        lengths = {"source": len(instance.fields[self._source_field].tokens), "target": 0}
+        if self._target_field in instance.fields:
+            lengths["target"] = len(instance.fields[self._target_field].tokens)
+        return lengths
+
+    def _create_batches(self, instances: Iterable[Instance], shuffle: bool) -> Iterable[Batch]:
+        for instance_list in self._memory_sized_lists(instances):
+            lengths = [self._get_lengths(instance) for instance in instance_list]
+            sorting_lengths = lengths
+            if self._padding_noise > 0.0:
+                sorting_lengths = [add_noise_to_dict_values(length, self._padding_noise) for length in lengths]
+            order = sorted(range(len(lengths)),
+                           key=lambda i: (sorting_lengths[i]["source"], sorting_lengths[i]["target"]))
+            batches_indices = group_by_token_budget(
+                [length["source"] for length in lengths],
+                [length["target"] for length in lengths],
+                max_tokens=self._max_tokens,
+                max_batch_size=self._batch_size,
+                order=order)
+
+            batches = []
+            for indices in batches_indices:
+                self._update_padding_statistics([lengths[i] for i in indices])
+                batches.append(Batch([instance_list[i] for i in indices]))
+
+            move_to_front = self._biggest_batch_first and len(batches) > 1
+            if move_to_front:
+                last_batch = batches.pop()
+            if shuffle:
+                random.shuffle(batches)
+            if move_to_front:
+                batches.insert(0, last_batch)
+
+            logger.debug("Padding ratio: %.3f", self.get_padding_ratio())
+            yield from batches
+
+    def _update_padding_statistics(self, lengths: List[Dict[str, float]]) -> None:
+        real_tokens = sum(length["source"] + length["target"] for length in lengths)
+        max_source_length = max(length["source"] for length in lengths)
+        max_target_length = max(length["target"] for length in lengths)
+        padded_tokens = len(lengths) * (max_source_length + max_target_length)
+        self._real_tokens_count += real_tokens
+        self._padded_tokens_count += padded_tokens
+        instrumentation.increment("iterator.real_tokens", real_tokens)
+        instrumentation.increment("iterator.padded_tokens", padded_tokens)
+        instrumentation.observe("iterator.batch_size", len(lengths))
+
+    def get_padding_ratio(self) -> float:
+        """
+        Share of padding tokens in all batches produced so far.
+        """
+        if not self._padded_tokens_count:
+            return 0.0
+        return 1.0 - self._real_tokens_count / self._padded_tokens_count
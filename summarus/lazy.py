@@ -0,0 +1,28 @@
+import sys
+import types
+import importlib
+from typing import Dict
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module importing its public attributes from submodules on first access,
+    so that importing a package does not import all of its dependencies.
+    """
+    def __getattr__(self, name):
+        module_name = self.__dict__.get("_LAZY_ATTRIBUTES", {}).get(name)
+        if module_name is None:
+            raise AttributeError("module '{}' has no attribute '{}'".format(self.__name__, name))
+        value = getattr(importlib.import_module(module_name), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self.__dict__.get("_LAZY_ATTRIBUTES", {})))
+
+
+def make_lazy(module_name: str, attributes: Dict[str, str]) -> None:
+    module = sys.modules[module_name]
+    module._LAZY_ATTRIBUTES = attributes
+    module.__all__ = list(attributes)
+    module.__class__ = LazyModule
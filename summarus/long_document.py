@@ -0,0 +1,82 @@
+from typing import List
+
+from summarus import instrumentation
+from summarus.batch_summarizer import BatchSummarizer
+from summarus.instrumentation import timer
+
+
+def split_chunks(tokens: List[str], chunk_tokens: int, overlap_tokens: int = 0) -> List[List[str]]:
+    """
+    Overlapping chunks of at most chunk_tokens tokens covering all tokens, a single chunk for short sequences.
+    """
+    assert 0 <= overlap_tokens < chunk_tokens, "Overlap should be less than the chunk size"
+    if len(tokens) <= chunk_tokens:
+        return [tokens]
+    step = chunk_tokens - overlap_tokens
+    return [tokens[start:start + chunk_tokens] for start in range(0, len(tokens) - overlap_tokens, step)]
+
+
+class LongDocumentSummarizer:
+    """
+    Map-reduce summarization of documents longer than the model source length.
+    Map: documents are split into overlapping chunks, chunks of all documents are summarized
+    together in batches of batch_size chunks.
+    Reduce: chunk summaries of every document are concatenated and summarized again,
+    the concatenation is split into chunks again while it is longer than a chunk.
+    Every pass shortens documents, so the total work and latency grow linearly with document length,
+    and the peak memory is the one of a batch of chunks.
+    """
+    def __init__(self,
+                 summarizer: BatchSummarizer,
+                 chunk_tokens: int = None,
+                 overlap_tokens: int = 50,
+                 batch_size: int = 32):
+        self._summarizer = summarizer
+        self._chunk_tokens = chunk_tokens or summarizer._reader._source_max_tokens
+        assert self._chunk_tokens, "Chunk size or source_max_tokens of the reader should be set"
+        self._overlap_tokens = overlap_tokens
+        self._batch_size = batch_size
+
+    def _summarize_chunks(self, chunks: List[List[str]]) -> List[str]:
+        instrumentation.increment("long_document.chunks", len(chunks))
+        # Chunks of similar lengths are batched together
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+        summaries = [None] * len(chunks)
+        for start in range(0, len(order), self._batch_size):
+            indices = order[start:start + self._batch_size]
+            batch_summaries = self._summarizer.summarize_tokens([chunks[i] for i in indices])
+            for i, summary in zip(indices, batch_summaries):
+                summaries[i] = summary
+        return summaries
+
+    def summarize(self, texts: List[str]) -> List[str]:
+        tokenized_texts = self._summarizer.tokenize(texts, truncate=False)
+        results = [None] * len(texts)
+        pending = list(range(len(texts)))
+        while pending:
+            chunks = []
+            owners = []
+            for i in pending:
+                document_chunks = split_chunks(tokenized_texts[i], self._chunk_tokens, self._overlap_tokens)
+                chunks.extend(document_chunks)
+                owners.extend([i] * len(document_chunks))
+            with timer("long_document.map"):
+                summaries = self._summarize_chunks(chunks)
+
+            document_summaries = {i: [] for i in pending}
+            for i, summary in zip(owners, summaries):
+                document_summaries[i].append(summary)
+            next_pending = []
+            with timer("long_document.reduce"):
+                for i in pending:
+                    if len(document_summaries[i]) == 1:
+                        results[i] = document_summaries[i][0]
+                        continue
+                    tokens = self._summarizer.tokenize([" ".join(document_summaries[i])], truncate=False)[0]
+                    if len(tokens) >= len(tokenized_texts[i]):
+                        # Summaries are not shorter than the chunks, the next pass is the last one
+                        tokens = tokens[:self._chunk_tokens]
+                    tokenized_texts[i] = tokens
+                    next_pending.append(i)
+            pending = next_pending
+        return results
@@ -0,0 +1,89 @@
+from typing import Dict, Tuple
+
+import torch
+from torch.nn.modules.linear import Linear
+from allennlp.modules.token_embedders import Embedding
+
+
+class LowRankLinear(torch.nn.Module):
+    """
+    Linear layer with a weight factorized into two matrices of the given rank:
+    rank * (in_features + out_features) parameters and multiply-adds instead of in_features * out_features.
+    """
+    def __init__(self, in_features: int, out_features: int, rank: int, bias: bool = True):
+        super(LowRankLinear, self).__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.rank = rank
+        self._first_layer = Linear(in_features, rank, bias=False)
+        self._second_layer = Linear(rank, out_features, bias=bias)
+
+    def forward(self, inputs: torch.Tensor) -> torch.Tensor:
+        return self._second_layer(self._first_layer(inputs))
+
+
+class LowRankEmbedding(torch.nn.Module):
+    """
+    Embedding with a matrix factorized into rank-dimensional embeddings and a projection to embedding_dim.
+    """
+    def __init__(self, num_embeddings: int, embedding_dim: int, rank: int):
+        super(LowRankEmbedding, self).__init__()
+        self._embedding = Embedding(num_embeddings, rank)
+        self._projection_layer = Linear(rank, embedding_dim, bias=False)
+
+    def get_output_dim(self) -> int:
+        return self._projection_layer.out_features
+
+    def forward(self, inputs: torch.Tensor) -> torch.Tensor:
+        return self._projection_layer(self._embedding(inputs))
+
+
+def make_linear(in_features: int, out_features: int, rank: int = None) -> torch.nn.Module:
+    if rank is None:
+        return Linear(in_features, out_features)
+    return LowRankLinear(in_features, out_features, rank)
+
+
+def make_embedding(num_embeddings: int, embedding_dim: int, rank: int = None) -> torch.nn.Module:
+    if rank is None:
+        return Embedding(num_embeddings, embedding_dim)
+    return LowRankEmbedding(num_embeddings, embedding_dim, rank)
+
+
+def factorize(matrix: torch.Tensor, rank: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Truncated SVD: left and right factors of the best rank approximation, left.mm(right) ~ matrix.
+    Singular values are split evenly between the factors.
+    """
+    left, singular_values, right = torch.svd(matrix.double())
+    scale = singular_values[:rank].sqrt()
+    return (left[:, :rank] * scale.unsqueeze(0)).to(matrix.dtype).contiguous(), \
+           (right[:, :rank] * scale.unsqueeze(0)).t().to(matrix.dtype).contiguous()
+
+
+def factorize_linear(state_dict: Dict[str, torch.Tensor], prefix: str, rank: int) -> Dict[str, torch.Tensor]:
+    """
+    Replaces weights of the Linear layer with the prefix by weights of LowRankLinear of the given rank.
+    """
+    state_dict = dict(state_dict)
+    # shape: (out_features, in_features)
+    weight = state_dict.pop(prefix + "weight")
+    second_weight, first_weight = factorize(weight, rank)
+    state_dict[prefix + "_first_layer.weight"] = first_weight
+    state_dict[prefix + "_second_layer.weight"] = second_weight
+    if prefix + "bias" in state_dict:
+        state_dict[prefix + "_second_layer.bias"] = state_dict.pop(prefix + "bias")
+    return state_dict
+
+
+def factorize_embedding(state_dict: Dict[str, torch.Tensor], prefix: str, rank: int) -> Dict[str, torch.Tensor]:
+    """
+    Replaces weights of the Embedding with the prefix by weights of LowRankEmbedding of the given rank.
+    """
+    state_dict = dict(state_dict)
+    # shape: (num_embeddings, embedding_dim)
+    weight = state_dict.pop(prefix + "weight")
+    embeddings, projection = factorize(weight, rank)
+    state_dict[prefix + "_embedding.weight"] = embeddings
+    state_dict[prefix + "_projection_layer.weight"] = projection.t().contiguous()
+    return state_dict
@@ -0,0 +1,157 @@
+import gc
+import sys
+import json
+import logging
+import resource
+from typing import Dict, Callable, Any, Optional
+
+import torch
+
+from allennlp.models.model import Model
+
+logger = logging.getLogger(__name__)
+
+
+def get_peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        return peak_rss / 1024. / 1024.
+    return peak_rss / 1024.
+
+
+def get_current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as r:
+            resident_pages = int(r.read().split()[1])
+        return resident_pages * resource.getpagesize() / 1024. / 1024.
+    except (OSError, IndexError, ValueError):
+        return get_peak_rss_mb()
+
+
+def get_allocator_stats() -> Dict[str, float]:
+    if not torch.cuda.is_available():
+        return {}
+    mb = 1024. * 1024.
+    return {
+        "allocated_mb": torch.cuda.memory_allocated() / mb,
+        "peak_allocated_mb": torch.cuda.max_memory_allocated() / mb,
+        "cached_mb": torch.cuda.memory_cached() / mb
+    }
+
+
+def get_batch_shape(model: Model, inputs: Dict) -> Dict[str, int]:
+    shape = dict()
+    source_tokens = inputs.get("source_tokens")
+    if source_tokens:
+        shape["batch_size"], shape["source_length"] = source_tokens["tokens"].size()
+    target_tokens = inputs.get("target_tokens")
+    if target_tokens:
+        shape["target_length"] = target_tokens["tokens"].size(1)
+
+    target_namespace = getattr(model, "_target_namespace", "tokens")
+    vocab_size = model.vocab.get_vocab_size(target_namespace)
+    shape["extended_vocab_size"] = vocab_size
+    source_to_target = inputs.get("source_to_target")
+    source_token_ids = inputs.get("source_token_ids")
+    unk_index = getattr(model, "_target_unk_index", getattr(model, "_oov_index", None))
+    if source_to_target is not None and source_token_ids is not None and unk_index is not None:
+        # Count unique OOV source tokens in every example, the biggest count extends the vocabulary
+        source_token_ids = source_token_ids.long()
+        batch_size, length = source_token_ids.size()
+        is_unk = source_to_target.eq(unk_index).long()
+        positions = source_token_ids * is_unk + length * (1 - is_unk)
+        present = source_token_ids.new_zeros((batch_size, length + 1))
+        present.scatter_(1, positions, 1)
+        shape["extended_vocab_size"] += int(present[:, :length].sum(1).max())
+    return shape
+
+
+def get_memory_growth_mb(func: Callable[[], Any], model: Model) -> float:
+    """
+    Growth of allocated memory, RSS on CPU, while the output of func is alive.
+    """
+    is_cuda = any(parameter.is_cuda for parameter in model.parameters())
+
+    def get_used_mb():
+        return get_allocator_stats()["allocated_mb"] if is_cuda else get_current_rss_mb()
+
+    gc.collect()
+    start_mb = get_used_mb()
+    output = func()
+    used_mb = get_used_mb() - start_mb
+    del output
+    return max(used_mb, 0.)
+
+
+def get_saved_tensors_mb(func: Callable[[], Any], model: Model) -> float:
+    """
+    Size of tensors saved for the backward pass while func runs, the model parameters excluded.
+    Shared storages are counted once. Saved tensor hooks appeared in torch 1.10, with older versions
+    the memory growth while the output of func is alive is returned instead, it includes the output itself.
+    """
+    if not hasattr(torch.autograd, "graph") or not hasattr(torch.autograd.graph, "saved_tensors_hooks"):
+        return get_memory_growth_mb(func, model)
+    parameter_pointers = {parameter.data_ptr() for parameter in model.parameters()}
+    storages = dict()
+
+    def pack(tensor):
+        pointer = tensor.data_ptr()
+        if pointer not in parameter_pointers:
+            storages[pointer] = max(storages.get(pointer, 0), tensor.numel() * tensor.element_size())
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        func()
+    return sum(storages.values()) / 1024. / 1024.
+
+
+class MemoryTelemetry:
+    """
+    Reports peak RSS and tensor allocator usage after every log_every'th forward pass of the model,
+    together with the shape of the batch that produced it.
+    """
+    def __init__(self, output_path: str = None, log_every: int = 1):
+        self._output_path = output_path
+        self._log_every = log_every
+        self._batch_number = 0
+        self._output_file = open(output_path, "w", encoding="utf-8") if output_path else None
+
+    def attach(self, model: Model) -> Model:
+        forward = model.forward
+
+        def forward_with_telemetry(*args, **kwargs):
+            shape = get_batch_shape(model, kwargs)
+            output_dict = forward(*args, **kwargs)
+            self.record(shape, training=model.training)
+            return output_dict
+
+        model.forward = forward_with_telemetry
+        return model
+
+    def record(self, shape: Dict[str, int], **kwargs) -> Optional[Dict]:
+        """
+        Writes and logs a record every log_every'th batch, 0 turns records off.
+        """
+        self._batch_number += 1
+        if not self._log_every or self._batch_number % self._log_every != 0:
+            return None
+        record = {
+            "batch_number": self._batch_number,
+            "rss_mb": get_current_rss_mb(),
+            "peak_rss_mb": get_peak_rss_mb()
+        }
+        record.update(shape)
+        record.update(kwargs)
+        record.update(get_allocator_stats())
+        if self._output_file:
+            self._output_file.write(json.dumps(record) + "\n")
+            self._output_file.flush()
+        logger.info("Memory: " + ", ".join("{}={}".format(k, round(v, 1) if isinstance(v, float) else v)
+                                           for k, v in record.items()))
+        return record
+
+    def close(self) -> None:
+        if self._output_file:
+            self._output_file.close()
+            self._output_file = None
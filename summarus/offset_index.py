@@ -0,0 +1,80 @@
+import os
+import mmap
+from typing import Iterator, Tuple
+
+import numpy as np
+
+OFFSET_INDEX_TYPES = ("lines", "csv")
+NEWLINE = ord("\n")
+QUOTE = ord('"')
+
+
+def build_offset_index(path: str, index_type: str = "lines", chunk_size: int = 1 << 22) -> np.ndarray:
+    """
+    Byte offsets of record starts followed by the file size, so record i is [offsets[i], offsets[i + 1]).
+    lines: every line is a record.
+    csv: records end with newlines outside of quoted fields, the header is not a record.
+    The file is read by chunks, memory usage does not depend on its size except for the offsets.
+    """
+    assert index_type in OFFSET_INDEX_TYPES, "Unknown offset index type: {}".format(index_type)
+    offsets = [np.zeros(1, dtype=np.int64)]
+    is_quoted = 0
+    position = 0
+    with open(path, "rb") as r:
+        while True:
+            chunk = r.read(chunk_size)
+            if not chunk:
+                break
+            data = np.frombuffer(chunk, dtype=np.uint8)
+            newlines = np.flatnonzero(data == NEWLINE)
+            if index_type == "csv":
+                # Parity of quotes up to every byte, escaped quotes come in pairs and do not change it
+                quoted = np.bitwise_xor.accumulate((data == QUOTE).astype(np.uint8)) ^ is_quoted
+                newlines = newlines[quoted[newlines] == 0]
+                is_quoted = int(quoted[-1])
+            offsets.append(newlines.astype(np.int64) + position + 1)
+            position += len(chunk)
+    offsets = np.concatenate(offsets)
+    # The last newline does not start a record
+    offsets = np.append(offsets[offsets < position], position)
+    if index_type == "csv":
+        offsets = offsets[1:]
+    return offsets
+
+
+def get_offset_index_path(path: str) -> str:
+    return path + ".offsets.npy"
+
+
+def load_offset_index(path: str, index_type: str = "lines") -> np.ndarray:
+    """
+    Loads the offset index saved next to the dataset, builds it first if it is missing or outdated.
+    The index is memory-mapped.
+    """
+    index_path = get_offset_index_path(path)
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(path):
+        offsets = build_offset_index(path, index_type)
+        temp_index_path = index_path + ".tmp.npy"
+        np.save(temp_index_path, offsets)
+        os.replace(temp_index_path, index_path)
+    return np.load(index_path, mmap_mode="r")
+
+
+def read_records(path: str, offsets: np.ndarray, indices: Iterator[int]) -> Iterator[Tuple[int, str]]:
+    """
+    Yields raw records with given indices in the given order, reading them with mmap.
+    """
+    with open(path, "rb") as r:
+        if offsets[-1] == 0:
+            return
+        with mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for index in indices:
+                index = int(index)
+                yield index, data[offsets[index]:offsets[index + 1]].decode("utf-8")
+
+
+def get_permutation(records_count: int, seed: int, epoch: int = 0) -> np.ndarray:
+    """
+    Seeded permutation of record indices, different for every epoch and the same in all workers.
+    """
+    return np.random.RandomState(seed + epoch).permutation(records_count)
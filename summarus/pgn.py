@@ -1,8 +1,9 @@
+import math
 from typing import Dict, Tuple, List
-import numpy as np
 
 import torch
 import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
 from torch.nn.modules.linear import Linear
 from torch.nn.modules.rnn import LSTMCell
 
@@ -10,14 +11,21 @@ from allennlp.common.util import START_SYMBOL, END_SYMBOL
 from allennlp.data.vocabulary import Vocabulary, DEFAULT_OOV_TOKEN
 from allennlp.modules import TextFieldEmbedder, Seq2SeqEncoder
 from allennlp.models.model import Model
-from allennlp.modules.token_embedders import Embedding
 from allennlp.modules import Attention
 from allennlp.nn.beam_search import BeamSearch
 from allennlp.nn import util
 
+from summarus import instrumentation
+from summarus.instrumentation import timer, timed
+from summarus.decoding import get_token_array, get_oov_positions, get_source_tokens, predictions_to_tokens
+from summarus.greedy_search import GreedySearch
+from summarus.validation import ValidationDecodingMixin
+from summarus.deadline import DeadlineDecodingMixin
+from summarus.low_rank import make_linear, make_embedding
+
 
 @Model.register("pgn")
-class PointerGeneratorNetwork(Model):
+class PointerGeneratorNetwork(Model, ValidationDecodingMixin, DeadlineDecodingMixin):
     def __init__(self,
                  vocab: Vocabulary,
                  source_embedder: TextFieldEmbedder,
@@ -30,7 +38,10 @@ class PointerGeneratorNetwork(Model):
                  scheduled_sampling_ratio: float = 0.,
                  projection_dim: int = None,
                  use_coverage: bool = False,
-                 coverage_loss_weight: float = None) -> None:
+                 coverage_loss_weight: float = None,
+                 checkpoint_steps: int = None,
+                 output_projection_rank: int = None,
+                 target_embedding_rank: int = None) -> None:
         super(PointerGeneratorNetwork, self).__init__(vocab)
 
         self._target_namespace = target_namespace
@@ -49,24 +60,37 @@ class PointerGeneratorNetwork(Model):
         # Decoder
         self._target_embedding_dim = target_embedding_dim or source_embedder.get_output_dim()
         self._num_classes = self.vocab.get_vocab_size(self._target_namespace)
-        self._target_embedder = Embedding(self._num_classes, self._target_embedding_dim)
+        # Low rank layers are made by compress.py from trained full rank ones
+        self._target_embedder = make_embedding(self._num_classes, self._target_embedding_dim, target_embedding_rank)
         self._decoder_input_dim = self._encoder_output_dim + self._target_embedding_dim
         self._decoder_output_dim = self._encoder_output_dim
         self._decoder_cell = LSTMCell(self._decoder_input_dim, self._decoder_output_dim)
         self._projection_dim = projection_dim or self._source_embedder.get_output_dim()
         self._hidden_projection_layer = Linear(self._decoder_output_dim, self._projection_dim)
-        self._output_projection_layer = Linear(self._projection_dim, self._num_classes)
+        self._output_projection_layer = make_linear(self._projection_dim, self._num_classes, output_projection_rank)
         self._p_gen_layer = Linear(self._decoder_output_dim * 3 + self._decoder_input_dim, 1)
         self._attention = attention
         self._use_coverage = use_coverage
         self._coverage_loss_weight = coverage_loss_weight
         self._eps = 1e-31
+        # Buffers of _get_final_log_dist reused across decoding steps
+        self._final_log_dist_buffer = None
+        self._copy_probs_buffer = None
+
+        # Training with activation checkpointing over segments of checkpoint_steps decoder timesteps
+        assert not checkpoint_steps or not scheduled_sampling_ratio, \
+            "Checkpointing is not supported with scheduled sampling"
+        self._checkpoint_steps = checkpoint_steps
 
         # Decoding
         self._scheduled_sampling_ratio = scheduled_sampling_ratio
         self._max_decoding_steps = max_decoding_steps
         self._beam_search = BeamSearch(self._end_index, max_steps=max_decoding_steps, beam_size=beam_size or 1)
+        # Used instead of the beam search with beam_size 1
+        self._greedy_search = GreedySearch(self._end_index, max_steps=max_decoding_steps)
+        self._target_token_array = None
 
+    @timed("model.forward")
     def forward(self,
                 source_tokens: Dict[str, torch.LongTensor],
                 source_token_ids: torch.Tensor,
@@ -74,7 +98,8 @@ class PointerGeneratorNetwork(Model):
                 target_tokens: Dict[str, torch.LongTensor] = None,
                 target_token_ids: torch.Tensor = None,
                 metadata=None) -> Dict[str, torch.Tensor]:
-        state = self._encode(source_tokens)
+        with timer("model.encode"):
+            state = self._encode(source_tokens)
         target_tokens_tensor = target_tokens["tokens"].long() if target_tokens else None
         extra_zeros, modified_source_tokens, modified_target_tokens = self._prepare(
             source_to_target, source_token_ids, target_tokens_tensor, target_token_ids)
@@ -86,13 +111,16 @@ class PointerGeneratorNetwork(Model):
         if target_tokens:
             state["target_tokens"] = modified_target_tokens
             state = self._init_decoder_state(state)
-            output_dict = self._forward_loop(state, target_tokens)
+            with timer("model.forward_loop"):
+                output_dict = self._forward_loop(state, target_tokens)
         output_dict["metadata"] = metadata
         output_dict["source_to_target"] = source_to_target
+        output_dict["source_token_ids"] = source_token_ids
 
-        if not self.training:
+        if self._should_decode(target_tokens is not None):
             state = self._init_decoder_state(state)
-            predictions = self._forward_beam_search(state)
+            with timer("model.beam_search"):
+                predictions = self._forward_beam_search(state)
             output_dict.update(predictions)
 
         return output_dict
@@ -232,9 +260,63 @@ class PointerGeneratorNetwork(Model):
 
         return final_dist
 
+    def _get_final_log_dist_buffers(self, size: torch.Size, like: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        # Groups shrink during greedy search, so the buffers are sliced by rows
+        buffer = self._final_log_dist_buffer
+        if buffer is None or buffer.size(0) < size[0] or buffer.size(1) != size[1] \
+                or buffer.device != like.device or buffer.dtype != like.dtype:
+            self._final_log_dist_buffer = like.new_empty(size)
+            # Kept zeroed between steps
+            self._copy_probs_buffer = like.new_zeros(size)
+        return self._final_log_dist_buffer[:size[0]], self._copy_probs_buffer[:size[0]]
+
+    def _get_final_log_dist(self, state: Dict[str, torch.Tensor], output_projections: torch.Tensor) -> torch.Tensor:
+        """
+        log(_get_final_dist + eps) computed in log space: log p_gen + log_softmax everywhere,
+        merged with the copy distribution only at columns of source tokens.
+        Without gradients the result is a buffer overwritten by the next step.
+        """
+        attn_dist = state["attn_scores"]
+        tokens = state["tokens"]
+        extra_zeros = state["extra_zeros"]
+        decoder_state = torch.cat((state["decoder_hidden"], state["decoder_context"]), 1)
+        p_gen_logits = self._p_gen_layer(torch.cat((state["attn_context"], decoder_state, state["decoder_input"]), 1))
+        log_p_gen = F.logsigmoid(p_gen_logits)
+        log_copy_gate = F.logsigmoid(-p_gen_logits)
+
+        group_size, vocab_size = output_projections.size()
+        size = torch.Size((group_size, vocab_size + extra_zeros.size(1)))
+        reuse_buffers = not torch.is_grad_enabled()
+        if reuse_buffers:
+            final_log_dist, copy_probs = self._get_final_log_dist_buffers(size, output_projections)
+        else:
+            final_log_dist, copy_probs = output_projections.new_empty(size), output_projections.new_zeros(size)
+
+        # log_softmax + log p_gen written directly into the result, extra OOV columns get log(eps)
+        normalizer = output_projections.logsumexp(dim=-1, keepdim=True) - log_p_gen
+        final_log_dist[:, :vocab_size].copy_(output_projections).sub_(normalizer)
+        final_log_dist[:, vocab_size:].fill_(math.log(self._eps))
+
+        # Copy probabilities summed over all occurrences of every source token
+        copy_probs.scatter_add_(1, tokens, attn_dist)
+        # shape: (group_size, source_length)
+        # Clamped, log(0) at positions without attention, like padding, gives NaN gradients
+        token_copy_log_probs = copy_probs.gather(1, tokens).clamp(min=self._eps).log() + log_copy_gate
+        token_log_probs = final_log_dist.gather(1, tokens)
+        max_log_probs = torch.max(token_log_probs, token_copy_log_probs)
+        merged_log_probs = max_log_probs + ((token_log_probs - max_log_probs).exp() +
+                                            (token_copy_log_probs - max_log_probs).exp()).log()
+        if reuse_buffers:
+            # Only the touched entries have to be zeroed
+            copy_probs.scatter_(1, tokens, 0.)
+            return final_log_dist.scatter_(1, tokens, merged_log_probs)
+        return final_log_dist.scatter(1, tokens, merged_log_probs)
+
     def _forward_loop(self,
                       state: Dict[str, torch.Tensor],
                       target_tokens: Dict[str, torch.LongTensor] = None) -> Dict[str, torch.Tensor]:
+        if self.training and self._checkpoint_steps and target_tokens:
+            return self._forward_loop_checkpointed(state, target_tokens)
         # shape: (batch_size, max_input_sequence_length)
         source_mask = state["source_mask"]
         batch_size = source_mask.size(0)
@@ -295,6 +377,75 @@ class PointerGeneratorNetwork(Model):
 
         return output_dict
 
+    def _forward_segment(self,
+                         timesteps: range,
+                         recurrent_keys: List[str],
+                         encoder_outputs: torch.Tensor,
+                         source_mask: torch.Tensor,
+                         tokens: torch.Tensor,
+                         extra_zeros: torch.Tensor,
+                         targets: torch.Tensor,
+                         modified_targets: torch.Tensor,
+                         *recurrent_state: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        """
+        Teacher-forced decoder timesteps: attention, coverage, LSTMCell and the p_gen mix.
+        Returns target log probabilities, coverage losses if coverage is used, and the recurrent state.
+        """
+        state = {"encoder_outputs": encoder_outputs, "source_mask": source_mask,
+                 "tokens": tokens, "extra_zeros": extra_zeros}
+        state.update(zip(recurrent_keys, recurrent_state))
+        step_log_probs = []
+        step_coverage_losses = []
+        for timestep in timesteps:
+            coverage = state.get("coverage")
+            output_projections, state = self._prepare_output_projections(targets[:, timestep], state)
+            final_dist = self._get_final_dist(state, output_projections)
+            target_proba = final_dist.gather(1, modified_targets[:, timestep].unsqueeze(1)).squeeze(1)
+            step_log_probs.append(torch.log(target_proba + self._eps))
+            if self._use_coverage:
+                step_coverage_losses.append(torch.sum(torch.min(state["attn_scores"], coverage), 1))
+        outputs = [torch.stack(step_log_probs, 1)]
+        if self._use_coverage:
+            outputs.append(torch.stack(step_coverage_losses, 1))
+        return tuple(outputs + [state[key] for key in recurrent_keys])
+
+    def _forward_loop_checkpointed(self,
+                                   state: Dict[str, torch.Tensor],
+                                   target_tokens: Dict[str, torch.LongTensor]) -> Dict[str, torch.Tensor]:
+        """
+        Teacher-forced loss of _forward_loop with activation checkpointing: only the recurrent state
+        between segments of checkpoint_steps timesteps is kept, activations of every segment
+        are recomputed during the backward pass. Per-step predictions are not returned.
+        """
+        targets = target_tokens["tokens"]
+        # shape: (batch_size, num_decoding_steps)
+        modified_targets = state["target_tokens"][:, 1:]
+        num_decoding_steps = targets.size(1) - 1
+
+        recurrent_keys = ["decoder_hidden", "decoder_context"] + (["coverage"] if self._use_coverage else [])
+        recurrent_state = [state[key] for key in recurrent_keys]
+        segment_log_probs = []
+        segment_coverage_losses = []
+        for start in range(0, num_decoding_steps, self._checkpoint_steps):
+            timesteps = range(start, min(start + self._checkpoint_steps, num_decoding_steps))
+            outputs = checkpoint(
+                lambda *args, timesteps=timesteps: self._forward_segment(timesteps, recurrent_keys, *args),
+                state["encoder_outputs"], state["source_mask"], state["tokens"], state["extra_zeros"],
+                targets, modified_targets, *recurrent_state)
+            segment_log_probs.append(outputs[0])
+            if self._use_coverage:
+                segment_coverage_losses.append(outputs[1])
+            recurrent_state = outputs[-len(recurrent_keys):]
+
+        # The same loss as NLLLoss(ignore_index=0) in _get_loss
+        log_probs = torch.cat(segment_log_probs, 1)
+        mask = (modified_targets != 0).float()
+        loss = -(log_probs * mask).sum() / mask.sum()
+        if self._use_coverage:
+            coverage_loss = torch.mean(torch.cat(segment_coverage_losses, 1).sum(1) / num_decoding_steps)
+            loss = loss + self._coverage_loss_weight * coverage_loss
+        return {"loss": loss}
+
     @staticmethod
     def _get_loss(proba: torch.LongTensor,
                   targets: torch.LongTensor,
@@ -310,54 +461,51 @@ class PointerGeneratorNetwork(Model):
 
         # shape (all_top_k_predictions): (batch_size, beam_size, num_decoding_steps)
         # shape (log_probabilities): (batch_size, beam_size)
-        all_top_k_predictions, log_probabilities = self._beam_search.search(
-            start_predictions, state, self.take_step)
+        search = self._get_search(state["source_mask"])
+        try:
+            all_top_k_predictions, log_probabilities = search.search(start_predictions, state, self.take_step)
+        finally:
+            # The buffers take group_size * (vocab_size + OOV count) floats each, they are not kept between searches
+            self._final_log_dist_buffer = None
+            self._copy_probs_buffer = None
 
         output_dict = {
             "class_log_probabilities": log_probabilities,
             "predictions": all_top_k_predictions,
         }
+        if self._deadline is not None:
+            output_dict["degraded"] = self._get_degraded(all_top_k_predictions)
         return output_dict
 
     def take_step(self,
                   last_predictions: torch.Tensor,
                   state: Dict[str, torch.Tensor]) -> Tuple[torch.Tensor, Dict[str, torch.Tensor]]:
+        if instrumentation.is_enabled():
+            instrumentation.increment("model.decode_steps")
+            instrumentation.observe("model.beam_occupancy", (last_predictions != self._end_index).float().mean().item())
+        if self._is_deadline_passed(last_predictions.size(0)):
+            num_classes = self._target_vocab_size + state["extra_zeros"].size(1)
+            return self._get_end_log_probabilities(last_predictions.size(0), num_classes,
+                                                   state["encoder_outputs"]), state
         # shape: (group_size, num_classes)
         output_projections, state = self._prepare_output_projections(last_predictions, state)
-        final_dist = self._get_final_dist(state, output_projections)
-        log_probabilities = torch.log(final_dist + self._eps)
+        log_probabilities = self._get_final_log_dist(state, output_projections)
         return log_probabilities, state
 
+    @timed("model.decode")
     def decode(self, output_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
-        predicted_indices = output_dict["predictions"]
-        if not isinstance(predicted_indices, np.ndarray):
-            predicted_indices = predicted_indices.detach().cpu().numpy()
-        all_predicted_tokens = []
-        for (indices, metadata), source_to_target in zip(zip(predicted_indices, output_dict["metadata"]), output_dict["source_to_target"]):
-            # Beam search gives us the top k results for each source sentence in the batch
-            # but we just want the single best.
-            if len(indices.shape) > 1:
-                indices = indices[0]
-            indices = list(indices)
-            # Collect indices till the first end_symbol
-            if self._end_index in indices:
-                indices = indices[:indices.index(self._end_index)]
-            predicted_tokens = []
-
-            unk_tokens = list()
-            for i, t in enumerate(source_to_target):
-                if t == self._target_unk_index:
-                    token = metadata["source_tokens"][i]
-                    if token not in unk_tokens:
-                        unk_tokens.append(token)
-
-            for x in indices:
-                if x < self._target_vocab_size:
-                    token = self.vocab.get_token_from_index(x, namespace=self._target_namespace)
-                else:
-                    unk_number = x - self._target_vocab_size
-                    token = unk_tokens[unk_number]
-                predicted_tokens.append(token)
-            all_predicted_tokens.append(predicted_tokens)
+        if self._target_token_array is None:
+            self._target_token_array = get_token_array(self.vocab, self._target_namespace)
+        oov_positions = get_oov_positions(output_dict["source_to_target"],
+                                          output_dict.pop("source_token_ids"),
+                                          self._target_unk_index)
+        all_predicted_tokens = predictions_to_tokens(output_dict["predictions"],
+                                                     self._end_index,
+                                                     self._target_token_array,
+                                                     get_source_tokens(output_dict["metadata"]),
+                                                     oov_positions)
+        for predicted_tokens in all_predicted_tokens:
+            instrumentation.observe("model.decode_steps_per_example", len(predicted_tokens))
         output_dict["predicted_tokens"] = all_predicted_tokens
+        self._decode_degraded(output_dict)
         return output_dict
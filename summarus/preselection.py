@@ -0,0 +1,90 @@
+import re
+from typing import List
+
+import numpy as np
+
+PRESELECTION_METHODS = ("tfidf", "centrality")
+SENTENCE_END_REGEXP = re.compile(r"(?<=[.!?…])\s+")
+WORD_REGEXP = re.compile(r"\w+", re.U)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in SENTENCE_END_REGEXP.split(text) if sentence.strip()]
+
+
+def _get_term_matrix(sentences: List[str]):
+    """
+    Sparse sentence-term matrix in coordinate form: rows, columns and counts.
+    """
+    vocabulary = dict()
+    rows = []
+    columns = []
+    for i, sentence in enumerate(sentences):
+        for word in WORD_REGEXP.findall(sentence.lower()):
+            rows.append(i)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    rows = np.array(rows, dtype=np.int64)
+    columns = np.array(columns, dtype=np.int64)
+    # Merge repeated (sentence, term) pairs
+    terms_count = len(vocabulary)
+    keys, counts = np.unique(rows * max(terms_count, 1) + columns, return_counts=True)
+    return keys // max(terms_count, 1), keys % max(terms_count, 1), counts.astype(np.float32), terms_count
+
+
+def score_sentences(sentences: List[str], method: str = "tfidf",
+                    similarity_threshold: float = 0.1, damping: float = 0.85, iterations: int = 30) -> np.ndarray:
+    """
+    tfidf: cosine similarity of the sentence TF-IDF vector with the centroid of the text.
+    centrality: LexRank, PageRank over the graph of sentences with similar TF-IDF vectors.
+    IDF is computed over sentences of the text.
+    """
+    assert method in PRESELECTION_METHODS, "Unknown preselection method: {}".format(method)
+    sentences_count = len(sentences)
+    rows, columns, counts, terms_count = _get_term_matrix(sentences)
+    if not terms_count:
+        return np.zeros(sentences_count, dtype=np.float32)
+    document_frequency = np.bincount(columns, minlength=terms_count)
+    idf = np.log((1.0 + sentences_count) / (1.0 + document_frequency)) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=sentences_count))
+    weights = weights / np.maximum(norms[rows], 1e-8)
+
+    if method == "tfidf":
+        centroid = np.bincount(columns, weights=weights, minlength=terms_count)
+        centroid /= max(np.linalg.norm(centroid), 1e-8)
+        return np.bincount(rows, weights=weights * centroid[columns], minlength=sentences_count)
+
+    matrix = np.zeros((sentences_count, terms_count), dtype=np.float32)
+    matrix[rows, columns] = weights
+    adjacency = (matrix.dot(matrix.T) > similarity_threshold).astype(np.float32)
+    # Sentences without words are similar to nothing, a self-loop keeps their rows stochastic
+    np.fill_diagonal(adjacency, 1.0)
+    adjacency /= adjacency.sum(axis=1, keepdims=True)
+    scores = np.full(sentences_count, 1.0 / sentences_count, dtype=np.float32)
+    for _ in range(iterations):
+        scores = (1.0 - damping) / sentences_count + damping * adjacency.T.dot(scores)
+    return scores
+
+
+def preselect(text: str, max_tokens: int, method: str = "tfidf") -> str:
+    """
+    Keeps the best scoring sentences that fit into max_tokens whitespace-separated tokens, in the original order.
+    """
+    sentences = split_sentences(text)
+    lengths = np.array([len(sentence.split()) for sentence in sentences], dtype=np.int64)
+    if lengths.sum() <= max_tokens:
+        return text
+    scores = score_sentences(sentences, method)
+    # Stable sort: earlier sentences win ties
+    order = np.argsort(-scores, kind="stable")
+    # Greedy fill: sentences that do not fit are skipped, shorter ones after them can still fit
+    selected = []
+    tokens_count = 0
+    for i in order:
+        if tokens_count + lengths[i] <= max_tokens:
+            selected.append(i)
+            tokens_count += lengths[i]
+    selected.sort()
+    if not len(selected):
+        return " ".join(text.split()[:max_tokens])
+    return " ".join(sentences[i] for i in selected)
@@ -1,5 +1,9 @@
-from summarus.readers.summarization_reader import SummarizationReader
-from summarus.readers.cnn_dailymail_reader import CNNDailyMailReader
-from summarus.readers.contracts_reader import ContractsReader
-from summarus.readers.lenta_reader import LentaReader
-from summarus.readers.ria_reader import RIAReader
+from summarus.lazy import make_lazy
+
+make_lazy(__name__, {
+    "SummarizationReader": "summarus.readers.summarization_reader",
+    "CNNDailyMailReader": "summarus.readers.cnn_dailymail_reader",
+    "ContractsReader": "summarus.readers.contracts_reader",
+    "LentaReader": "summarus.readers.lenta_reader",
+    "RIAReader": "summarus.readers.ria_reader",
+})
@@ -79,7 +79,10 @@ class CNNDailyMailReader(SummarizationReader):
                  separate_namespaces: bool = False,
                  target_namespace: str = "target_tokens",
                  save_copy_fields: bool = False,
-                 save_pgn_fields: bool = False) -> None:
+                 save_pgn_fields: bool = False,
+                 preselect_max_tokens: int = None,
+                 preselect_method: str = "tfidf",
+                 skip_list_path: str = None) -> None:
         super().__init__(
             tokenizer=tokenizer,
             source_token_indexers=source_token_indexers,
@@ -89,7 +92,10 @@ class CNNDailyMailReader(SummarizationReader):
             separate_namespaces=separate_namespaces,
             target_namespace=target_namespace,
             save_copy_fields=save_copy_fields,
-            save_pgn_fields=save_pgn_fields
+            save_pgn_fields=save_pgn_fields,
+            preselect_max_tokens=preselect_max_tokens,
+            preselect_method=preselect_method,
+            skip_list_path=skip_list_path
         )
 
         self._cnn_tokenized_dir = cnn_tokenized_dir
@@ -99,3 +105,9 @@ class CNNDailyMailReader(SummarizationReader):
         file_names = get_file_names_by_urls(self._cnn_tokenized_dir, self._dm_tokenized_dir, urls_path)
         for file_name in file_names:
             yield get_article_and_abstract(file_name)
+
+    def iterate_records(self, urls_path: str) -> Iterable[Tuple[int, Tuple[str, str]]]:
+        file_names = get_file_names_by_urls(self._cnn_tokenized_dir, self._dm_tokenized_dir, urls_path)
+        for i, file_name in enumerate(file_names):
+            if self._is_in_shard(i):
+                yield i, get_article_and_abstract(file_name)
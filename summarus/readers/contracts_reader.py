@@ -18,14 +18,20 @@ class ContractsReader(SummarizationReader):
                  target_token_indexers: Dict[str, TokenIndexer] = None,
                  source_max_tokens: int = 400,
                  target_max_tokens: int = 100,
-                 separate_namespaces: bool = False) -> None:
+                 separate_namespaces: bool = False,
+                 preselect_max_tokens: int = None,
+                 preselect_method: str = "tfidf",
+                 skip_list_path: str = None) -> None:
         super().__init__(
             tokenizer=tokenizer,
             source_token_indexers=source_token_indexers,
             target_token_indexers=target_token_indexers,
             source_max_tokens=source_max_tokens,
             target_max_tokens=target_max_tokens,
-            separate_namespaces=separate_namespaces
+            separate_namespaces=separate_namespaces,
+            preselect_max_tokens=preselect_max_tokens,
+            preselect_method=preselect_method,
+            skip_list_path=skip_list_path
         )
 
         self._contracts_dir = contracts_dir
@@ -34,3 +40,9 @@ class ContractsReader(SummarizationReader):
         file_names = [os.path.join(dir_path, file_name) for file_name in os.listdir(dir_path)]
         for file_name in file_names:
             yield get_article_and_abstract(file_name, encoding="cp1251")
+
+    def iterate_records(self, dir_path: str):
+        file_names = [os.path.join(dir_path, file_name) for file_name in os.listdir(dir_path)]
+        for i, file_name in enumerate(file_names):
+            if self._is_in_shard(i):
+                yield i, get_article_and_abstract(file_name, encoding="cp1251")
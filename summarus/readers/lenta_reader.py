@@ -1,3 +1,4 @@
+import io
 import csv
 from typing import Dict
 
@@ -10,6 +11,8 @@ from summarus.readers.summarization_reader import SummarizationReader
 
 @DatasetReader.register("lenta")
 class LentaReader(SummarizationReader):
+    offset_index_type = "csv"
+
     def __init__(self,
                  tokenizer: Tokenizer = None,
                  source_token_indexers: Dict[str, TokenIndexer] = None,
@@ -19,7 +22,13 @@ class LentaReader(SummarizationReader):
                  separate_namespaces: bool = False,
                  target_namespace: str = "target_tokens",
                  save_copy_fields: bool = False,
-                 save_pgn_fields: bool = False) -> None:
+                 save_pgn_fields: bool = False,
+                 preselect_max_tokens: int = None,
+                 preselect_method: str = "tfidf",
+                 skip_list_path: str = None,
+                 shuffle_records: bool = False,
+                 shuffle_seed: int = 42,
+                 start_position: int = 0) -> None:
         super().__init__(
             tokenizer=tokenizer,
             source_token_indexers=source_token_indexers,
@@ -29,21 +38,43 @@ class LentaReader(SummarizationReader):
             separate_namespaces=separate_namespaces,
             target_namespace=target_namespace,
             save_copy_fields=save_copy_fields,
-            save_pgn_fields=save_pgn_fields
+            save_pgn_fields=save_pgn_fields,
+            preselect_max_tokens=preselect_max_tokens,
+            preselect_method=preselect_method,
+            skip_list_path=skip_list_path,
+            shuffle_records=shuffle_records,
+            shuffle_seed=shuffle_seed,
+            start_position=start_position
         )
 
-    def parse_set(self, path):
+    @staticmethod
+    def _parse_row(row):
+        if len(row) < 3:
+            return None
+        title, text = row[1], row[2]
+        if not title or not text:
+            return None
+        text = text.lower().replace("\xa0", " ")
+        title = title.lower().replace("\xa0", " ")
+        return text, title
+
+    def parse_record(self, raw_record):
+        row = next(csv.reader(io.StringIO(raw_record), delimiter=",", quotechar='"'), [])
+        return self._parse_row(row)
+
+    def iterate_records(self, path):
         with open(path, "r", encoding="utf-8") as r:
             reader = csv.reader(r, delimiter=",", quotechar='"')
             header = next(reader)
             assert header[1] == "title"
             assert header[2] == "text"
-            for row in reader:
-                if len(row) < 3:
+            for i, row in enumerate(reader):
+                if not self._is_in_shard(i):
                     continue
-                title, text = row[1], row[2]
-                if not title or not text:
-                    continue
-                text = text.lower().replace("\xa0", " ")
-                title = title.lower().replace("\xa0", " ")
-                yield text, title
+                record = self._parse_row(row)
+                if record:
+                    yield i, record
+
+    def parse_set(self, path):
+        for _, record in self.iterate_records(path):
+            yield record
@@ -1,7 +1,6 @@
 import json
 from typing import Dict
 
-from bs4 import BeautifulSoup
 from allennlp.data.dataset_readers.dataset_reader import DatasetReader
 from allennlp.data.tokenizers.tokenizer import Tokenizer
 from allennlp.data.token_indexers.token_indexer import TokenIndexer
@@ -9,10 +8,19 @@ from allennlp.data.tokenizers import WordTokenizer
 from allennlp.data.tokenizers.word_splitter import SimpleWordSplitter
 
 from summarus.readers.summarization_reader import SummarizationReader
+from summarus.instrumentation import timer
+
+
+def clean_html(text: str) -> str:
+    # Imported here, inference with the reader does not need HTML cleaning
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(text, 'html.parser').text
 
 
 @DatasetReader.register("ria")
 class RIAReader(SummarizationReader):
+    offset_index_type = "lines"
+
     def __init__(self,
                  tokenizer: Tokenizer = None,
                  source_token_indexers: Dict[str, TokenIndexer] = None,
@@ -22,7 +30,14 @@ class RIAReader(SummarizationReader):
                  separate_namespaces: bool = False,
                  target_namespace: str = "target_tokens",
                  save_copy_fields: bool = False,
-                 save_pgn_fields: bool = False) -> None:
+                 save_pgn_fields: bool = False,
+                 preselect_max_tokens: int = None,
+                 preselect_method: str = "tfidf",
+                 skip_list_path: str = None,
+                 clean_html: bool = True,
+                 shuffle_records: bool = False,
+                 shuffle_seed: int = 42,
+                 start_position: int = 0) -> None:
         if not tokenizer:
             tokenizer = WordTokenizer(word_splitter=SimpleWordSplitter())
         super().__init__(
@@ -34,16 +49,40 @@ class RIAReader(SummarizationReader):
             separate_namespaces=separate_namespaces,
             target_namespace=target_namespace,
             save_copy_fields=save_copy_fields,
-            save_pgn_fields=save_pgn_fields
+            save_pgn_fields=save_pgn_fields,
+            preselect_max_tokens=preselect_max_tokens,
+            preselect_method=preselect_method,
+            skip_list_path=skip_list_path,
+            shuffle_records=shuffle_records,
+            shuffle_seed=shuffle_seed,
+            start_position=start_position
         )
+        # False for datasets already cleaned by train_subword_model.py
+        self._clean_html = clean_html
 
-    def parse_set(self, path):
+    def parse_record(self, raw_record):
+        if not raw_record.strip():
+            return None
+        data = json.loads(raw_record.strip())
+        title = data["title"]
+        text = data["text"]
+        clean_text = text
+        if self._clean_html:
+            with timer("reader.clean_html"):
+                clean_text = clean_html(text)
+        if not clean_text or not title:
+            return None
+        return clean_text, title
+
+    def iterate_records(self, path):
         with open(path, "r", encoding="utf-8") as r:
-            for line in r:
-                data = json.loads(line.strip())
-                title = data["title"]
-                text = data["text"]
-                clean_text = BeautifulSoup(text, 'html.parser').text
-                if not clean_text or not title:
+            for i, line in enumerate(r):
+                if not self._is_in_shard(i):
                     continue
-                yield clean_text, title
+                record = self.parse_record(line)
+                if record:
+                    yield i, record
+
+    def parse_set(self, path):
+        for _, record in self.iterate_records(path):
+            yield record
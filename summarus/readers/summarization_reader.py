@@ -1,4 +1,4 @@
-from typing import Iterable, Dict, Tuple, List
+from typing import Iterable, Dict, Tuple, List, Optional
 
 import numpy as np
 from allennlp.data.instance import Instance
@@ -12,10 +12,16 @@ from allennlp.data.tokenizers import Token
 from allennlp.data.fields import TextField, ArrayField, MetadataField, NamespaceSwappingField
 from allennlp.data.tokenizers.word_splitter import SimpleWordSplitter
 
-from summarus.subword_tokenizer import SubwordTokenizer
+from summarus.instrumentation import timer, timed
+from summarus.preselection import preselect, PRESELECTION_METHODS
+from summarus.dedup import read_skip_list
+from summarus.offset_index import load_offset_index, read_records, get_permutation
 
 
 class SummarizationReader(DatasetReader):
+    # "lines" or "csv" for readers of datasets with an offset index, see parse_record
+    offset_index_type = None
+
     def __init__(self,
                  tokenizer: Tokenizer = None,
                  source_token_indexers: Dict[str, TokenIndexer] = None,
@@ -25,7 +31,13 @@ class SummarizationReader(DatasetReader):
                  separate_namespaces: bool = False,
                  target_namespace: str = "target_tokens",
                  save_copy_fields: bool = False,
-                 save_pgn_fields: bool = False) -> None:
+                 save_pgn_fields: bool = False,
+                 preselect_max_tokens: int = None,
+                 preselect_method: str = "tfidf",
+                 skip_list_path: str = None,
+                 shuffle_records: bool = False,
+                 shuffle_seed: int = 42,
+                 start_position: int = 0) -> None:
         super().__init__(lazy=True)
 
         assert save_pgn_fields or save_copy_fields or (not save_pgn_fields and not save_copy_fields)
@@ -47,8 +59,51 @@ class SummarizationReader(DatasetReader):
             second_tokens_indexer = {"tokens": SingleIdTokenIndexer(namespace=target_namespace)}
             self._target_token_indexers = target_token_indexers or second_tokens_indexer
 
+        self._shard_rank = 0
+        self._shards_count = 1
+
+        self.set_preselection(preselect_max_tokens, preselect_method)
+        # Indices of records in the iterate_records order to skip, for example near-duplicates found by dedup.py
+        self._skip_indices = read_skip_list(skip_list_path) if skip_list_path else set()
+
+        # Records are read in a seeded random order with the offset index, a new order every epoch.
+        # start_position is a position in the order of the first epoch to resume from.
+        assert not shuffle_records or self.offset_index_type, "Reader does not support shuffled reading"
+        self._shuffle_records = shuffle_records
+        self._shuffle_seed = shuffle_seed
+        self._start_position = start_position
+        # Epochs are counted for every dataset separately, so reading the validation set does not change
+        # the train order. start_position applies to the first dataset read, the train one.
+        self._epochs = dict()
+        self._start_path = None
+
+    def set_preselection(self, max_tokens: int = None, method: str = "tfidf") -> None:
+        """
+        Makes the reader keep only the most salient sentences of sources that fit into max_tokens.
+        """
+        assert method in PRESELECTION_METHODS
+        self._preselect_max_tokens = max_tokens
+        self._preselect_method = method
+
+    def set_shard(self, rank: int, shards_count: int) -> None:
+        """
+        Makes the reader yield only every shards_count'th example starting from rank'th.
+        """
+        assert 0 <= rank < shards_count
+        self._shard_rank = rank
+        self._shards_count = shards_count
+
+    def _is_in_shard(self, index: int) -> bool:
+        return index % self._shards_count == self._shard_rank
+
     def _read(self, file_path: str) -> Iterable[Instance]:
-        for source, target in self.parse_set(file_path):
+        if self._shuffle_records:
+            records = self._iterate_shuffled_records(file_path)
+        else:
+            records = self.iterate_records(file_path)
+        for i, (source, target) in records:
+            if i in self._skip_indices:
+                continue
             if not source or not target:
                 continue
             instance = self.text_to_instance(source, target)
@@ -62,13 +117,18 @@ class SummarizationReader(DatasetReader):
             out.append(ids.setdefault(token.text.lower(), len(ids)))
         return out
 
+    @timed("reader.text_to_instance")
     def text_to_instance(self, source: str, target: str = None) -> Instance:
         def prepare_text(text, max_tokens):
-            tokens = self._tokenizer.tokenize(text)[:max_tokens]
+            with timer("reader.tokenize"):
+                tokens = self._tokenizer.tokenize(text)[:max_tokens]
             tokens.insert(0, Token(START_SYMBOL))
             tokens.append(Token(END_SYMBOL))
             return tokens
 
+        if self._preselect_max_tokens:
+            with timer("reader.preselect"):
+                source = preselect(source, self._preselect_max_tokens, self._preselect_method)
         source_tokens = prepare_text(source, self._source_max_tokens)
         source_tokens_indexed = TextField(source_tokens, self._source_token_indexers)
         result = {'source_tokens': source_tokens_indexed}
@@ -115,5 +175,38 @@ class SummarizationReader(DatasetReader):
             result["metadata"] = MetadataField(meta_fields)
         return Instance(result)
 
+    def _iterate_shuffled_records(self, path: str) -> Iterable[Tuple[int, Tuple[str, str]]]:
+        offsets = load_offset_index(path, self.offset_index_type)
+        if self._start_path is None:
+            self._start_path = path
+        epoch = self._epochs.get(path, 0)
+        self._epochs[path] = epoch + 1
+        # Empty CSV datasets have no offsets at all
+        if len(offsets) < 2:
+            return
+        order = get_permutation(len(offsets) - 1, self._shuffle_seed, epoch)
+        if epoch == 0 and path == self._start_path:
+            order = order[self._start_position:]
+        # Records of other shards are not even read
+        order = order[order % self._shards_count == self._shard_rank]
+        for index, raw_record in read_records(path, offsets, order):
+            record = self.parse_record(raw_record)
+            if record:
+                yield index, record
+
+    def iterate_records(self, path: str) -> Iterable[Tuple[int, Tuple[str, str]]]:
+        """
+        Records of the reader's shard with their indices. Readers with an offset index number records
+        the same way the index does, including the skipped ones, so skip-lists and shards are the same
+        in sequential and shuffled reading. Readers should check the shard before parsing a record.
+        """
+        return ((i, record) for i, record in enumerate(self.parse_set(path)) if self._is_in_shard(i))
+
+    def parse_record(self, raw_record: str) -> Optional[Tuple[str, str]]:
+        """
+        Source and target of a raw record read with the offset index, None for records to skip.
+        """
+        raise NotImplementedError()
+
     def parse_set(self, path: str) -> Iterable[Tuple[str, str]]:
         raise NotImplementedError()
@@ -1,4 +1,4 @@
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Any
 
 import torch
 from torch.nn.modules.linear import Linear
@@ -9,9 +9,17 @@ from allennlp.models.model import Model
 from allennlp.modules import Attention
 from allennlp.models.encoder_decoders.simple_seq2seq import SimpleSeq2Seq
 
+from summarus import instrumentation
+from summarus.instrumentation import timer, timed
+from summarus.decoding import get_token_array, predictions_to_tokens
+from summarus.greedy_search import GreedySearch
+from summarus.validation import ValidationDecodingMixin
+from summarus.deadline import DeadlineDecodingMixin
+from summarus.low_rank import make_linear, make_embedding
+
 
 @Model.register("seq2seq")
-class Seq2Seq(SimpleSeq2Seq):
+class Seq2Seq(SimpleSeq2Seq, ValidationDecodingMixin, DeadlineDecodingMixin):
     def __init__(self,
                  vocab: Vocabulary,
                  source_embedder: TextFieldEmbedder,
@@ -24,7 +32,9 @@ class Seq2Seq(SimpleSeq2Seq):
                  scheduled_sampling_ratio: float = 0.,
                  use_projection: bool = False,
                  projection_dim: int = None,
-                 tie_embeddings: bool = False) -> None:
+                 tie_embeddings: bool = False,
+                 output_projection_rank: int = None,
+                 target_embedding_rank: int = None) -> None:
         super(Seq2Seq, self).__init__(
             vocab,
             source_embedder,
@@ -40,6 +50,11 @@ class Seq2Seq(SimpleSeq2Seq):
         use_projection = use_projection or projection_dim is not None
 
         self._tie_embeddings = tie_embeddings
+        assert not tie_embeddings or not target_embedding_rank, "Tied embeddings can not be factorized"
+        if target_embedding_rank:
+            # Low rank layers are made by compress.py from trained full rank ones
+            self._target_embedder = make_embedding(self._target_embedder.num_embeddings,
+                                                   self._target_embedder.get_output_dim(), target_embedding_rank)
 
         if self._tie_embeddings:
             assert "token_embedder_tokens" in dict(self._source_embedder.named_children())
@@ -51,10 +66,13 @@ class Seq2Seq(SimpleSeq2Seq):
         if self._use_projection:
             self._projection_dim = projection_dim or self._source_embedder.get_output_dim()
             self._hidden_projection_layer = Linear(self._decoder_output_dim, self._projection_dim)
-            self._output_projection_layer = Linear(self._projection_dim, num_classes)
+            self._output_projection_layer = make_linear(self._projection_dim, num_classes, output_projection_rank)
         else:
-            self._output_projection_layer = Linear(self._decoder_output_dim, num_classes)
+            self._output_projection_layer = make_linear(self._decoder_output_dim, num_classes, output_projection_rank)
         self._bleu = False
+        self._target_token_array = None
+        # Used instead of the beam search with beam_size 1
+        self._greedy_search = GreedySearch(self._end_index, max_steps=max_decoding_steps)
 
     def _prepare_output_projections(self,
                                     last_predictions: torch.Tensor,
@@ -94,3 +112,65 @@ class Seq2Seq(SimpleSeq2Seq):
 
         return output_projections, state
 
+    @timed("model.forward")
+    def forward(self,
+                source_tokens: Dict[str, torch.LongTensor],
+                target_tokens: Dict[str, torch.LongTensor] = None) -> Dict[str, torch.Tensor]:
+        # SimpleSeq2Seq.forward without BLEU and with the validation decoding switch
+        state = self._encode(source_tokens)
+        output_dict = {}
+        if target_tokens:
+            state = self._init_decoder_state(state)
+            output_dict = self._forward_loop(state, target_tokens)
+        if self._should_decode(target_tokens is not None):
+            state = self._init_decoder_state(state)
+            predictions = self._forward_beam_search(state)
+            output_dict.update(predictions)
+        return output_dict
+
+    def _encode(self, source_tokens: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        with timer("model.encode"):
+            return super(Seq2Seq, self)._encode(source_tokens)
+
+    def _forward_loop(self,
+                      state: Dict[str, torch.Tensor],
+                      target_tokens: Dict[str, torch.LongTensor] = None) -> Dict[str, torch.Tensor]:
+        with timer("model.forward_loop"):
+            return super(Seq2Seq, self)._forward_loop(state, target_tokens)
+
+    def _forward_beam_search(self, state: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        with timer("model.beam_search"):
+            batch_size = state["source_mask"].size()[0]
+            start_predictions = state["source_mask"].new_full((batch_size,), fill_value=self._start_index)
+            search = self._get_search(state["source_mask"])
+            all_top_k_predictions, log_probabilities = search.search(start_predictions, state, self.take_step)
+            output_dict = {
+                "class_log_probabilities": log_probabilities,
+                "predictions": all_top_k_predictions,
+            }
+            if self._deadline is not None:
+                output_dict["degraded"] = self._get_degraded(all_top_k_predictions)
+            return output_dict
+
+    def take_step(self,
+                  last_predictions: torch.Tensor,
+                  state: Dict[str, torch.Tensor]) -> Tuple[torch.Tensor, Dict[str, torch.Tensor]]:
+        if instrumentation.is_enabled():
+            instrumentation.increment("model.decode_steps")
+            instrumentation.observe("model.beam_occupancy", (last_predictions != self._end_index).float().mean().item())
+        if self._is_deadline_passed(last_predictions.size(0)):
+            return self._get_end_log_probabilities(last_predictions.size(0), self._output_projection_layer.out_features,
+                                                   state["encoder_outputs"]), state
+        return super(Seq2Seq, self).take_step(last_predictions, state)
+
+    @timed("model.decode")
+    def decode(self, output_dict: Dict[str, torch.Tensor]) -> Dict[str, Any]:
+        if self._target_token_array is None:
+            self._target_token_array = get_token_array(self.vocab, self._target_namespace)
+        output_dict["predicted_tokens"] = predictions_to_tokens(output_dict["predictions"],
+                                                                self._end_index,
+                                                                self._target_token_array)
+        for predicted_tokens in output_dict["predicted_tokens"]:
+            instrumentation.observe("model.decode_steps_per_example", len(predicted_tokens))
+        self._decode_degraded(output_dict)
+        return output_dict
@@ -7,3 +7,4 @@ TEST_URLS_FILE = os.path.join(DATA_DIR, "urls.txt")
 TEST_CONFIG_DIR = os.path.join(TESTS_DIR, "configs")
 TEST_STORIES_DIR = os.path.join(DATA_DIR, "stories")
 RIA_EXAMPLE_FILE = os.path.join(DATA_DIR, "ria_20.json")
+MEMORY_BUDGETS_FILE = os.path.join(DATA_DIR, "memory_budgets.json")
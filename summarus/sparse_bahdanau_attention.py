@@ -0,0 +1,102 @@
+import math
+
+import torch
+from torch.nn.modules.linear import Linear
+
+from allennlp.modules.attention import Attention
+from allennlp.nn.util import masked_softmax
+
+from summarus.bahdanau_attention import BahdanauAttention
+
+SPARSE_ATTENTION_MODES = ("window", "topk")
+
+
+@Attention.register("sparse_bahdanau")
+class SparseBahdanauAttention(BahdanauAttention):
+    """
+    Bahdanau attention that scores only a part of the source at inference.
+    window: 2 * window_size + 1 positions around a focus position predicted from the decoder state,
+    scores get a Gaussian bias around the focus, as in the local-p attention of Luong et al.
+    topk: top_k positions by a cheap dot product of the encoder outputs and a projection of the decoder state,
+    the dot product is added to the scores.
+    Weights are returned for the full source with zeros outside the scored positions,
+    so coverage and the PGN copy distribution work unchanged.
+    The biases are trained with the dense attention, in training mode every position is scored.
+    sparse=False keeps the dense attention at inference too, to measure the quality cost of sparsity.
+    """
+    def __init__(self,
+                 dim: int,
+                 normalize: bool = True,
+                 use_coverage: bool = False,
+                 mode: str = "window",
+                 window_size: int = 32,
+                 top_k: int = 64,
+                 sparse: bool = True):
+        super(SparseBahdanauAttention, self).__init__(dim, normalize, use_coverage)
+        assert normalize, "Sparse attention returns normalized weights only"
+        assert mode in SPARSE_ATTENTION_MODES, "Unknown sparse attention mode: {}".format(mode)
+        self._mode = mode
+        self._window_size = window_size
+        self._top_k = top_k
+        self._sparse = sparse
+
+        if mode == "window":
+            self._position_projection_layer = Linear(dim, dim, bias=False)
+            self._position_v = Linear(dim, 1, bias=False)
+        else:
+            self._query_projection_layer = Linear(dim, dim, bias=False)
+
+    def _get_candidates_count(self) -> int:
+        return 2 * self._window_size + 1 if self._mode == "window" else self._top_k
+
+    def _get_bias(self,
+                  decoder_state: torch.Tensor,
+                  encoder_outputs: torch.Tensor,
+                  mask: torch.Tensor) -> torch.Tensor:
+        if self._mode == "topk":
+            # shape: (batch_size, source_length)
+            query = self._query_projection_layer(decoder_state)
+            return encoder_outputs.bmm(query.unsqueeze(2)).squeeze(2) / math.sqrt(self._dim)
+
+        batch_size, source_length = encoder_outputs.size()[:2]
+        if mask is not None:
+            lengths = mask.float().sum(1)
+        else:
+            lengths = encoder_outputs.new_full((batch_size,), source_length)
+        # shape: (batch_size, 1)
+        focus_ratio = torch.sigmoid(self._position_v(torch.tanh(self._position_projection_layer(decoder_state))))
+        focus = (lengths - 1.).clamp(min=0.).unsqueeze(1) * focus_ratio
+        positions = torch.arange(source_length, dtype=focus.dtype, device=focus.device).unsqueeze(0)
+        sigma = self._window_size / 2.
+        return -(positions - focus) ** 2 / (2. * sigma ** 2)
+
+    def _get_candidates(self, bias: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
+        source_length = bias.size(1)
+        count = self._get_candidates_count()
+        if self._mode == "topk":
+            if mask is not None:
+                bias = bias.masked_fill(mask == 0, -float("inf"))
+            return bias.topk(count, dim=1)[1]
+        # The Gaussian bias peaks at the focus, the window is shifted to stay inside the source
+        center = bias.argmax(dim=1)
+        start = (center - self._window_size).clamp(0, source_length - count)
+        return start.unsqueeze(1) + torch.arange(count, device=bias.device).unsqueeze(0)
+
+    def forward(self,
+                vector: torch.Tensor,
+                matrix: torch.Tensor,
+                matrix_mask: torch.Tensor = None,
+                coverage: torch.Tensor = None) -> torch.Tensor:
+        bias = self._get_bias(vector, matrix, matrix_mask)
+        if self.training or not self._sparse or matrix.size(1) <= self._get_candidates_count():
+            similarities = self._forward_internal(vector, matrix, coverage) + bias
+            return masked_softmax(similarities, matrix_mask)
+
+        # shape: (batch_size, candidates_count)
+        candidates = self._get_candidates(bias, matrix_mask)
+        candidate_matrix = matrix.gather(1, candidates.unsqueeze(2).expand(-1, -1, matrix.size(2)))
+        candidate_coverage = coverage.gather(1, candidates) if coverage is not None else None
+        candidate_mask = matrix_mask.gather(1, candidates) if matrix_mask is not None else None
+        similarities = self._forward_internal(vector, candidate_matrix, candidate_coverage) + bias.gather(1, candidates)
+        weights = masked_softmax(similarities, candidate_mask)
+        return weights.new_zeros(matrix.size()[:2]).scatter_(1, candidates, weights)
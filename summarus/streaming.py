@@ -0,0 +1,127 @@
+import time
+from typing import Dict, Iterator, List
+
+import torch
+from allennlp.data.dataset import Batch
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.nn import util
+
+from summarus import instrumentation
+from summarus.decoding import get_token_array, get_oov_positions, get_source_tokens
+
+
+class StreamingSummarizer:
+    """
+    Generates a summary of a single text token by token.
+    Greedy decoding yields every token right after its step, beam search yields the prefix
+    shared by all beams, because it can not change anymore.
+    Supports pgn and seq2seq models.
+    """
+    def __init__(self, model: Model, reader: DatasetReader, beam_size: int = None, max_steps: int = None):
+        self._model = model
+        self._reader = reader
+        self._beam_size = beam_size or model._beam_search.beam_size
+        self._max_steps = max_steps or model._max_decoding_steps
+        self._token_array = get_token_array(model.vocab, model._target_namespace)
+        self._is_pgn = hasattr(model, "_prepare")
+
+    def _get_initial_state(self, inputs: Dict) -> Dict[str, torch.Tensor]:
+        state = self._model._encode(inputs["source_tokens"])
+        if self._is_pgn:
+            extra_zeros, modified_source_tokens, _ = self._model._prepare(
+                inputs["source_to_target"], inputs["source_token_ids"])
+            state["tokens"] = modified_source_tokens
+            state["extra_zeros"] = extra_zeros
+        return self._model._init_decoder_state(state)
+
+    def _make_token_resolver(self, inputs: Dict):
+        vocab_size = len(self._token_array)
+        source_tokens = None
+        oov_positions = None
+        if self._is_pgn:
+            source_tokens = get_source_tokens(inputs["metadata"])[0]
+            oov_positions = get_oov_positions(inputs["source_to_target"], inputs["source_token_ids"],
+                                              self._model._target_unk_index)[0]
+
+        def resolve(index: int) -> str:
+            if index < vocab_size:
+                return self._token_array[index]
+            return source_tokens[oov_positions[index - vocab_size]]
+        return resolve
+
+    def stream(self, text: str) -> Iterator[str]:
+        model = self._model
+        model.eval()
+        instance = self._reader.text_to_instance(text)
+        batch = Batch([instance])
+        batch.index_instances(model.vocab)
+        inputs = util.move_to_device(batch.as_tensor_dict(), model._get_prediction_device())
+        resolve = self._make_token_resolver(inputs)
+
+        start_time = time.perf_counter()
+        is_first = True
+        with torch.no_grad():
+            state = self._get_initial_state(inputs)
+            search = self._greedy_search if self._beam_size == 1 else self._beam_search
+            for index in search(state):
+                if is_first:
+                    instrumentation.observe("stream.first_token_ms", (time.perf_counter() - start_time) * 1000.)
+                    is_first = False
+                yield resolve(index)
+        instrumentation.observe("stream.total_ms", (time.perf_counter() - start_time) * 1000.)
+
+    def _greedy_search(self, state: Dict[str, torch.Tensor]) -> Iterator[int]:
+        end_index = self._model._end_index
+        last_predictions = state["source_mask"].new_full((1,), fill_value=self._model._start_index)
+        for _ in range(self._max_steps):
+            log_probs, state = self._model.take_step(last_predictions, state)
+            last_predictions = log_probs.argmax(dim=-1)
+            index = last_predictions.item()
+            if index == end_index:
+                return
+            yield index
+
+    def _beam_search(self, state: Dict[str, torch.Tensor]) -> Iterator[int]:
+        end_index = self._model._end_index
+        beam_size = self._beam_size
+        last_predictions = state["source_mask"].new_full((1,), fill_value=self._model._start_index)
+        scores = None
+        sequences = [[]]  # type: List[List[int]]
+        committed_length = 0
+        for _ in range(self._max_steps):
+            log_probs, state = self._model.take_step(last_predictions, state)
+            if scores is None:
+                # First step: one source, the beams are its top tokens
+                scores, last_predictions = log_probs[0].topk(min(beam_size, log_probs.size(-1)))
+                backpointers = last_predictions.new_zeros(last_predictions.size())
+            else:
+                # Finished beams keep their scores and can only be continued with the end symbol
+                is_finished = last_predictions == end_index
+                end_log_probs = log_probs[:, end_index].masked_fill(is_finished, 0.)
+                log_probs = log_probs.masked_fill(is_finished.unsqueeze(-1), float("-inf"))
+                log_probs[:, end_index] = end_log_probs
+                vocab_size = log_probs.size(-1)
+                scores, flat_indices = (log_probs + scores.unsqueeze(-1)).view(-1).topk(beam_size)
+                backpointers = flat_indices // vocab_size
+                last_predictions = flat_indices % vocab_size
+            state = {key: value.index_select(0, backpointers) for key, value in state.items()}
+            sequences = [sequences[b] + [p] for b, p in zip(backpointers.tolist(), last_predictions.tolist())]
+
+            # Tokens before the first end symbol that all beams agree on are final
+            live = [sequence[:sequence.index(end_index)] if end_index in sequence else sequence
+                    for sequence in sequences]
+            prefix_length = committed_length
+            while all(len(s) > prefix_length for s in live) and \
+                    all(s[prefix_length] == live[0][prefix_length] for s in live):
+                prefix_length += 1
+            for index in live[0][committed_length:prefix_length]:
+                yield index
+            committed_length = prefix_length
+            if (last_predictions == end_index).all():
+                break
+
+        best = sequences[int(scores.argmax())]
+        best = best[:best.index(end_index)] if end_index in best else best
+        for index in best[committed_length:]:
+            yield index
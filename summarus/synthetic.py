@@ -0,0 +1,136 @@
+import os
+import csv
+import json
+import hashlib
+from typing import List
+
+import numpy as np
+
+CORPUS_FORMATS = ("ria", "lenta", "cnn_dailymail", "contracts")
+CYRILLIC_LETTERS = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+LATIN_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+SENTENCE_ENDS = (".", ".", ".", "!", "?")
+
+
+class TextGenerator:
+    """
+    Random texts with Zipf-like word frequencies over a fixed random lexicon and sentences of 5-25 words.
+    Lengths are log-normal with the given median, sigma 0 gives the same length for every text.
+    """
+    def __init__(self, letters: str, lexicon_size: int = 50000, seed: int = 42):
+        self._rng = np.random.RandomState(seed)
+        letters = np.array(list(letters))
+        word_lengths = self._rng.randint(2, 12, size=lexicon_size)
+        self._lexicon = ["".join(self._rng.choice(letters, size=length)) for length in word_lengths]
+
+    def sample_length(self, median_length: int, sigma: float = 0.) -> int:
+        if not sigma:
+            return median_length
+        return max(1, int(self._rng.lognormal(np.log(median_length), sigma)))
+
+    def generate_sentences(self, length: int) -> List[str]:
+        ranks = self._rng.zipf(1.1, size=length) % len(self._lexicon)
+        words = [self._lexicon[rank] for rank in ranks]
+        sentences = []
+        start = 0
+        while start < length:
+            end = min(length, start + self._rng.randint(5, 26))
+            sentence = " ".join(words[start:end])
+            sentences.append(sentence[0].upper() + sentence[1:] + self._rng.choice(SENTENCE_ENDS))
+            start = end
+        return sentences
+
+    def generate(self, length: int) -> str:
+        return " ".join(self.generate_sentences(length))
+
+
+def write_ria(path: str, generator: TextGenerator, documents_count: int, median_length: int, sigma: float,
+              title_length: int) -> str:
+    # Texts are HTML paragraphs with entities, as in the original dataset
+    with open(path, "w", encoding="utf-8") as w:
+        for _ in range(documents_count):
+            sentences = generator.generate_sentences(generator.sample_length(median_length, sigma))
+            paragraphs = [" ".join(sentences[i:i + 3]).replace(" ", "&nbsp;", 1) for i in range(0, len(sentences), 3)]
+            text = "".join("<p>{}</p>\n".format(paragraph) for paragraph in paragraphs)
+            record = {"text": text, "title": generator.generate(title_length)}
+            w.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def write_lenta(path: str, generator: TextGenerator, documents_count: int, median_length: int, sigma: float,
+                title_length: int) -> str:
+    # Some texts have line breaks inside quoted fields
+    with open(path, "w", encoding="utf-8", newline="") as w:
+        writer = csv.writer(w, delimiter=",", quotechar='"')
+        writer.writerow(["url", "title", "text", "topic", "tags"])
+        for i in range(documents_count):
+            sentences = generator.generate_sentences(generator.sample_length(median_length, sigma))
+            separator = "\n" if i % 10 == 0 else "\xa0"
+            writer.writerow(["https://lenta.ru/news/{}/".format(i), generator.generate(title_length),
+                             separator.join(sentences), "Мир", "Все"])
+    return path
+
+
+def _write_story(path: str, generator: TextGenerator, median_length: int, sigma: float, title_length: int,
+                 encoding: str) -> None:
+    sentences = generator.generate_sentences(generator.sample_length(median_length, sigma))
+    highlights = generator.generate_sentences(title_length)
+    with open(path, "w", encoding=encoding) as w:
+        w.write("\n\n".join(sentences))
+        for highlight in highlights:
+            w.write("\n\n@highlight\n\n" + highlight)
+        w.write("\n")
+
+
+def write_cnn_dailymail(path: str, generator: TextGenerator, documents_count: int, median_length: int,
+                        sigma: float, title_length: int) -> str:
+    """
+    Writes stories to <path>/stories and their URLs to <path>/urls.txt, returns the URLs path.
+    """
+    stories_dir = os.path.join(path, "stories")
+    os.makedirs(stories_dir, exist_ok=True)
+    urls_path = os.path.join(path, "urls.txt")
+    with open(urls_path, "w", encoding="utf-8") as w:
+        for i in range(documents_count):
+            url = "http://www.cnn.com/synthetic/{}/".format(i)
+            file_name = hashlib.sha1(url.encode("utf-8")).hexdigest() + ".story"
+            _write_story(os.path.join(stories_dir, file_name), generator, median_length, sigma, title_length, "utf-8")
+            w.write(url + "\n")
+    return urls_path
+
+
+def write_contracts(path: str, generator: TextGenerator, documents_count: int, median_length: int,
+                    sigma: float, title_length: int) -> str:
+    os.makedirs(path, exist_ok=True)
+    for i in range(documents_count):
+        _write_story(os.path.join(path, "{:08d}.txt".format(i)), generator, median_length, sigma, title_length,
+                     "cp1251")
+    return path
+
+
+WRITERS = {
+    "ria": write_ria,
+    "lenta": write_lenta,
+    "cnn_dailymail": write_cnn_dailymail,
+    "contracts": write_contracts
+}
+FILE_NAMES = {
+    "ria": "ria.json",
+    "lenta": "lenta.csv",
+    "cnn_dailymail": "cnn_dailymail",
+    "contracts": "contracts"
+}
+
+
+def generate_corpus(corpus_format: str, output_dir: str, documents_count: int, median_length: int = 400,
+                    sigma: float = 0.5, title_length: int = 12, lexicon_size: int = 50000, seed: int = 42) -> str:
+    """
+    Writes a synthetic corpus in the native format of the reader to output_dir,
+    returns the path to pass to the reader's parse_set.
+    """
+    assert corpus_format in CORPUS_FORMATS, "Unknown corpus format: {}".format(corpus_format)
+    letters = LATIN_LETTERS if corpus_format == "cnn_dailymail" else CYRILLIC_LETTERS
+    generator = TextGenerator(letters, lexicon_size, seed)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, FILE_NAMES[corpus_format])
+    return WRITERS[corpus_format](path, generator, documents_count, median_length, sigma, title_length)
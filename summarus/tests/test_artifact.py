@@ -0,0 +1,57 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+from summarus import import_plugins
+from summarus.artifact import export_artifact, load_artifact, is_artifact
+from summarus.settings import TEST_CONFIG_DIR, RIA_EXAMPLE_FILE
+
+
+class TestArtifact(unittest.TestCase):
+    def setUp(self):
+        self.model_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_path)
+
+    def test_export_and_load(self):
+        torch.manual_seed(1337)
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "ria_pgn.json"))
+        import_plugins(params)
+        with open(os.path.join(self.model_path, "config.json"), "w", encoding="utf-8") as w:
+            json.dump(params.as_dict(quiet=True), w)
+        reader = DatasetReader.from_params(params.pop("reader"))
+        dataset = list(reader.read(RIA_EXAMPLE_FILE))
+        vocabulary = Vocabulary.from_instances(dataset)
+        vocabulary.save_to_files(os.path.join(self.model_path, "vocabulary"))
+        model = Model.from_params(params.pop("model"), vocab=vocabulary)
+        model.eval()
+        torch.save(model.state_dict(), os.path.join(self.model_path, "best.th"))
+
+        artifact_path = os.path.join(self.model_path, "model.bin")
+        export_artifact(self.model_path, artifact_path)
+        self.assertTrue(is_artifact(artifact_path))
+        self.assertFalse(is_artifact(os.path.join(self.model_path, "best.th")))
+        loaded_model, loaded_reader, _ = load_artifact(artifact_path)
+
+        for namespace in ("tokens", "target_tokens"):
+            self.assertEqual(vocabulary.get_index_to_token_vocabulary(namespace),
+                             loaded_model.vocab.get_index_to_token_vocabulary(namespace))
+        loaded_state_dict = loaded_model.state_dict()
+        for name, tensor in model.state_dict().items():
+            self.assertTrue(torch.equal(tensor, loaded_state_dict[name]))
+
+        instances = [loaded_reader.text_to_instance(" ".join(instance.fields["metadata"]["source_tokens"]))
+                     for instance in dataset[:3]]
+        outputs = model.forward_on_instances(instances)
+        loaded_outputs = loaded_model.forward_on_instances(instances)
+        for output, loaded_output in zip(outputs, loaded_outputs):
+            self.assertEqual(output["predicted_tokens"], loaded_output["predicted_tokens"])
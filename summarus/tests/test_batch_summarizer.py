@@ -0,0 +1,56 @@
+import os
+import unittest
+
+import numpy as np
+import torch
+from allennlp.common.params import Params
+from allennlp.data.dataset import Batch
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.predictors.seq2seq import Seq2SeqPredictor
+
+from summarus import import_plugins
+from summarus.batch_summarizer import BatchSummarizer, pad_sequences
+from summarus.decoding import join_tokens
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR, RIA_EXAMPLE_FILE
+
+
+class TestBatchSummarizer(unittest.TestCase):
+    def test_pad_sequences(self):
+        matrix = pad_sequences([[1, 2, 3], [], [4]])
+        self.assertTrue(np.array_equal(matrix, np.array([[1, 2, 3], [0, 0, 0], [4, 0, 0]])))
+
+    def test_parity_with_predictor(self):
+        torch.manual_seed(1337)
+        for file_name in sorted(os.listdir(TEST_CONFIG_DIR)):
+            if not file_name.endswith(".json"):
+                continue
+            params = Params.from_file(os.path.join(TEST_CONFIG_DIR, file_name))
+            import_plugins(params)
+            reader_params = params.pop("reader")
+            if reader_params["type"] == "cnn_dailymail":
+                reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+                dataset_file = TEST_URLS_FILE
+            else:
+                dataset_file = RIA_EXAMPLE_FILE
+            reader = DatasetReader.from_params(reader_params)
+            dataset = reader.read(dataset_file)
+            vocabulary = Vocabulary.from_params(params.pop("vocabulary", default=Params({})), instances=dataset)
+            model = Model.from_params(params.pop("model"), vocab=vocabulary)
+            model.eval()
+
+            texts = [source for source, _ in list(reader.parse_set(dataset_file))[:4]]
+            summarizer = BatchSummarizer(model, reader)
+            tensors = summarizer.make_tensors(summarizer.tokenize(texts))
+            batch = Batch([reader.text_to_instance(text) for text in texts])
+            batch.index_instances(vocabulary)
+            expected_tensors = batch.as_tensor_dict()
+            self.assertTrue(torch.equal(tensors["source_tokens"]["tokens"], expected_tensors["source_tokens"]["tokens"]))
+            for key in ("source_to_target", "source_token_ids"):
+                if key in expected_tensors:
+                    self.assertTrue(torch.equal(tensors[key].float(), expected_tensors[key].float()), key)
+
+            outputs = Seq2SeqPredictor(model, reader).predict_batch_json([{"source": text} for text in texts])
+            expected = [join_tokens(output["predicted_tokens"]) for output in outputs]
+            self.assertEqual(summarizer.summarize(texts), expected, file_name)
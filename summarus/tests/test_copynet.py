@@ -0,0 +1,63 @@
+import os
+import types
+import unittest
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.dataset import Batch
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.models.encoder_decoders.copynet_seq2seq import CopyNetSeq2Seq
+
+from summarus import import_plugins
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR
+
+
+class TestCopyNet(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(1337)
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "cnn_dm_copynet.json"))
+        import_plugins(params)
+        reader_params = params.pop("reader")
+        reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+        reader = DatasetReader.from_params(reader_params)
+        dataset = reader.read(TEST_URLS_FILE)
+        vocabulary = Vocabulary.from_instances(dataset)
+        cls.model = Model.from_params(params.pop("model"), vocab=vocabulary)
+        cls.model.eval()
+        test_instances = [reader.text_to_instance(" ".join(instance.fields["metadata"]["source_tokens"]))
+                          for instance in list(dataset)[:5]]
+        batch = Batch(test_instances)
+        batch.index_instances(vocabulary)
+        cls.tensors = batch.as_tensor_dict()
+
+    def test_gather_final_log_probs(self):
+        model = self.model
+        source_to_target = self.tensors["source_to_target"]
+        source_token_ids = self.tensors["source_token_ids"]
+        batch_size, source_length = source_to_target.size()
+        target_vocab_size = model._target_vocab_size
+        generation_log_probs = torch.log_softmax(torch.randn(batch_size, target_vocab_size), dim=-1)
+        copy_log_probs = torch.log_softmax(torch.randn(batch_size, source_length), dim=-1)
+        state = {"source_to_target": source_to_target, "source_token_ids": source_token_ids}
+
+        expected = CopyNetSeq2Seq._gather_final_log_probs(model, generation_log_probs.clone(), copy_log_probs, state)
+        actual = model._gather_final_log_probs(generation_log_probs.clone(), copy_log_probs, dict(state))
+        self.assertEqual(expected.size(), actual.size())
+        # Masked entries are around log(1e-45), only the probable ones are compared exactly
+        is_probable = expected > -50.
+        self.assertTrue(torch.equal(is_probable, actual > -50.))
+        self.assertTrue(torch.allclose(expected[is_probable], actual[is_probable], atol=1e-5))
+
+    def test_beam_search_parity(self):
+        model = self.model
+        with torch.no_grad():
+            actual = model(**self.tensors)["predictions"]
+            model._gather_final_log_probs = types.MethodType(CopyNetSeq2Seq._gather_final_log_probs, model)
+            try:
+                expected = model(**self.tensors)["predictions"]
+            finally:
+                del model._gather_final_log_probs
+        self.assertTrue(torch.equal(expected, actual))
@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+import torch
+from allennlp.data.vocabulary import Vocabulary, DEFAULT_OOV_TOKEN
+
+from summarus.decoding import get_token_array, get_oov_positions, predictions_to_tokens, join_tokens
+
+
+class TestDecoding(unittest.TestCase):
+    def setUp(self):
+        self.vocabulary = Vocabulary()
+        for token in ("@start@", "@end@", "a", "b", "c"):
+            self.vocabulary.add_token_to_namespace(token)
+        self.token_array = get_token_array(self.vocabulary, "tokens")
+        self.end_index = self.vocabulary.get_token_index("@end@")
+        self.unk_index = self.vocabulary.get_token_index(DEFAULT_OOV_TOKEN)
+
+    def test_token_array(self):
+        for index, token in self.vocabulary.get_index_to_token_vocabulary().items():
+            self.assertEqual(self.token_array[index], token)
+
+    def test_pgn_oov(self):
+        source_tokens = [["a", "x", "y", "x", "b"], ["z", "c", "a", "a", "a"]]
+        source_to_target = torch.LongTensor([[self.vocabulary.get_token_index(t) for t in s] for s in source_tokens])
+        source_token_ids = torch.FloatTensor([[0, 1, 2, 1, 3], [0, 1, 2, 2, 2]])
+        oov_positions = get_oov_positions(source_to_target, source_token_ids, self.unk_index)
+        self.assertEqual([source_tokens[0][position] for position in oov_positions[0]], ["x", "y"])
+        self.assertEqual(oov_positions[1].tolist(), [0, -1])
+
+        vocab_size = len(self.token_array)
+        a, c = self.vocabulary.get_token_index("a"), self.vocabulary.get_token_index("c")
+        predictions = torch.LongTensor([[[a, vocab_size + 1, vocab_size, self.end_index, a]],
+                                        [[vocab_size, c, vocab_size + 1, a, self.end_index]]])
+        tokens = predictions_to_tokens(predictions, self.end_index, self.token_array, source_tokens, oov_positions)
+        self.assertEqual(tokens, [["a", "y", "x"], ["z", "c", DEFAULT_OOV_TOKEN, "a"]])
+
+    def test_copynet_copy(self):
+        source_tokens = [["x", "y", "z"]]
+        vocab_size = len(self.token_array)
+        predictions = np.array([[[vocab_size + 2, self.vocabulary.get_token_index("b"), vocab_size]]])
+        tokens = predictions_to_tokens(predictions, self.end_index, self.token_array, source_tokens)
+        self.assertEqual(tokens, [["z", "b", "x"]])
+
+    def test_join_tokens(self):
+        self.assertEqual(join_tokens(["a", "b"]), "a b")
+        self.assertEqual(join_tokens(["▁при", "вет", "▁мир"], is_subwords=True), "привет мир")
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from summarus.dedup import MinHasher, find_duplicates, write_skip_list
+from summarus.readers import RIAReader
+from summarus.settings import RIA_EXAMPLE_FILE
+
+
+class TestDedup(unittest.TestCase):
+    def test_find_duplicates(self):
+        texts = [
+            "президент россии провел совещание с членами правительства по вопросам экономики в кремле",
+            "в москве прошел фестиваль уличной еды и музыки который посетили тысячи человек",
+            "президент россии провел совещание с членами правительства по вопросам экономики в кремле сегодня",
+            "сборная россии по футболу обыграла соперника в товарищеском матче со счетом два один"
+        ]
+        signatures = MinHasher(num_perm=128, shingle_size=3).signatures(texts)
+        self.assertEqual(find_duplicates(signatures, bands=32, threshold=0.7), [2])
+
+    def test_find_duplicates_in_bucket(self):
+        # 1 and 2 share a band with 0, but only 1 and 2 are near-duplicates
+        first = np.arange(16, dtype=np.uint32)
+        second = first.copy()
+        second[8:] += 100
+        third = second.copy()
+        third[15] += 100
+        signatures = np.stack([first, second, third, third])
+        self.assertEqual(find_duplicates(signatures, bands=2, threshold=0.8), [2, 3])
+
+    def test_reader_skip_list(self):
+        texts = [text for text, _ in RIAReader().parse_set(RIA_EXAMPLE_FILE)]
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
+            skip_list_path = f.name
+        try:
+            write_skip_list([0, 3], skip_list_path)
+            instances = list(RIAReader(skip_list_path=skip_list_path).read(RIA_EXAMPLE_FILE))
+            self.assertEqual(len(instances), len(texts) - 2)
+        finally:
+            os.remove(skip_list_path)
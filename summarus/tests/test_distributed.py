@@ -0,0 +1,83 @@
+import os
+import socket
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.iterators.data_iterator import DataIterator
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+from summarus import import_plugins
+from summarus.distributed import _broadcast_parameters, _all_reduce_gradients
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR
+
+WORLD_SIZE = 2
+
+
+def run_worker(rank, world_size, output_dir):
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "cnn_dm_pgn.json"))
+    import_plugins(params)
+    reader_params = params.pop("reader")
+    reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+    vocabulary = Vocabulary.from_instances(DatasetReader.from_params(reader_params.duplicate()).read(TEST_URLS_FILE))
+    reader = DatasetReader.from_params(reader_params)
+    reader.set_shard(rank, world_size)
+    dataset = reader.read(TEST_URLS_FILE)
+
+    # Every worker starts from its own random weights
+    torch.manual_seed(rank)
+    model = Model.from_params(params.pop("model"), vocab=vocabulary)
+    parameters = [p for p in model.parameters() if p.requires_grad]
+    _broadcast_parameters(parameters)
+
+    iterator = DataIterator.from_params(params.pop("iterator"))
+    iterator.index_with(vocabulary)
+    batch = next(iterator(dataset, num_epochs=1, shuffle=False))
+    model(**batch)["loss"].backward()
+    local_gradients = [p.grad.clone() if p.grad is not None else torch.zeros_like(p) for p in parameters]
+    _all_reduce_gradients(parameters, world_size)
+
+    torch.save({
+        "parameters": [p.data for p in parameters],
+        "local_gradients": local_gradients,
+        "gradients": [p.grad for p in parameters],
+        "indices": [index for index, _ in reader.iterate_records(TEST_URLS_FILE)]
+    }, os.path.join(output_dir, "rank{}.th".format(rank)))
+    dist.destroy_process_group()
+
+
+class TestDistributed(unittest.TestCase):
+    def test_workers(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        directory = tempfile.mkdtemp()
+        try:
+            with mock.patch.dict(os.environ, {"MASTER_ADDR": "127.0.0.1", "MASTER_PORT": str(port)}):
+                mp.spawn(run_worker, args=(WORLD_SIZE, directory), nprocs=WORLD_SIZE, join=True)
+            results = [torch.load(os.path.join(directory, "rank{}.th".format(rank))) for rank in range(WORLD_SIZE)]
+        finally:
+            shutil.rmtree(directory)
+
+        for first, second in zip(results[0]["parameters"], results[1]["parameters"]):
+            self.assertTrue(torch.equal(first, second))
+
+        for i, gradient in enumerate(results[0]["gradients"]):
+            mean_gradient = sum(result["local_gradients"][i] for result in results) / WORLD_SIZE
+            self.assertTrue(torch.allclose(gradient, mean_gradient, atol=1e-6))
+            self.assertTrue(torch.equal(gradient, results[1]["gradients"][i]))
+        self.assertTrue(any(not torch.equal(first, second) for first, second in
+                            zip(results[0]["local_gradients"], results[1]["local_gradients"])))
+
+        first_shard, second_shard = (set(result["indices"]) for result in results)
+        self.assertTrue(first_shard)
+        self.assertTrue(second_shard)
+        self.assertFalse(first_shard & second_shard)
@@ -0,0 +1,53 @@
+import unittest
+
+import torch
+from allennlp.nn.beam_search import BeamSearch
+
+from summarus.greedy_search import GreedySearch
+
+
+class TestGreedySearch(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1337)
+        self.end_index = 3
+        self.vocab_size = 50
+        self.hidden_size = 16
+        self.output_weight = torch.randn(self.hidden_size, self.vocab_size)
+        self.embeddings = torch.randn(self.vocab_size, self.hidden_size)
+        self.recurrent_weight = torch.randn(self.hidden_size, self.hidden_size) * 0.3
+
+    def take_step(self, last_predictions, state):
+        hidden = torch.tanh(state["hidden"].mm(self.recurrent_weight) + self.embeddings[last_predictions])
+        logits = hidden.mm(self.output_weight)
+        logits[:, self.end_index] += state["end_bias"].squeeze(-1)
+        return torch.log_softmax(logits, dim=-1), {"hidden": hidden, "end_bias": state["end_bias"]}
+
+    def test_beam_search_parity(self):
+        for batch_size in (1, 8, 32):
+            # Rows with different end biases finish at different steps
+            state = {
+                "hidden": torch.randn(batch_size, self.hidden_size),
+                "end_bias": torch.rand(batch_size, 1) * 10.
+            }
+            start_predictions = torch.zeros(batch_size, dtype=torch.long)
+            expected_predictions, expected_log_probs = BeamSearch(self.end_index, max_steps=20, beam_size=1).search(
+                start_predictions, dict(state), self.take_step)
+            predictions, log_probs = GreedySearch(self.end_index, max_steps=20).search(
+                start_predictions, dict(state), self.take_step)
+            self.assertTrue(torch.equal(expected_predictions, predictions))
+            self.assertTrue(torch.allclose(expected_log_probs, log_probs, atol=1e-5))
+
+    def test_shrinking_groups(self):
+        group_sizes = []
+
+        def take_step(last_predictions, state):
+            group_sizes.append(last_predictions.size(0))
+            return self.take_step(last_predictions, state)
+
+        state = {
+            "hidden": torch.randn(4, self.hidden_size),
+            "end_bias": torch.tensor([[100.], [0.], [0.], [0.]])
+        }
+        GreedySearch(self.end_index, max_steps=10).search(torch.zeros(4, dtype=torch.long), state, take_step)
+        self.assertEqual(group_sizes[0], 4)
+        self.assertLess(group_sizes[-1], 4)
@@ -0,0 +1,27 @@
+import unittest
+
+from allennlp.data.vocabulary import Vocabulary
+
+from summarus.readers import RIAReader
+from summarus.iterators import TokenBudgetIterator
+from summarus.settings import RIA_EXAMPLE_FILE
+
+
+class TestIterators(unittest.TestCase):
+    def test_token_budget_iterator(self):
+        reader = RIAReader()
+        dataset = reader.read(RIA_EXAMPLE_FILE)
+        vocabulary = Vocabulary.from_instances(dataset)
+        max_tokens = 1000
+        iterator = TokenBudgetIterator(max_tokens=max_tokens, max_instances_in_memory=8)
+        iterator.index_with(vocabulary)
+
+        instances_count = 0
+        for batch in iterator(dataset, num_epochs=1, shuffle=True):
+            batch_size, source_length = batch["source_tokens"]["tokens"].size()
+            target_length = batch["target_tokens"]["tokens"].size(1)
+            if batch_size > 1:
+                self.assertLessEqual(batch_size * (source_length + target_length), max_tokens)
+            instances_count += batch_size
+        self.assertEqual(instances_count, len(list(dataset)))
+        self.assertGreaterEqual(iterator.get_padding_ratio(), 0.0)
@@ -0,0 +1,45 @@
+import os
+import unittest
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+from summarus import import_plugins
+from summarus.batch_summarizer import BatchSummarizer
+from summarus.long_document import LongDocumentSummarizer, split_chunks
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR
+
+
+class TestLongDocumentSummarizer(unittest.TestCase):
+    def test_split_chunks(self):
+        tokens = list(range(10))
+        self.assertEqual(split_chunks(tokens, 10, 3), [tokens])
+        self.assertEqual(split_chunks(tokens, 5), [tokens[:5], tokens[5:]])
+        self.assertEqual(split_chunks(tokens, 4, 1), [tokens[0:4], tokens[3:7], tokens[6:10]])
+
+    def test_summarize(self):
+        torch.manual_seed(1337)
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "cnn_dm_pgn.json"))
+        import_plugins(params)
+        reader_params = params.pop("reader")
+        reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+        reader = DatasetReader.from_params(reader_params)
+        dataset = reader.read(TEST_URLS_FILE)
+        vocabulary = Vocabulary.from_params(params.pop("vocabulary", default=Params({})), instances=dataset)
+        model = Model.from_params(params.pop("model"), vocab=vocabulary)
+        model.eval()
+
+        texts = [source for source, _ in list(reader.parse_set(TEST_URLS_FILE))[:3]]
+        summarizer = BatchSummarizer(model, reader)
+        long_summarizer = LongDocumentSummarizer(summarizer, chunk_tokens=30, overlap_tokens=5, batch_size=4)
+        tokenized_texts = summarizer.tokenize(texts, truncate=False)
+        self.assertTrue(any(len(tokens) > 30 for tokens in tokenized_texts))
+        summaries = long_summarizer.summarize(texts)
+        self.assertEqual(len(summaries), len(texts))
+
+        # Documents fitting into one chunk are summarized as usual
+        short_texts = [" ".join(tokens[:20]) for tokens in tokenized_texts]
+        self.assertEqual(long_summarizer.summarize(short_texts), summarizer.summarize(short_texts))
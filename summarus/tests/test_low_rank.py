@@ -0,0 +1,60 @@
+import os
+import unittest
+
+import torch
+from torch.nn.modules.linear import Linear
+from allennlp.common.params import Params
+from allennlp.data.dataset import Batch
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+from summarus import import_plugins
+from summarus.low_rank import LowRankLinear, factorize, factorize_linear, factorize_embedding
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR
+
+
+class TestLowRank(unittest.TestCase):
+    def test_factorize(self):
+        torch.manual_seed(1337)
+        matrix = torch.randn(50, 8).mm(torch.randn(8, 20))
+        left, right = factorize(matrix, 8)
+        self.assertEqual(left.size(), (50, 8))
+        self.assertEqual(right.size(), (8, 20))
+        self.assertTrue(torch.allclose(left.mm(right), matrix, atol=1e-4))
+
+        layer = Linear(20, 50)
+        inputs = torch.randn(3, 20)
+        low_rank_layer = LowRankLinear(20, 50, 20)
+        low_rank_layer.load_state_dict(factorize_linear(layer.state_dict(), "", 20))
+        self.assertTrue(torch.allclose(low_rank_layer(inputs), layer(inputs), atol=1e-4))
+
+    def test_compressed_pgn(self):
+        torch.manual_seed(1337)
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "cnn_dm_pgn.json"))
+        import_plugins(params)
+        reader_params = params.pop("reader")
+        reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+        reader = DatasetReader.from_params(reader_params)
+        dataset = list(reader.read(TEST_URLS_FILE))[:5]
+        vocabulary = Vocabulary.from_instances(dataset)
+        model_params = params.pop("model")
+        model = Model.from_params(model_params.duplicate(), vocab=vocabulary)
+        model.eval()
+
+        # Full ranks keep the outputs
+        rank = min(128, vocabulary.get_vocab_size("target_tokens"))
+        model_params["output_projection_rank"] = rank
+        model_params["target_embedding_rank"] = rank
+        compressed_model = Model.from_params(model_params, vocab=vocabulary)
+        compressed_model.eval()
+        state_dict = factorize_linear(model.state_dict(), "_output_projection_layer.", rank)
+        state_dict = factorize_embedding(state_dict, "_target_embedder.", rank)
+        compressed_model.load_state_dict(state_dict)
+
+        batch = Batch(dataset)
+        batch.index_instances(vocabulary)
+        tensors = batch.as_tensor_dict()
+        with torch.no_grad():
+            self.assertAlmostEqual(model(**tensors)["loss"].item(), compressed_model(**tensors)["loss"].item(),
+                                   places=3)
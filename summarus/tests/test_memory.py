@@ -0,0 +1,90 @@
+import unittest
+import os
+import json
+import multiprocessing
+
+import torch
+
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.common.params import Params
+from allennlp.data.iterators.data_iterator import DataIterator
+from allennlp.training.trainer import Trainer
+from allennlp.predictors.seq2seq import Seq2SeqPredictor
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+from summarus import import_plugins
+from summarus.memory import MemoryTelemetry, get_peak_rss_mb, get_saved_tensors_mb
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR, RIA_EXAMPLE_FILE, \
+    MEMORY_BUDGETS_FILE
+
+NUM_EPOCHS = 3
+# Peak RSS varies between machines and library builds within the pinned versions
+MEMORY_BUDGET_HEADROOM = 1.5
+
+
+def train_and_predict(config_path, queue):
+    params = Params.from_file(config_path)
+    import_plugins(params)
+    reader_params = params.duplicate().pop("reader", default=Params({}))
+    if reader_params["type"] == "cnn_dailymail":
+        reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+        dataset_file = TEST_URLS_FILE
+    else:
+        dataset_file = RIA_EXAMPLE_FILE
+
+    reader = DatasetReader.from_params(reader_params)
+    dataset = reader.read(dataset_file)
+    vocabulary = Vocabulary.from_params(params.pop("vocabulary", default=Params({})), instances=dataset)
+    model = Model.from_params(params.pop("model"), vocab=vocabulary)
+    telemetry = MemoryTelemetry(log_every=1)
+    telemetry.attach(model)
+
+    iterator = DataIterator.from_params(params.pop('iterator'))
+    iterator.index_with(vocabulary)
+    trainer_params = params.pop('trainer')
+    trainer_params["num_epochs"] = NUM_EPOCHS
+    trainer = Trainer.from_params(model, None, iterator, dataset, None, trainer_params)
+    trainer.train()
+
+    model.training = False
+    predictor = Seq2SeqPredictor(model, reader)
+    batch = [{"source": article} for article, _ in reader.parse_set(dataset_file)]
+    predictor.predict_batch_json(batch)
+    queue.put(get_peak_rss_mb())
+
+
+class TestMemory(unittest.TestCase):
+    def test_saved_tensors(self):
+        # The input of the layer, 16MB, is saved for the backward pass with any torch version
+        layer = torch.nn.Linear(1024, 1024)
+        inputs = torch.randn(4096, 1024, requires_grad=True)
+        self.assertGreaterEqual(get_saved_tensors_mb(lambda: torch.relu(layer(inputs)).sum(), layer), 15.)
+
+    def test_peak_memory(self):
+        # Budgets are refreshed with SUMMARUS_RECORD_MEMORY_BUDGETS=1 after an intended change of memory usage
+        record = bool(os.environ.get("SUMMARUS_RECORD_MEMORY_BUDGETS"))
+        budgets = dict()
+        if not record:
+            with open(MEMORY_BUDGETS_FILE, "r", encoding="utf-8") as r:
+                budgets = json.load(r)
+        # Every config runs in a fresh process, so the peak RSS does not depend on the previous ones
+        context = multiprocessing.get_context("spawn")
+        for file_name in sorted(os.listdir(TEST_CONFIG_DIR)):
+            if not file_name.endswith(".json"):
+                continue
+            queue = context.Queue()
+            process = context.Process(target=train_and_predict,
+                                      args=(os.path.join(TEST_CONFIG_DIR, file_name), queue))
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+            peak_rss = queue.get(timeout=10)
+            if record:
+                budgets[file_name] = int(peak_rss * MEMORY_BUDGET_HEADROOM)
+                continue
+            self.assertIn(file_name, budgets, "No memory budget for " + file_name)
+            self.assertLessEqual(peak_rss, budgets[file_name], "Memory budget exceeded for " + file_name)
+        if record:
+            with open(MEMORY_BUDGETS_FILE, "w", encoding="utf-8") as w:
+                json.dump(budgets, w, indent=2, sort_keys=True)
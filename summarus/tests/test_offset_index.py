@@ -0,0 +1,57 @@
+import io
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+
+from summarus.offset_index import build_offset_index, load_offset_index, read_records, get_permutation, \
+    get_offset_index_path
+from summarus.settings import RIA_EXAMPLE_FILE
+
+
+class TestOffsetIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lines(self):
+        with open(RIA_EXAMPLE_FILE, "r", encoding="utf-8") as r:
+            lines = r.readlines()
+        offsets = build_offset_index(RIA_EXAMPLE_FILE, "lines", chunk_size=1000)
+        self.assertEqual(len(offsets), len(lines) + 1)
+        records = dict(read_records(RIA_EXAMPLE_FILE, offsets, [3, 0]))
+        self.assertEqual(json.loads(records[3]), json.loads(lines[3]))
+        self.assertEqual(json.loads(records[0]), json.loads(lines[0]))
+
+    def test_csv(self):
+        rows = [
+            ["url", "title", "text"],
+            ["1", "заголовок", "первая строка\nвторая строка"],
+            ["2", "с \"кавычками\"", "текст, с запятой"],
+            ["3", "третий", "\"\n\"\n"]
+        ]
+        path = os.path.join(self.directory, "dataset.csv")
+        with open(path, "w", encoding="utf-8", newline="") as w:
+            csv.writer(w, delimiter=",", quotechar='"', lineterminator="\n").writerows(rows)
+        for chunk_size in (3, 7, 1 << 20):
+            offsets = build_offset_index(path, "csv", chunk_size=chunk_size)
+            self.assertEqual(len(offsets), len(rows))
+            for index, raw_record in read_records(path, offsets, range(len(rows) - 1)):
+                self.assertEqual(next(csv.reader(io.StringIO(raw_record))), rows[index + 1])
+
+    def test_load_and_permutation(self):
+        path = os.path.join(self.directory, "dataset.jsonl")
+        shutil.copy(RIA_EXAMPLE_FILE, path)
+        offsets = load_offset_index(path, "lines")
+        self.assertTrue(os.path.exists(get_offset_index_path(path)))
+        self.assertEqual(list(offsets), list(build_offset_index(path, "lines")))
+
+        records_count = len(offsets) - 1
+        permutation = get_permutation(records_count, seed=42, epoch=0)
+        self.assertEqual(sorted(permutation), list(range(records_count)))
+        self.assertEqual(list(permutation), list(get_permutation(records_count, seed=42, epoch=0)))
+        self.assertNotEqual(list(permutation), list(get_permutation(records_count, seed=42, epoch=1)))
@@ -0,0 +1,178 @@
+import os
+import unittest
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.dataset import Batch
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.nn.beam_search import BeamSearch
+from allennlp.predictors.seq2seq import Seq2SeqPredictor
+
+from summarus import import_plugins
+from summarus.greedy_search import GreedySearch
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR
+
+
+class TestPointerGeneratorNetwork(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(1337)
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "cnn_dm_pgn.json"))
+        import_plugins(params)
+        reader_params = params.pop("reader")
+        reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+        reader = DatasetReader.from_params(reader_params)
+        dataset = reader.read(TEST_URLS_FILE)
+        vocabulary = Vocabulary.from_instances(dataset)
+        cls.model = Model.from_params(params.pop("model"), vocab=vocabulary)
+        cls.model.eval()
+        cls.reader = reader
+        # Some source tokens are out of the vocabulary, so the extra columns are used
+        sources = [" ".join(instance.fields["metadata"]["source_tokens"][1:-1]) + " zzzunseen yyyunseen"
+                   for instance in list(dataset)[:5]]
+        batch = Batch([reader.text_to_instance(source) for source in sources])
+        batch.index_instances(vocabulary)
+        cls.tensors = batch.as_tensor_dict()
+        batch = Batch(list(dataset)[:5])
+        batch.index_instances(vocabulary)
+        cls.train_tensors = batch.as_tensor_dict()
+
+    def _get_step_state(self):
+        model = self.model
+        state = model._encode(self.tensors["source_tokens"])
+        extra_zeros, modified_source_tokens, _ = model._prepare(
+            self.tensors["source_to_target"], self.tensors["source_token_ids"])
+        state["tokens"] = modified_source_tokens
+        state["extra_zeros"] = extra_zeros
+        state = model._init_decoder_state(state)
+        last_predictions = state["source_mask"].new_full((state["source_mask"].size(0),), model._start_index)
+        return model._prepare_output_projections(last_predictions, state)
+
+    def test_final_log_dist(self):
+        model = self.model
+        with torch.no_grad():
+            output_projections, state = self._get_step_state()
+            self.assertGreater(state["extra_zeros"].size(1), 0)
+            expected = torch.log(model._get_final_dist(state, output_projections) + model._eps)
+            for _ in range(2):
+                # The second call reuses the buffers
+                actual = model._get_final_log_dist(state, output_projections)
+                self.assertEqual(expected.size(), actual.size())
+                self.assertTrue(torch.allclose(expected, actual, atol=1e-4))
+            self.assertEqual(float(model._copy_probs_buffer.abs().sum()), 0.)
+
+        # Padding has zero attention, gradients stay finite
+        self.assertFalse(bool(state["source_mask"].min()))
+        model.zero_grad()
+        output_projections, state = self._get_step_state()
+        actual = model._get_final_log_dist(state, output_projections)
+        self.assertTrue(torch.allclose(expected, actual.detach(), atol=1e-4))
+        actual.sum().backward()
+        for name, parameter in model.named_parameters():
+            if parameter.grad is not None:
+                self.assertTrue(torch.isfinite(parameter.grad).all(), name)
+        model.zero_grad()
+
+        # The buffers are released after the search
+        with torch.no_grad():
+            model(**self.tensors)
+        self.assertIsNone(model._final_log_dist_buffer)
+        self.assertIsNone(model._copy_probs_buffer)
+
+    def test_beam_search_parity(self):
+        model = self.model
+        with torch.no_grad():
+            actual = model(**self.tensors)["predictions"]
+            model._get_final_log_dist = lambda state, output_projections: torch.log(
+                model._get_final_dist(state, output_projections) + model._eps)
+            try:
+                expected = model(**self.tensors)["predictions"]
+            finally:
+                del model._get_final_log_dist
+        self.assertTrue(torch.equal(expected, actual))
+
+    def test_greedy_search_parity(self):
+        model = self.model
+        beam_search = model._beam_search
+        with torch.no_grad():
+            try:
+                model._beam_search = BeamSearch(model._end_index, max_steps=model._max_decoding_steps, beam_size=1)
+                actual = model(**self.tensors)
+                model._greedy_search = None
+                expected = model(**self.tensors)
+            finally:
+                model._beam_search = beam_search
+                model._greedy_search = GreedySearch(model._end_index, max_steps=model._max_decoding_steps)
+        self.assertTrue(torch.equal(expected["predictions"], actual["predictions"]))
+        self.assertTrue(torch.allclose(expected["class_log_probabilities"], actual["class_log_probabilities"],
+                                       atol=1e-4))
+
+    def test_validation_decoding(self):
+        model = self.model
+        try:
+            with torch.no_grad():
+                model.set_validation_decoding(0.)
+                output_dict = model(**self.train_tensors)
+                # Teacher-forced predictions of the loss computation are there, the beam search ones are not
+                self.assertIn("loss", output_dict)
+                self.assertNotIn("class_log_probabilities", output_dict)
+                # Inference without targets always decodes
+                self.assertIn("class_log_probabilities", model(**self.tensors))
+
+                model.set_validation_decoding(0.5)
+                decoded = ["class_log_probabilities" in model(**self.train_tensors) for _ in range(4)]
+                self.assertEqual(decoded, [False, True, False, True])
+        finally:
+            model.set_validation_decoding(1.)
+
+    def test_checkpointed_forward_loop(self):
+        model = self.model
+        model.train()
+        try:
+            losses = []
+            gradients = []
+            for checkpoint_steps in (None, 3):
+                model._checkpoint_steps = checkpoint_steps
+                model.zero_grad()
+                loss = model(**self.train_tensors)["loss"]
+                loss.backward()
+                losses.append(loss.item())
+                gradients.append(model._decoder_cell.weight_ih.grad.clone())
+        finally:
+            model._checkpoint_steps = None
+            model.eval()
+        self.assertAlmostEqual(losses[0], losses[1], places=5)
+        self.assertTrue(torch.allclose(gradients[0], gradients[1], atol=1e-6))
+
+    def test_decoding_budget(self):
+        model = self.model
+        with torch.no_grad():
+            output_dict = model(**self.tensors)
+            self.assertNotIn("degraded", output_dict)
+            with model.decoding_budget(60.):
+                budget_output_dict = model(**self.tensors)
+            self.assertTrue(torch.equal(output_dict["predictions"], budget_output_dict["predictions"]))
+            self.assertFalse(budget_output_dict["degraded"].any())
+
+            # The deadline has passed before the first step, every hypothesis ends right away,
+            # with the beam narrowed to 1 even without measured step time
+            model._step_seconds_per_row = None
+            with model.decoding_budget(0.):
+                budget_output_dict = model(**self.tensors)
+            self.assertEqual(budget_output_dict["predictions"].size(2), 1)
+            self.assertTrue(budget_output_dict["degraded"].all())
+
+            with model.decoding_budget(60., steps_per_source_token=0.01):
+                budget_output_dict = model(**self.tensors)
+            self.assertLessEqual(budget_output_dict["predictions"].size(2), 5)
+
+        source = " ".join(self.tensors["metadata"][0]["source_tokens"][1:-1])
+        predictor = Seq2SeqPredictor(model, self.reader)
+        with model.decoding_budget(0.):
+            output = predictor.predict_json({"source": source})
+        self.assertIs(output["degraded"], True)
+        with model.decoding_budget(60.):
+            outputs = predictor.predict_batch_json([{"source": source}] * 2)
+        self.assertEqual([output["degraded"] for output in outputs], [False, False])
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from summarus.preselection import split_sentences, score_sentences, preselect, PRESELECTION_METHODS
+from summarus.readers import RIAReader
+from summarus.settings import RIA_EXAMPLE_FILE
+
+TEXT = "Москва, 5 мая. Президент заявил о новых мерах поддержки экономики. " \
+       "Меры поддержки экономики включают кредиты. Погода сегодня хорошая. " \
+       "Кредиты на поддержку экономики выдадут банкам."
+
+
+class TestPreselection(unittest.TestCase):
+    def test_scores(self):
+        sentences = split_sentences(TEXT)
+        self.assertEqual(len(sentences), 5)
+        for method in PRESELECTION_METHODS:
+            scores = score_sentences(sentences, method)
+            self.assertEqual(len(scores), len(sentences))
+            self.assertGreater(scores[2], scores[3])
+
+    def test_sentences_without_words(self):
+        sentences = split_sentences(TEXT) + ["— — —."]
+        for method in PRESELECTION_METHODS:
+            scores = score_sentences(sentences, method)
+            self.assertTrue(np.isfinite(scores).all())
+            self.assertGreater(scores[2], scores[-1])
+
+    def test_preselect(self):
+        for method in PRESELECTION_METHODS:
+            self.assertEqual(preselect(TEXT, 100, method), TEXT)
+            selected = preselect(TEXT, 12, method)
+            self.assertLessEqual(len(selected.split()), 12)
+            self.assertIn(selected.split(". ")[0], TEXT)
+        self.assertEqual(preselect("один два три четыре", 2), "один два")
+        # The long best sentence does not fit, the shorter ones after it still do
+        text = "Кредиты экономики. Кредиты экономики и поддержка экономики банками страны. Поддержка экономики."
+        self.assertEqual(preselect(text, 5, "tfidf"), "Кредиты экономики. Поддержка экономики.")
+
+    def test_reader(self):
+        reader = RIAReader(preselect_max_tokens=50)
+        for instance in reader.read(RIA_EXAMPLE_FILE):
+            # Tokens of the reader are not whitespace-separated, punctuation adds to the budget
+            self.assertLessEqual(len(instance.fields["source_tokens"]), 100)
@@ -1,9 +1,12 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 from allennlp.common.util import START_SYMBOL, END_SYMBOL
 from allennlp.data.vocabulary import Vocabulary
 
-from summarus.readers import CNNDailyMailReader, RIAReader
+from summarus.readers import CNNDailyMailReader, RIAReader, LentaReader
 from summarus.settings import TEST_URLS_FILE, TEST_STORIES_DIR, RIA_EXAMPLE_FILE
 
 
@@ -46,3 +49,64 @@ class TestReaders(unittest.TestCase):
             self.assertIsNotNone(sample.fields["target_token_ids"].array)
             self.assertIsNotNone(sample.fields["source_to_target"]._mapping_array)
             self.assertIsNotNone(sample.fields["source_to_target"]._target_namespace)
+
+    def test_ria_shuffled_reader(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "ria.json")
+            shutil.copy(RIA_EXAMPLE_FILE, path)
+            records = list(RIAReader().iterate_records(path))
+
+            reader = RIAReader(shuffle_records=True, shuffle_seed=1)
+            first_epoch = list(reader._iterate_shuffled_records(path))
+            second_epoch = list(reader._iterate_shuffled_records(path))
+            self.assertEqual(sorted(first_epoch), sorted(records))
+            self.assertNotEqual(first_epoch, second_epoch)
+
+            resumed = RIAReader(shuffle_records=True, shuffle_seed=1, start_position=5)
+            self.assertEqual(list(resumed._iterate_shuffled_records(path)), first_epoch[5:])
+
+            # Validation with the same reader is not resumed and does not advance the train epochs
+            validation_path = os.path.join(directory, "ria_validation.json")
+            shutil.copy(RIA_EXAMPLE_FILE, validation_path)
+            self.assertEqual(list(resumed._iterate_shuffled_records(validation_path)), first_epoch)
+            self.assertEqual(list(resumed._iterate_shuffled_records(path)), second_epoch)
+
+            empty_path = os.path.join(directory, "lenta.csv")
+            open(empty_path, "w").close()
+            self.assertEqual(list(LentaReader(shuffle_records=True)._iterate_shuffled_records(empty_path)), [])
+
+            shards = []
+            for rank in range(2):
+                shard_reader = RIAReader(shuffle_records=True)
+                shard_reader.set_shard(rank, 2)
+                shards.append({index for index, _ in shard_reader._iterate_shuffled_records(path)})
+            self.assertFalse(shards[0] & shards[1])
+            self.assertEqual(shards[0] | shards[1], {index for index, _ in records})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_sequential_shards(self):
+        readers = [
+            (lambda: RIAReader(), RIA_EXAMPLE_FILE),
+            (lambda: CNNDailyMailReader(cnn_tokenized_dir=TEST_STORIES_DIR), TEST_URLS_FILE)
+        ]
+        for make_reader, path in readers:
+            records = list(make_reader().iterate_records(path))
+            shards = []
+            for rank in range(2):
+                shard_reader = make_reader()
+                shard_reader.set_shard(rank, 2)
+                shards.append(list(shard_reader.iterate_records(path)))
+            self.assertTrue(all(index % 2 == 0 for index, _ in shards[0]))
+            self.assertEqual(sorted(shards[0] + shards[1]), sorted(records))
+
+        # Records of other shards are not parsed
+        reader = RIAReader()
+        reader.set_shard(1, 3)
+        parsed = []
+        parse_record = reader.parse_record
+        reader.parse_record = lambda line: parsed.append(line) or parse_record(line)
+        list(reader.iterate_records(RIA_EXAMPLE_FILE))
+        with open(RIA_EXAMPLE_FILE, "r", encoding="utf-8") as r:
+            self.assertEqual(parsed, r.readlines()[1::3])
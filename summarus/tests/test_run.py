@@ -0,0 +1,120 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+
+import run
+from summarus import import_plugins
+from summarus.readers import RIAReader
+from summarus.settings import TEST_CONFIG_DIR, RIA_EXAMPLE_FILE
+
+DOCUMENTS_COUNT = 7
+BATCH_SIZE = 2
+
+
+class TestRun(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(1337)
+        cls.directory = tempfile.mkdtemp()
+        with open(os.path.join(TEST_CONFIG_DIR, "ria_pgn.json"), "r", encoding="utf-8") as r:
+            config = json.load(r)
+        # An untrained model decodes up to the limit, it is kept short
+        config["model"]["max_decoding_steps"] = 10
+        cls.model_path = os.path.join(cls.directory, "model")
+        os.makedirs(cls.model_path)
+        with open(os.path.join(cls.model_path, "config.json"), "w", encoding="utf-8") as w:
+            json.dump(config, w)
+
+        params = Params(config)
+        import_plugins(params)
+        reader = DatasetReader.from_params(params.pop("reader"))
+        vocabulary = Vocabulary.from_instances(reader.read(RIA_EXAMPLE_FILE))
+        vocabulary.save_to_files(os.path.join(cls.model_path, "vocabulary"))
+        model = Model.from_params(params.pop("model"), vocab=vocabulary)
+        torch.save(model.state_dict(), os.path.join(cls.model_path, "best.th"))
+
+        cls.test_path = os.path.join(cls.directory, "input.txt")
+        with open(cls.test_path, "w", encoding="utf-8") as w:
+            for i, (text, _) in enumerate(RIAReader(clean_html=False).parse_set(RIA_EXAMPLE_FILE)):
+                if i == DOCUMENTS_COUNT:
+                    break
+                w.write(text.replace("\n", " ") + "\n")
+
+        cls.expected_path = os.path.join(cls.directory, "expected.txt")
+        cls.summarize(cls.expected_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def summarize(cls, output_path, test_path=None, work_dir=None):
+        run.run(cls.model_path, test_path or cls.test_path, None, output_path, BATCH_SIZE, work_dir=work_dir)
+
+    def read_lines(self, path):
+        with open(path, "r", encoding="utf-8") as r:
+            return r.readlines()
+
+    def test_resume(self):
+        self.assertEqual(len(self.read_lines(self.expected_path)), DOCUMENTS_COUNT)
+        output_path = os.path.join(self.directory, "resumed.txt")
+        work_dir = os.path.join(self.directory, "resume_work_dir")
+
+        predict_batch = run.predict_batch
+        calls = []
+
+        def interrupted_predict_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) > 2:
+                raise KeyboardInterrupt()
+            return predict_batch(*args, **kwargs)
+
+        with mock.patch.object(run, "predict_batch", interrupted_predict_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                self.summarize(output_path, work_dir=work_dir)
+        with open(os.path.join(work_dir, run.PROGRESS_FILE_NAME), "r", encoding="utf-8") as r:
+            progress = json.load(r)
+        self.assertEqual(progress["parts_count"], 2)
+        self.assertEqual(progress["documents_count"], 2 * BATCH_SIZE)
+        self.assertFalse(os.path.exists(output_path))
+
+        self.summarize(output_path, work_dir=work_dir)
+        self.assertEqual(self.read_lines(output_path), self.read_lines(self.expected_path))
+        self.assertEqual(os.listdir(work_dir), [])
+
+    def test_other_input(self):
+        work_dir = os.path.join(self.directory, "other_work_dir")
+        other_test_path = os.path.join(self.directory, "other_input.txt")
+        shutil.copy(self.test_path, other_test_path)
+        os.makedirs(work_dir)
+        progress = {"input_offset": 1, "parts_count": 1, "documents_count": 1,
+                    "input": run.get_input_identity(self.test_path)}
+        with open(os.path.join(work_dir, run.PROGRESS_FILE_NAME), "w", encoding="utf-8") as w:
+            json.dump(progress, w)
+        with self.assertRaises(AssertionError):
+            self.summarize(os.path.join(self.directory, "other.txt"), test_path=other_test_path, work_dir=work_dir)
+
+    def test_failing_document(self):
+        run.init_worker(self.model_path)
+        lines = self.read_lines(self.test_path)[:3]
+        expected = [line.strip() for line in self.read_lines(self.expected_path)[:3]]
+        predictor = run._worker["predictor"]
+        predict_batch_json = predictor.predict_batch_json
+
+        def failing_predict_batch_json(documents):
+            if any(document["source"] == run.clean_source(lines[1]) for document in documents):
+                raise RuntimeError()
+            return predict_batch_json(documents)
+
+        with mock.patch.object(predictor, "predict_batch_json", failing_predict_batch_json):
+            summaries = run.summarize_batch(lines)
+        self.assertEqual(summaries, [expected[0], run.FALLBACK_SUMMARY, expected[2]])
@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.dataset import Batch
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.nn.util import masked_softmax
+
+from summarus import import_plugins
+from summarus.sparse_bahdanau_attention import SparseBahdanauAttention
+from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR
+
+
+class TestSparseBahdanauAttention(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1337)
+        self.dim = 16
+        self.decoder_hidden = torch.randn(4, self.dim)
+        self.encoder_outputs = torch.randn(4, 300, self.dim)
+        self.mask = torch.ones(4, 300, dtype=torch.long)
+        self.mask[1, 200:] = 0
+        self.mask[2, 50:] = 0
+        self.coverage = torch.rand(4, 300) * self.mask.float()
+
+    def test_sparse_weights(self):
+        for mode, candidates_count in (("window", 17), ("topk", 20)):
+            attention = SparseBahdanauAttention(self.dim, use_coverage=True, mode=mode, window_size=8, top_k=20)
+            attention.eval()
+            with torch.no_grad():
+                weights = attention(self.decoder_hidden, self.encoder_outputs, self.mask, self.coverage)
+                self.assertTrue(torch.allclose(weights.sum(1), torch.ones(4)))
+                self.assertTrue(((weights > 0).sum(1) <= candidates_count).all())
+                self.assertEqual(float((weights * (1 - self.mask).float()).sum()), 0.)
+
+                # The same as the dense attention over the candidates only
+                bias = attention._get_bias(self.decoder_hidden, self.encoder_outputs, self.mask)
+                candidates = attention._get_candidates(bias, self.mask)
+                candidates_mask = torch.zeros_like(self.mask).scatter_(1, candidates, 1) * self.mask
+                similarities = attention._forward_internal(self.decoder_hidden, self.encoder_outputs, self.coverage)
+                expected = masked_softmax(similarities + bias, candidates_mask)
+                self.assertTrue(torch.allclose(expected, weights, atol=1e-6))
+
+    def test_dense_in_training(self):
+        attention = SparseBahdanauAttention(self.dim, mode="topk", top_k=20)
+        weights = attention(self.decoder_hidden, self.encoder_outputs, self.mask)
+        self.assertTrue(torch.equal((weights > 0).long().sum(1), self.mask.sum(1)))
+        weights.sum().backward()
+        self.assertIsNotNone(attention._query_projection_layer.weight.grad)
+
+    def test_pgn_with_coverage(self):
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "cnn_dm_pgn.json"))
+        params["model"]["attention"] = {"type": "sparse_bahdanau", "dim": 512, "use_coverage": True,
+                                        "mode": "window", "window_size": 4}
+        params["model"]["use_coverage"] = True
+        params["model"]["coverage_loss_weight"] = 1.0
+        import_plugins(params)
+        reader_params = params.pop("reader")
+        reader_params["cnn_tokenized_dir"] = TEST_STORIES_DIR
+        reader = DatasetReader.from_params(reader_params)
+        dataset = list(reader.read(TEST_URLS_FILE))[:5]
+        vocabulary = Vocabulary.from_instances(dataset)
+        model = Model.from_params(params.pop("model"), vocab=vocabulary)
+        batch = Batch(dataset)
+        batch.index_instances(vocabulary)
+        tensors = batch.as_tensor_dict()
+
+        model.train()
+        model(**tensors)["loss"].backward()
+        model.eval()
+        with torch.no_grad():
+            output_dict = model(**tensors)
+        self.assertEqual(output_dict["predictions"].size(0), 5)
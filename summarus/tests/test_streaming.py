@@ -0,0 +1,35 @@
+import os
+import unittest
+
+import torch
+from allennlp.common.params import Params
+from allennlp.data.vocabulary import Vocabulary
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.models.model import Model
+from allennlp.nn.beam_search import BeamSearch
+
+from summarus import import_plugins
+from summarus.streaming import StreamingSummarizer
+from summarus.settings import TEST_CONFIG_DIR, RIA_EXAMPLE_FILE
+
+
+class TestStreaming(unittest.TestCase):
+    def test_stream_matches_search(self):
+        torch.manual_seed(1337)
+        params = Params.from_file(os.path.join(TEST_CONFIG_DIR, "ria_pgn.json"))
+        import_plugins(params)
+        reader = DatasetReader.from_params(params.pop("reader"))
+        dataset = list(reader.read(RIA_EXAMPLE_FILE))
+        vocabulary = Vocabulary.from_instances(dataset)
+        model_params = params.pop("model")
+        model_params["max_decoding_steps"] = 20
+        model = Model.from_params(model_params, vocab=vocabulary)
+        model.eval()
+
+        texts = [" ".join(instance.fields["metadata"]["source_tokens"][1:-1]) for instance in dataset[:3]]
+        for beam_size in (1, 3):
+            model._beam_search = BeamSearch(model._end_index, max_steps=20, beam_size=beam_size)
+            summarizer = StreamingSummarizer(model, reader)
+            for text in texts:
+                expected = model.forward_on_instance(reader.text_to_instance(text))["predicted_tokens"]
+                self.assertEqual(list(summarizer.stream(text)), expected)
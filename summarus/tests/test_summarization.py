@@ -11,6 +11,7 @@ from allennlp.predictors.seq2seq import Seq2SeqPredictor
 from allennlp.data.dataset_readers.dataset_reader import DatasetReader
 from allennlp.models.model import Model
 
+from summarus import import_plugins
 from summarus.settings import TEST_URLS_FILE, TEST_CONFIG_DIR, TEST_STORIES_DIR, RIA_EXAMPLE_FILE
 
 
@@ -26,7 +27,9 @@ class TestSummarizationModel(unittest.TestCase):
             if not file_name.endswith(".json"):
                 continue
             config_path = os.path.join(TEST_CONFIG_DIR, file_name)
-            cls.params.append(Params.from_file(config_path))
+            params = Params.from_file(config_path)
+            import_plugins(params)
+            cls.params.append(params)
 
     def test_models(self):
         for params in self.params:
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from allennlp.common.util import START_SYMBOL, END_SYMBOL
+
+from summarus.readers import RIAReader, LentaReader, CNNDailyMailReader, ContractsReader
+from summarus.synthetic import generate_corpus
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_generate_corpus(self):
+        directory = tempfile.mkdtemp()
+        try:
+            readers = {
+                "ria": lambda path: RIAReader(),
+                "lenta": lambda path: LentaReader(),
+                "cnn_dailymail": lambda path: CNNDailyMailReader(
+                    cnn_tokenized_dir=os.path.join(os.path.dirname(path), "stories")),
+                "contracts": lambda path: ContractsReader(contracts_dir=path)
+            }
+            for corpus_format, make_reader in readers.items():
+                path = generate_corpus(corpus_format, os.path.join(directory, corpus_format), 20,
+                                       median_length=50, lexicon_size=1000)
+                reader = make_reader(path)
+                records = list(reader.parse_set(path))
+                self.assertEqual(len(records), 20)
+                for source, target in records:
+                    self.assertGreater(len(source.split()), 1)
+                    self.assertGreater(len(target.split()), 1)
+                    self.assertNotIn("<p>", source)
+
+                # The same seed gives the same documents, contracts are read in the directory order
+                other_path = generate_corpus(corpus_format, os.path.join(directory, corpus_format + "_other"), 1,
+                                             median_length=50, lexicon_size=1000)
+                other_records = list(make_reader(other_path).parse_set(other_path))
+                self.assertEqual(len(other_records), 1)
+                self.assertIn(other_records[0], records)
+
+                instance = reader.text_to_instance(*records[0])
+                self.assertEqual(instance.fields["source_tokens"][0].text, START_SYMBOL)
+                self.assertEqual(instance.fields["source_tokens"][-1].text, END_SYMBOL)
+        finally:
+            shutil.rmtree(directory)
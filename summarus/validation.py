@@ -0,0 +1,39 @@
+from allennlp.common.params import Params
+from allennlp.models.model import Model
+
+
+class ValidationDecodingMixin:
+    """
+    Decoding switch for models that decode in forward whenever they are not training.
+    Validation batches, the ones with targets, are decoded only with the given ratio:
+    0 computes only the loss, 1 decodes every batch. Batches without targets are always decoded.
+    The decoded batches are spread evenly, every 1 / ratio'th validation batch is decoded.
+    """
+    _validation_decode_ratio = 1.0
+    _validation_batches_count = 0
+
+    def set_validation_decoding(self, ratio: float) -> None:
+        assert 0. <= ratio <= 1., "Validation decode ratio should be between 0 and 1"
+        self._validation_decode_ratio = ratio
+        self._validation_batches_count = 0
+
+    def _should_decode(self, has_targets: bool) -> bool:
+        if self.training:
+            return False
+        if not has_targets or self._validation_decode_ratio >= 1.:
+            return True
+        ratio = self._validation_decode_ratio
+        count = self._validation_batches_count
+        self._validation_batches_count += 1
+        return int((count + 1) * ratio) > int(count * ratio)
+
+
+def set_validation_decoding(model: Model, trainer_params: Params) -> None:
+    """
+    Pops the validation_decode_ratio trainer option, AllenNLP Trainer does not know it.
+    """
+    ratio = trainer_params.pop_float("validation_decode_ratio", None)
+    if ratio is None:
+        return
+    assert isinstance(model, ValidationDecodingMixin), "Model does not support validation_decode_ratio"
+    model.set_validation_decoding(ratio)
@@ -1,5 +1,7 @@
 import os
+import random
 import argparse
+import logging
 
 import numpy
 import torch
@@ -11,16 +13,21 @@ from allennlp.data.dataset_readers.dataset_reader import DatasetReader
 from allennlp.models.model import Model
 
 from summarus import *
+from summarus.memory import MemoryTelemetry
+from summarus.distributed import train_distributed
+from summarus.validation import set_validation_decoding
 
 
 def set_seed(seed):
+    random.seed(seed)
     numpy.random.seed(seed)
     torch.manual_seed(seed)
     if torch.cuda.is_available():
         torch.cuda.manual_seed_all(seed)
 
 
-def train(model_path, train_path, val_path, seed, vocabulary_path=None, config_path=None):
+def train(model_path, train_path, val_path, seed, vocabulary_path=None, config_path=None,
+          memory_log_path=None, memory_log_every=100, num_workers=1, num_threads=None, weights_path=None):
     assert os.path.isdir(model_path), "Model directory does not exist"
     set_seed(seed)
 
@@ -30,6 +37,13 @@ def train(model_path, train_path, val_path, seed, vocabulary_path=None, config_p
 
     vocabulary_path = vocabulary_path or os.path.join(model_path, "vocabulary")
     assert os.path.exists(vocabulary_path), "Vocabulary is not ready, do not forget to run preprocess.py first"
+    if num_workers > 1:
+        train_distributed(num_workers, model_path, train_path, val_path, seed,
+                          vocabulary_path, config_path, num_threads, weights_path,
+                          memory_log_path, memory_log_every)
+        return
+    if num_threads:
+        torch.set_num_threads(num_threads)
     vocabulary = Vocabulary.from_files(vocabulary_path)
 
     reader_params = params.duplicate().pop("reader", default=Params({}))
@@ -39,13 +53,21 @@ def train(model_path, train_path, val_path, seed, vocabulary_path=None, config_p
 
     model_params = params.pop("model")
     model = Model.from_params(model_params, vocab=vocabulary)
+    if weights_path:
+        # Fine-tuning, for example of a model compressed with compress.py
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"))
     print(model)
     print("Trainable params count: ", sum(p.numel() for p in model.parameters() if p.requires_grad))
+    if memory_log_path:
+        logging.basicConfig(level=logging.INFO)
+        MemoryTelemetry(memory_log_path, memory_log_every).attach(model)
 
     iterator = DataIterator.from_params(params.pop('iterator'))
     iterator.index_with(vocabulary)
+    trainer_params = params.pop('trainer')
+    set_validation_decoding(model, trainer_params)
     trainer = Trainer.from_params(model, model_path, iterator,
-                                  train_dataset, val_dataset, params.pop('trainer'))
+                                  train_dataset, val_dataset, trainer_params)
     trainer.train()
 
 
@@ -57,6 +79,11 @@ if __name__ == "__main__":
     parser.add_argument('--seed', type=int, default=1048596)
     parser.add_argument('--vocabulary-path', default=None)
     parser.add_argument('--config-path', default=None)
+    parser.add_argument('--memory-log-path', default=None, help="path to JSONL file with per-batch memory usage")
+    parser.add_argument('--memory-log-every', type=int, default=100)
+    parser.add_argument('--num-workers', type=int, default=1, help="number of data-parallel worker processes")
+    parser.add_argument('--num-threads', type=int, default=None, help="number of torch threads per worker")
+    parser.add_argument('--weights-path', default=None, help="path to weights to start training from")
     args = parser.parse_args()
     train(**vars(args))
 
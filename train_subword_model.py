@@ -1,29 +1,91 @@
 import os
 import json
+import random
 import tempfile
 import argparse
+from itertools import islice
+from multiprocessing import Pool
 
-from bs4 import BeautifulSoup
 from sentencepiece import SentencePieceTrainer as sp_trainer
 
+from summarus.readers.ria_reader import clean_html
 
-def parse_ria_json(path):
-    with open(path, "r", encoding="utf-8") as r:
-        for line in r:
-            data = json.loads(line.strip())
-            title = data["title"]
-            text = data["text"]
-            clean_text = BeautifulSoup(text, 'html.parser').text
-            if not clean_text or not title:
-                continue
-            yield clean_text, title
-   
-
-def train_subwords(train_path, model_path, model_type, vocab_size):
-    temp = tempfile.NamedTemporaryFile(mode="w", delete=False)
-    for text, title in parse_ria_json(train_path):
-        temp.write(text + "\n")
-        temp.write(title + "\n")
+CLEAN_CHUNK_SIZE = 256
+# Lines read ahead of the workers, in chunks per worker
+CLEAN_CHUNKS_PER_WORKER = 4
+
+
+def clean_record(line):
+    data = json.loads(line.strip())
+    return {"title": data["title"], "text": clean_html(data["text"])}
+
+
+def read_cleaned_records(train_path, cache_path=None, num_workers=1):
+    """
+    Yields records with cleaned texts, one for every line of the RIA dataset.
+    The cleaned records are saved to cache_path line by line, so the cache is a RIA dataset itself:
+    later runs and RIAReader with clean_html=false read it without cleaning, record indices are the same.
+    """
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as r:
+            for line in r:
+                yield json.loads(line)
+        return
+
+    temp_cache_path = cache_path + ".tmp" if cache_path else None
+    cache = open(temp_cache_path, "w", encoding="utf-8") if cache_path else None
+    with open(train_path, "r", encoding="utf-8") as r, Pool(num_workers) as pool:
+        # pool.imap reads its input without a limit, so it gets the lines in bounded blocks
+        block_size = num_workers * CLEAN_CHUNK_SIZE * CLEAN_CHUNKS_PER_WORKER
+        while True:
+            block = list(islice(r, block_size))
+            if not block:
+                break
+            for record in pool.imap(clean_record, block, chunksize=CLEAN_CHUNK_SIZE):
+                if cache:
+                    cache.write(json.dumps(record, ensure_ascii=False) + "\n")
+                yield record
+    if cache:
+        cache.close()
+        # The cache appears only when it is complete
+        os.rename(temp_cache_path, cache_path)
+
+
+def parse_ria_json(path, cache_path=None, num_workers=1):
+    for record in read_cleaned_records(path, cache_path, num_workers):
+        clean_text, title = record["text"], record["title"]
+        if not clean_text or not title:
+            continue
+        yield clean_text, title
+
+
+def reservoir_sample(items, sample_size, seed=42):
+    rng = random.Random(seed)
+    sample = []
+    for i, item in enumerate(items):
+        if i < sample_size:
+            sample.append(item)
+            continue
+        j = rng.randint(0, i)
+        if j < sample_size:
+            sample[j] = item
+    return sample
+
+
+def get_sentences(train_path, cache_path, num_workers):
+    for text, title in parse_ria_json(train_path, cache_path, num_workers):
+        yield text
+        yield title
+
+
+def train_subwords(train_path, model_path, model_type, vocab_size, cache_path=None, num_workers=1,
+                   sample_size=None, num_threads=None, input_sentence_size=None, seed=42):
+    sentences = get_sentences(train_path, cache_path, num_workers)
+    if sample_size:
+        sentences = reservoir_sample(sentences, sample_size, seed)
+    temp = tempfile.NamedTemporaryFile(mode="w", encoding="utf-8", delete=False)
+    for sentence in sentences:
+        temp.write(sentence + "\n")
     temp.close()
     if not os.path.exists(model_path):
         os.makedirs(model_path)
@@ -32,6 +94,10 @@ def train_subwords(train_path, model_path, model_type, vocab_size):
         os.path.join(model_path, model_type),
         vocab_size,
         model_type)
+    if num_threads:
+        cmd += " --num_threads={}".format(num_threads)
+    if input_sentence_size:
+        cmd += " --input_sentence_size={}".format(input_sentence_size)
     sp_trainer.Train(cmd)
     os.unlink(temp.name)
 
@@ -42,5 +108,12 @@ if __name__ == "__main__":
     parser.add_argument('--model-path', type=str, required=True)
     parser.add_argument('--model-type', type=str, default="bpe")
     parser.add_argument('--vocab-size', type=int, default=50000)
+    parser.add_argument('--cache-path', type=str, default=None, help="path to cleaned dataset, reused if exists")
+    parser.add_argument('--num-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--sample-size', type=int, default=None, help="number of sampled sentences")
+    parser.add_argument('--num-threads', type=int, default=None, help="number of sentencepiece trainer threads")
+    parser.add_argument('--input-sentence-size', type=int, default=None,
+                        help="max number of sentences loaded by sentencepiece trainer")
+    parser.add_argument('--seed', type=int, default=42)
     args = parser.parse_args()
     train_subwords(**vars(args))